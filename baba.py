@@ -1,6 +1,14 @@
 #!/usr/bin/env python3
 
+import array
+import bisect
 import collections
+import gc
+import glob
+import itertools
+import json
+import multiprocessing
+import os
 import re
 import copy
 import sys
@@ -10,15 +18,33 @@ import traceback
 # - declaration of global data structures/constants
 # - tokenizer
 # - main parse function
-# - error/function logging functions
-# - functions that map to the nonterminals in the grammar
-# - functions that match, return curried functions etc.
-# to implement operations like lookahead/star
+# - stats, the stages of a parse, for baba_stats to time
+# - batch, parsing many files over a pool of processes
+# - ParseResult, what a parse found and the printing of it
+# - stateless helpers for first sets/lookahead
+# - Parser, one parse session, holding
+#   - error/function logging functions
+#   - functions that map to the nonterminals in the grammar
+#   - functions that match, return curried functions etc.
+#   to implement operations like lookahead/star
+# - TracingParser, Parser sending an event for every grammar function
 # - grammar
+# the features built on the lexer and parser are modules of their own
+# - baba_tree, TreeParser and SyntaxTree, Parser building a syntax tree
+# - baba_validate, a quicker pass/fail check
+# - baba_profile, counts and times of the nonterminals and first set checks
+# - baba_stats, the time and memory of the stages of a parse
 
 # Much of program structure and ideas were discussed in collaboration with student (csunao)
 
-Token = collections.namedtuple('Token', ['type', 'value', 'line', 'column'])
+# pos is the offset of the token in the program, its line and column
+# are only worked out when they are needed, see LineIndex
+Token = collections.namedtuple('Token', ['type', 'value', 'pos'])
+
+# the types a token can have, a TokenStore keeps the index in here and
+# the compiled first sets and predictions are keyed by it as well
+TOKEN_TYPES = ("Name", "Keyword", "Operator", "Number", "String", "EOF")
+TOKEN_TYPE_CODES = dict((t, code) for (code, t) in enumerate(TOKEN_TYPES))
 
 # used in funcs when telling lookahead func
 # what to look for, ie tuples of ",",MATCH_VALUE
@@ -29,12 +55,6 @@ MATCH_FUNCTION = "function_type"
 firstSets = dict()
 # firstsets of all nonterminals, indexed by string name
 
-errors_switch = 0
-# used to turn off error logging when matching terminals
-# but whilst looking ahead, as a non-match there is not an error
-# when 0 errors are not logged, when entering lookahead function
-# switch inced, when leaving switch decremented
-
 ANON = -1
 # anonymous func in tuple list position in token list
 # i can never be -1, so then will know it was an anon func
@@ -42,14 +62,25 @@ ANON = -1
 ANONYMOUS_FUNCTION = "anonymous function"
 # pretty print for anonymous function
 
-function_name_list = []
-function_params_list = []
-# both of these are tuples that are the things named
-# these are used to put tuples that are token positions in
-# so later the function arguments and names can be used
+# trace levels, each includes everything from the levels below it
+TRACE_OFF = 0
+TRACE_RULES = 1 # entering and leaving every nonterminal
+TRACE_ERRORS = 2 # errors logged, tokens skipped and params logged
+TRACE_TOKENS = 3 # every token read in, before the parse starts
+# see the tracing section at the end
+
+PARSER_VERSION = "4"
+# part of the key of cached results, bump it when a change to the
+# grammar or the parser changes what is found for a program
 
-error_list = []
-# list of errors to print out later
+# the ways of running the grammar, see make_parser
+RECURSIVE = "recursive"
+STACK = "stack"
+TABLE = "table"
+ENGINES = (RECURSIVE, STACK, TABLE)
+
+# the per parse state, the error list, the function name/params lists
+# and the errors switch all live on a Parser, see the class below
 
 # these are the first sets of all the nonterminals in the program
 # these are used when there is a decision, ie. a '|'
@@ -85,6 +116,142 @@ firstSets["end_explist"] = [(",",MATCH_VALUE),("=",MATCH_VALUE)]
 firstSets["stat_name_eap"] = firstSets["exp_back"] + firstSets["args_back"]
 firstSets["stat_name"] = firstSets["stat_name_eap"] + firstSets["end_explist"]
 
+# compiled form of a first set, rather than walking the list of
+# (value, MATCH_TYPE/MATCH_VALUE) tuples and calling match_v/match_t on
+# each, a token is in the set if its value is in values or its type
+# is in types, so checking is two hash lookups whatever the set size
+# type_codes are the types as TOKEN_TYPE_CODES, for a TokenStore
+FirstSet = collections.namedtuple('FirstSet', ['values', 'types', 'type_codes'])
+
+def compile_first_set(firstSet):
+    values = frozenset(v for (v, match_type) in firstSet if match_type == MATCH_VALUE)
+    types = frozenset(v for (v, match_type) in firstSet if match_type == MATCH_TYPE)
+    return FirstSet(values, types, frozenset(TOKEN_TYPE_CODES[t] for t in types if t in TOKEN_TYPE_CODES))
+
+# prediction table for a nonterminal, maps token value/type to the
+# alternative that should be taken, given as (rank, alternative)
+# the rank is the position of the alternative in the grammar function
+# so when a token's value and type both map to an alternative (eg.
+# the String "nil") the one that came first wins, as with the old
+# if/elif chain of contains() calls, type_codes is types keyed by
+# TOKEN_TYPE_CODES, for a TokenStore
+Prediction = collections.namedtuple('Prediction', ['values', 'types', 'type_codes'])
+
+def compile_prediction(alternatives):
+    values = dict()
+    types = dict()
+    for rank, (alternative, firstSet) in enumerate(alternatives):
+        for (v, match_type) in firstSet:
+            table = values if match_type == MATCH_VALUE else types
+            if v not in table:
+                table[v] = (rank, alternative)
+    return Prediction(values, types,
+            dict((TOKEN_TYPE_CODES[t], entry) for (t, entry) in types.items() if t in TOKEN_TYPE_CODES))
+
+firstSetLookup = dict()
+# compiled versions of everything in firstSets, indexed by string name
+for _name, _firstSet in firstSets.items():
+    firstSetLookup[_name] = compile_first_set(_firstSet)
+
+# single item sets used as is in the grammar functions
+NAME_SET = compile_first_set([("Name",MATCH_TYPE)])
+EQUALS_SET = compile_first_set([("=",MATCH_VALUE)])
+COMMA_EQUALS_SET = compile_first_set([(",",MATCH_VALUE),("=",MATCH_VALUE)])
+COMMA_IN_SET = compile_first_set([(",",MATCH_VALUE),("in",MATCH_VALUE)])
+OPEN_SQUARE_SET = compile_first_set([("[",MATCH_VALUE)])
+
+# tokens panic mode error recovery skips to (see Parser.synchronize),
+# what ends a block or an expression and what starts a statement, bar
+# Name and ( which are in so much that they would stop it straight away,
+# they are only skipped to after a token in STAT_END_SET
+SYNC_SET = compile_first_set([(v, t) for (v, t) in firstSets["stat"] if t == MATCH_VALUE and v != "("]
+        + firstSets["laststat"] + [(";",MATCH_VALUE), ("end",MATCH_VALUE), ("until",MATCH_VALUE),
+        ("else",MATCH_VALUE), ("elseif",MATCH_VALUE), (")",MATCH_VALUE), ("]",MATCH_VALUE),
+        ("}",MATCH_VALUE), ("EOF",MATCH_TYPE)])
+
+# tokens a statement can end with, so a Name or ( after one can be the
+# start of the next statement
+STAT_END_SET = compile_first_set([("Name",MATCH_TYPE), ("Number",MATCH_TYPE), ("String",MATCH_TYPE),
+        ("nil",MATCH_VALUE), ("false",MATCH_VALUE), ("true",MATCH_VALUE), ("...",MATCH_VALUE),
+        (")",MATCH_VALUE), ("]",MATCH_VALUE), ("}",MATCH_VALUE), ("end",MATCH_VALUE), ("break",MATCH_VALUE)])
+
+# prediction tables for the nonterminals with more than a couple
+# of alternatives that can all be decided on one token
+predictions = dict()
+predictions["stat"] = compile_prediction([
+    ("Name", [("Name",MATCH_TYPE)]),
+    ("(", [("(",MATCH_VALUE)]),
+    ("do", [("do",MATCH_VALUE)]),
+    ("while", [("while",MATCH_VALUE)]),
+    ("repeat", [("repeat",MATCH_VALUE)]),
+    ("if", [("if",MATCH_VALUE)]),
+    ("for", [("for",MATCH_VALUE)]),
+    ("function", [("function",MATCH_VALUE)]),
+    ("local", [("local",MATCH_VALUE)])])
+predictions["exp"] = compile_prediction([
+    ("nil", [("nil",MATCH_VALUE)]),
+    ("false", [("false",MATCH_VALUE)]),
+    ("true", [("true",MATCH_VALUE)]),
+    ("Number", [("Number",MATCH_TYPE)]),
+    ("String", [("String",MATCH_TYPE)]),
+    ("...", [("...",MATCH_VALUE)]),
+    ("functiondef", firstSets["functiondef"]),
+    ("prefixexp", firstSets["prefixexp"]),
+    ("tableconstructor", firstSets["tableconstructor"]),
+    ("unop", firstSets["unop"])])
+predictions["exp_args_back"] = compile_prediction([
+    ("exp_back", firstSets["exp_back"]),
+    ("args_back", firstSets["args_back"])])
+predictions["stat_name"] = compile_prediction([
+    ("stat_name_eap", firstSets["stat_name_eap"]),
+    ("end_explist", firstSets["end_explist"])])
+predictions["stat_name_eap"] = compile_prediction([
+    ("exp_back", firstSets["exp_back"]),
+    ("args_back", firstSets["args_back"])])
+predictions["args"] = compile_prediction([
+    ("(", [("(",MATCH_VALUE)]),
+    ("tableconstructor", firstSets["tableconstructor"]),
+    ("String", [("String",MATCH_TYPE)])])
+predictions["args_back"] = compile_prediction([
+    ("args", firstSets["args"]),
+    (":", [(":",MATCH_VALUE)])])
+predictions["exp_back"] = compile_prediction([
+    ("[", [("[",MATCH_VALUE)]),
+    (".", [(".",MATCH_VALUE)])])
+predictions["prefixexp"] = compile_prediction([
+    ("Name", [("Name",MATCH_TYPE)]),
+    ("(", [("(",MATCH_VALUE)])])
+predictions["exp_front"] = predictions["prefixexp"]
+predictions["stat_local"] = compile_prediction([
+    ("function", [("function",MATCH_VALUE)]),
+    ("namelist", firstSets["namelist"])])
+predictions["laststat"] = compile_prediction([
+    ("return", [("return",MATCH_VALUE)]),
+    ("break", [("break",MATCH_VALUE)])])
+predictions["parlist"] = compile_prediction([
+    ("...", [("...",MATCH_VALUE)]),
+    ("Name", [("Name",MATCH_TYPE)])])
+
+# the exp alternatives that are one terminal, predict has already
+# checked the token so there is no need to match it again (see operand)
+OPERAND_TERMINALS = frozenset(("nil", "false", "true", "Number", "String", "..."))
+
+# Lua's operator priorities, (left, right) for each binary operator
+# an operator after an operand takes the operand from the operator
+# before it if its left priority is higher than that one's right
+# priority, so a right priority lower than the left one, as for .. and
+# ^, makes the operator right associative
+BINARY_PRIORITY = {
+    "or": (1, 1), "and": (2, 2),
+    "<": (3, 3), "<=": (3, 3), ">": (3, 3), ">=": (3, 3), "==": (3, 3), "~=": (3, 3),
+    "..": (5, 4),
+    "+": (6, 6), "-": (6, 6),
+    "*": (7, 7), "/": (7, 7), "%": (7, 7),
+    "^": (10, 9)}
+UNARY_PRIORITY = 8
+BINOP_SET = firstSetLookup["binop"]
+UNOP_SET = firstSetLookup["unop"]
+
 # follow(exp) = firstSets["exp_p"] - firstSets["binop"]
 ## add followset of stat to exp_p
 ## add followset of chunk to exp_p
@@ -104,8 +271,10 @@ firstSets["stat_name"] = firstSets["stat_name_eap"] + firstSets["end_explist"]
 # and the value of the item, eg. a variable name has
 # value 'foo' and type 'Name
 # a number has type 'Number' and value '69.'
-def tokenize(code):
-    code = code.replace("\t","    ")
+# this is the original tokenizer, builds its regex on every call and
+# tries every kind of token in turn, Lexer below gives the same tokens
+# and is what is used, this is kept to check and benchmark it against
+def tokenize_regex(code):
     keywords = ["and","break","do","else","elseif","end","false",
             "for","function","if","in","local","nil","not","or",
             "repeat","return","then","true","until","while"]
@@ -126,35 +295,27 @@ def tokenize(code):
             ("Operator", operators_regex),
             ("String", r'\"([^\"\\]|\\.)*\"|\'([^\'\\]|\\.)*\''),
             ("Newline", r'\n'),
-            ("Empty", r' '),
+            ("Empty", r'[ \t]'),
             ("Error", r'.'), # Must be last
             ]
     tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in token_specification)
 
-    line_number = 1
-    line_start = 0
     for mo in re.finditer(tok_regex, code):
         kind = mo.lastgroup
         value = mo.group(kind)
-        if kind == "Newline":
-            line_start = mo.end()
-            line_number += 1
-        elif kind == "Comment":
-            line_number += 1
-        elif kind == "Empty":
+        if kind == "Newline" or kind == "Comment" or kind == "Empty":
             pass
         elif kind == 'Error':
-            raise RuntimeError('%r unexpected on line %d, could not interpret token' % (value, line_number))
+            raise RuntimeError('%r unexpected on line %d, could not interpret token' % (
+                    value, code.count("\n", 0, mo.start()) + 1))
         else:
             if kind == "String" and value:
                 value = value[1:-1] # remove first and last chars - quote marks
+                value = value.replace("\t","    ")
             elif kind == "LongString" and value:
                 # strip [==[ from start of long string
                 num_square_brackets = 0
                 prefix_suffix = 0
-                for v in value:
-                    if v == '\n':
-                        line_number += 1
                 for v in value:
                     prefix_suffix += 1
                     if v == "[":
@@ -165,154 +326,935 @@ def tokenize(code):
 
                 # strip ]==] from end of long string
                 value = value[:len(value)-prefix_suffix]
+                value = value.replace("\t","    ")
                 kind = "String"
                 pass
             elif kind == "Name" and value in keywords:
                 kind = "Keyword" # to convert keywords picked up as names to keywords
 
-            column = mo.start() - line_start
-            yield Token(kind, value, line_number, column)
-
+            yield Token(kind, value, mo.start())
+
+
+KEYWORDS = frozenset(["and","break","do","else","elseif","end","false",
+        "for","function","if","in","local","nil","not","or",
+        "repeat","return","then","true","until","while"])
+
+# what a token starting with a given character can be, for Lexer
+LEX_NAME = 0
+LEX_SPACE = 1
+LEX_OPERATOR = 2
+LEX_NEWLINE = 3
+LEX_NUMBER = 4
+LEX_STRING = 5
+LEX_DOT = 6 # number like .5 or operator . .. ...
+LEX_MINUS = 7 # comment or operator -
+LEX_SQUARE = 8 # long string or operator [
+LEX_TAB = 9
+
+# tokenizer that is compiled once and reused, gives the same tokens as
+# tokenize_regex, but rather than trying every kind of token in turn
+# it looks at the first character to decide what the token can be
+# names and keywords are matched by one small regex then looked up in
+# KEYWORDS, operators by the longest one in a table starting with that
+# character, and the regexes are only used for numbers/strings/comments
+class Lexer:
+    def __init__(self):
+        self.name_regex = re.compile(r'[_a-zA-Z][_a-zA-Z0-9]*')
+        self.spaces_regex = re.compile(r' +')
+        # Order in the Number matters, hex first
+        self.number_regex = re.compile(r'0[xX]([0-9a-fA-F]*)(\.[0-9a-fA-F]+)([pP]-?[0-9]+)?|0[xX]([0-9a-fA-F]+)(\.[0-9a-fA-F]*)?([pP]-?[0-9]+)?|([0-9]+)(\.[0-9]*)?([eE]-?[0-9]+)?|([0-9]*)(\.[0-9]+)([eE]-?[0-9]+)?')
+        self.string_regex = re.compile(r'\"([^\"\\]|\\.)*\"|\'([^\'\\]|\\.)*\'')
+        self.comment_regex = re.compile(r'--.*\n') # only works on single line comment
+        self.long_string_open_regex = re.compile(r'\[(=*)\[')
+
+        operators = ['+','-','*','/','%','^','#','==','~=',
+                '<=','>=','<','>','=','(',')','{','}','[',
+                ']',';',':',',','...','..','.',]
+        # operators by first character, longest first
+        self.operators = dict()
+        for op in sorted(operators, key=len, reverse=True):
+            self.operators[op[0]] = self.operators.get(op[0], ()) + (op,)
+
+        self.dispatch = dict()
+        for c in self.operators:
+            self.dispatch[c] = LEX_OPERATOR
+        for c in "_abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ":
+            self.dispatch[c] = LEX_NAME
+        for c in "0123456789":
+            self.dispatch[c] = LEX_NUMBER
+        self.dispatch['"'] = LEX_STRING
+        self.dispatch["'"] = LEX_STRING
+        self.dispatch[" "] = LEX_SPACE
+        self.dispatch["\t"] = LEX_TAB
+        self.dispatch["\n"] = LEX_NEWLINE
+        self.dispatch["."] = LEX_DOT
+        self.dispatch["-"] = LEX_MINUS
+        self.dispatch["["] = LEX_SQUARE
+
+    # the operator starting at pos, the longest one that is there
+    # or None if there is not one
+    def operator_at(self, code, pos):
+        for op in self.operators.get(code[pos], ()):
+            if code.startswith(op, pos):
+                return op
+        return None
+
+    # takes input program as a string and yields its tokens, the same
+    # as tokenize_regex
+    # works on code as it is, without making a copy with the tabs
+    # expanded, the tabs in a string value are expanded only for that
+    # value, the lexer keeps no line or column, see LineIndex
+    # pos starts it part way through code, from a line start it gave in
+    # line_starts, if that is a list then the offset of each line start
+    # the lexer can be started at again (ie. not in a string) is
+    # appended to it, and if unclosed is a list the offset of each long
+    # string opener that is not closed is appended to it
+    def tokenize(self, code, pos=0, line_starts=None, unclosed=None):
+        # everything used per token in locals
+        dispatch = self.dispatch
+        name_match = self.name_regex.match
+        keywords = KEYWORDS
+        # making the tuple directly skips the namedtuple __new__ call
+        new_tuple = tuple.__new__
+        token_class = Token
+        NAME = LEX_NAME
+        SPACE = LEX_SPACE
+        TAB = LEX_TAB
+        NEWLINE = LEX_NEWLINE
+        OPERATOR = LEX_OPERATOR
+        n = len(code)
+        while pos < n:
+            c = code[pos]
+            kind = dispatch.get(c)
+            if kind == NAME:
+                end = name_match(code, pos).end()
+                value = code[pos:end]
+                if value in keywords:
+                    # to convert keywords picked up as names to keywords
+                    yield new_tuple(token_class, ("Keyword", value, pos))
+                else:
+                    yield new_tuple(token_class, ("Name", value, pos))
+                pos = end
+                continue
+            elif kind == SPACE:
+                pos += 1
+                if pos < n and code[pos] == " ":
+                    pos = self.spaces_regex.match(code, pos).end()
+                continue
+            elif kind == NEWLINE:
+                pos += 1
+                if line_starts is not None:
+                    line_starts.append(pos)
+                continue
+            elif kind == TAB:
+                pos += 1
+                continue
+            elif kind == OPERATOR:
+                value = self.operator_at(code, pos)
+                if value is not None:
+                    yield new_tuple(token_class, ("Operator", value, pos))
+                    pos += len(value)
+                    continue
+            elif kind == LEX_NUMBER:
+                end = self.number_regex.match(code, pos).end()
+                yield new_tuple(token_class, ("Number", code[pos:end], pos))
+                pos = end
+                continue
+            elif kind == LEX_STRING:
+                mo = self.string_regex.match(code, pos)
+                if mo:
+                    # remove first and last chars - quote marks
+                    value = code[pos+1:mo.end()-1]
+                    if "\t" in value:
+                        value = value.replace("\t","    ")
+                    yield new_tuple(token_class, ("String", value, pos))
+                    pos = mo.end()
+                    continue
+            elif kind == LEX_DOT:
+                mo = self.number_regex.match(code, pos)
+                if mo:
+                    yield new_tuple(token_class, ("Number", mo.group(), pos))
+                    pos = mo.end()
+                    continue
+                value = self.operator_at(code, pos)
+                yield new_tuple(token_class, ("Operator", value, pos))
+                pos += len(value)
+                continue
+            elif kind == LEX_MINUS:
+                mo = self.comment_regex.match(code, pos)
+                if mo:
+                    # comment takes the newline with it
+                    pos = mo.end()
+                    if line_starts is not None:
+                        line_starts.append(pos)
+                    continue
+                yield new_tuple(token_class, ("Operator", "-", pos))
+                pos += 1
+                continue
+            elif kind == LEX_SQUARE:
+                mo = self.long_string_open_regex.match(code, pos)
+                if mo:
+                    # strip [==[ from start and ]==] from end of long string
+                    start = mo.end()
+                    end = code.find("]" + mo.group(1) + "]", start)
+                    if end != -1:
+                        value = code[start:end]
+                        if "\t" in value:
+                            value = value.replace("\t","    ")
+                        yield new_tuple(token_class, ("String", value, pos))
+                        pos = end + len(mo.group(1)) + 2
+                        continue
+                    if unclosed is not None:
+                        # a ]] added later on would make this a string
+                        unclosed.append(pos)
+                yield new_tuple(token_class, ("Operator", "[", pos))
+                pos += 1
+                continue
+            raise RuntimeError('%r unexpected on line %d, could not interpret token' % (
+                    c, code.count("\n", 0, pos) + 1))
+
+LEXER = Lexer()
 
-# the main function called into the run the program
-# tokenizes the file given as argument
-# appends EOF token to know where the end is
-# runs the program by calling doIt
-# prints the functions etc. nicely
-def parse(fname):
+# takes input program as a string and turns it into tokens
+# yields these tokens so they may be processed
+def tokenize(code):
+    return LEXER.tokenize(code)
 
-    program = ""
+# reads the whole file in one go, rather than adding it up line by line
+# which copies the program so far for every line, the tabs are left as
+# they are, the Lexer works on the string as is
+def read_program(fname):
     with open(fname, "r") as ins:
-        for line in ins:
-            program += line
-
-
+        return ins.read()
+
+# the EOF token put after the last token of code to know where the end is
+def eof_token(code):
+    return Token("EOF","EOF",len(code))
+
+# the lines and columns of the offsets in a program, tokens only have
+# their offset (pos) and most of them are never asked for theirs
+# - a line is counted from 1 and a column from 0, with a tab taking 4
+#   columns as if the tabs had been expanded
+# - a long string is on the line it starts on, and a comment's newline
+#   ends its line as any other does
+# the offsets of the line starts, and of the tabs, are found in one pass
+# over the program each on the first lookup, after that each lookup is a
+# few binary searches over them, so logging an error costs the same on
+# a very long line as on a short one
+NEWLINE_REGEX = re.compile(r'\n')
+TAB_REGEX = re.compile(r'\t')
+
+class LineIndex(object):
+    def __init__(self, code):
+        self.code = code
+        self.starts = None
+        self.tabs = None
+
+    def line_starts(self):
+        if self.starts is None:
+            self.starts = array.array('I', [0])
+            self.starts.extend(mo.end() for mo in NEWLINE_REGEX.finditer(self.code))
+        return self.starts
+
+    def tab_offsets(self):
+        if self.tabs is None:
+            self.tabs = array.array('I', (mo.start() for mo in TAB_REGEX.finditer(self.code)))
+        return self.tabs
+
+    def line(self, pos):
+        return bisect.bisect_right(self.line_starts(), pos)
+
+    def column(self, pos):
+        return self.position(pos)[1]
+
+    # (line, column) of pos
+    def position(self, pos):
+        line = self.line(pos)
+        start = self.starts[line - 1]
+        tabs = self.tab_offsets()
+        return line, pos - start + 3 * (bisect.bisect_left(tabs, pos) - bisect.bisect_left(tabs, start))
+
+# turns a program string into the list of tokens the parser runs over
+# appends EOF token to know where the end is
+def tokens_of(program):
     tokens = []
     for token in tokenize(program):
         tokens.append(token)
     # append EOF token
-    EOF = Token("EOF","EOF",0 if len(tokens) == 0 else tokens[-1].line+1,0)
-    tokens.append(EOF)
-
-    print("The tokens read in")
+    tokens.append(eof_token(program))
+    return tokens
+
+# the same tokens as tokens_of but yielded one at a time, EOF last
+# with lex_jobs above 1 they are all lexed first, by tokenize_parallel
+def token_stream(program, lex_jobs=None):
+    tokens = tokenize(program) if lex_jobs is None or lex_jobs <= 1 else tokenize_parallel(program, lex_jobs)
+    for token in tokens:
+        yield token
+    yield eof_token(program)
+
+# parallel lexing
+# a very big program is split into chunks at line starts that are
+# lexed over a pool of processes, each chunk as if it were a program of
+# its own, then put back together with their offsets moved on, giving
+# the same tokens as tokenize
+# a chunk is only used as lexed if the lexer got to its start in a
+# plain state (a line start, not in a string) and nothing in it could
+# depend on what comes after it (a long string that is not closed
+# in it, or a string the lexer could not end), which is found out from
+# the chunks before it, so the split points are only guesses, made by a
+# quick scan, a chunk that was split at a bad one is lexed again here
+# from where the one before it ended, up to the next chunk it can use
+
+# programs smaller than this are lexed by tokenize, a pool costs more
+PARALLEL_LEX_MIN = 4 * 1024 * 1024
+
+# chunks made for each process, more than one so one slow chunk does
+# not hold the others up
+CHUNKS_PER_JOB = 4
+
+# lines looked at after the wanted split point for one that is safe
+SPLIT_TRIES = 1000
+
+LONG_BRACKET_REGEX = re.compile(r'\[=*\[|\]=*\]')
+
+# the line starts to split code at into chunks of about size, for
+# tokenize_parallel, as (start, end) pairs
+def chunk_bounds(code, size):
+    bounds = []
+    start = 0
+    while len(code) - start > size:
+        end = split_point(code, start, start + size)
+        if end is None:
+            break
+        bounds.append( (start, end) )
+        start = end
+    bounds.append( (start, len(code)) )
+    return bounds
+
+# a line start at or after target, chunk_start being one, that is out
+# of any long string opened since chunk_start and after a line with no
+# comment in it and quotes that pair up, None if there is not one
+# long brackets in comments and strings are taken as long brackets,
+# which only makes the guess worse
+def split_point(code, chunk_start, target):
+    close = None
+    for mo in LONG_BRACKET_REGEX.finditer(code, chunk_start, target):
+        bracket = mo.group()
+        if close is None and bracket[0] == "[":
+            close = "]" + bracket[1:-1] + "]"
+        elif bracket == close:
+            close = None
+    pos = target
+    if close is not None:
+        pos = code.find(close, target)
+        if pos == -1:
+            return None
+    first = None
+    for _ in range(SPLIT_TRIES):
+        end = code.find("\n", pos)
+        if end == -1 or end + 1 >= len(code):
+            break
+        line = code[code.rfind("\n", 0, end) + 1:end]
+        if "--" not in line and line.count('"') % 2 == 0 and line.count("'") % 2 == 0:
+            return end + 1
+        if first is None:
+            first = end + 1
+        pos = end + 1
+    return first
+
+# the line starts a chunk's lexer went past, only the last one is kept
+class ChunkStarts(object):
+    def __init__(self):
+        self.last = 0
+
+    def append(self, pos):
+        self.last = pos
+
+# what lexing a chunk by itself gave, its tokens as columns, types and
+# values as lists and offsets as an array, so they are quick to send
+# back, and if the lexer ended at a line start at the end of the chunk
+LexedChunk = collections.namedtuple('LexedChunk', ['types', 'values', 'positions', 'ended'])
+
+# lexes a chunk as a program of its own, None if it could not be or
+# has a long string opener not closed in it, as either can depend on
+# what comes after it
+def lex_chunk(chunk):
+    types = []
+    values = []
+    positions = array.array('I')
+    starts = ChunkStarts()
+    unclosed = []
+    paused = pause_gc()
+    try:
+        for token in LEXER.tokenize(chunk, 0, starts, unclosed):
+            types.append(token.type)
+            values.append(token.value)
+            positions.append(token.pos)
+    except RuntimeError:
+        return None
+    finally:
+        resume_gc(paused)
+    if unclosed:
+        return None
+    return LexedChunk(types, values, positions, starts.last == len(chunk))
+
+# the same tokens as list(tokenize(code)), lexed over jobs processes
+# (all of the cpus by default, never more than there are), by tokenize
+# if there is one cpu or code is too small for a pool to be quicker,
+# chunk_size is the size of each chunk to lex
+def tokenize_parallel(code, jobs=None, chunk_size=None):
+    cpus = os.cpu_count() or 1
+    jobs = cpus if jobs is None else min(jobs, cpus)
+    if jobs <= 1 or len(code) < PARALLEL_LEX_MIN:
+        return list(tokenize(code))
+    if chunk_size is None:
+        chunk_size = max(1, len(code) // (jobs * CHUNKS_PER_JOB))
+    bounds = chunk_bounds(code, chunk_size)
+    with multiprocessing.Pool(min(jobs, len(bounds))) as pool:
+        lexed = pool.map(lex_chunk, [code[start:end] for (start, end) in bounds], 1)
+    paused = pause_gc()
+    try:
+        return join_chunks(code, bounds, lexed)
+    finally:
+        resume_gc(paused)
+
+# the cyclic garbage collector is paused while the tokens of a chunk are
+# made and put together, they cannot be in a cycle and the collections
+# that making millions of tuples sets off take longer than making them
+def pause_gc():
+    paused = gc.isenabled()
+    gc.disable()
+    return paused
+
+def resume_gc(paused):
+    if paused:
+        gc.enable()
+
+# the tokens of code from the chunks lex_chunk gave for bounds, the
+# chunks that cannot be used as they are lexed again
+def join_chunks(code, bounds, lexed):
+    tokens = []
+    new_tuple = tuple.__new__
+    starts = dict((start, k) for (k, (start, end)) in enumerate(bounds))
+    # the lexer is at a line start at pos, the start of chunk k
+    pos = 0
+    k = 0
+    while k < len(bounds):
+        (start, end) = bounds[k]
+        chunk = lexed[k]
+        last = k == len(bounds) - 1
+        if chunk is not None and pos == start and (last or chunk.ended):
+            positions = map(start.__add__, chunk.positions)
+            tokens.extend(map(new_tuple, itertools.repeat(Token),
+                    zip(chunk.types, chunk.values, positions)))
+            pos = end
+            k += 1
+            continue
+        # lexed from pos on as tokenize would, up to a line start that
+        # is the start of a chunk that can be used as it is
+        line_starts = []
+        seen = 0
+        token_iter = LEXER.tokenize(code, pos, line_starts)
+        resumed = False
+        while not resumed:
+            token = next(token_iter, None)
+            while seen < len(line_starts) and not resumed:
+                line_start = line_starts[seen]
+                seen += 1
+                j = starts.get(line_start)
+                if j is not None and j > k and lexed[j] is not None:
+                    pos = line_start
+                    k = j
+                    resumed = True
+            if resumed:
+                break
+            if token is None:
+                return tokens
+            tokens.append(token)
+    return tokens
+
+# the tokens of a stream, pulled only when the parser asks for them
+# the parser looks at most a few tokens ahead of i and one behind it
+# (and back to the start of a function name or an error when logging
+# it), so only the last history tokens are kept, anything older is
+# dropped and asking for it is an IndexError
+# a Repeater with lookback can give back its last repetition, however
+# long (an argument that is a function), so while one runs it keeps the
+# start of its repetition in pins, and no token from the oldest pin on
+# is dropped
+# len() is sys.maxsize until the end of the stream has been seen, which
+# is always PREFETCH tokens before the parser gets there, so the
+# 0 <= i < len(tokens) checks work as they do on a list
+class TokenWindow(object):
+    PREFETCH = 3
+
+    def __init__(self, token_iter, history=4096):
+        self.token_iter = iter(token_iter)
+        self.history = history
+        self.buffer = []
+        self.base = 0
+        # index of buffer[0] in the whole stream
+        self.ready = 0
+        # tokens in buffer that may be handed out without pulling more
+        self.length = sys.maxsize
+        # number of tokens in the stream, once the end has been seen
+        self.pins = []
+        # starts of the repetitions that may be given back, oldest first
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        k = i - self.base
+        if 0 <= k < self.ready:
+            return self.buffer[k]
+        return self.fill(i)
+
+    # pulls tokens until i + PREFETCH is in the buffer or the stream
+    # ends, dropping old tokens once there are twice history of them
+    # and at least history of them are older than the oldest pin
+    def fill(self, i):
+        if i < self.base:
+            raise IndexError("token %d has left the window, the oldest kept is %d" % (i, self.base))
+        buffer = self.buffer
+        want = i - self.base + self.PREFETCH + 1
+        while len(buffer) < want and self.length == sys.maxsize:
+            try:
+                buffer.append(next(self.token_iter))
+            except StopIteration:
+                self.length = self.base + len(buffer)
+        if len(buffer) > 2 * self.history:
+            drop = len(buffer) - self.history
+            if self.pins:
+                drop = min(drop, self.pins[0] - self.base)
+            if drop >= self.history:
+                del buffer[:drop]
+                self.base += drop
+        if self.length == sys.maxsize:
+            self.ready = len(buffer) - self.PREFETCH
+        else:
+            self.ready = len(buffer)
+        k = i - self.base
+        if k >= len(buffer):
+            raise IndexError("token %d is past the end of the stream" % i)
+        return buffer[k]
+
+# the tokens of a program kept in arrays rather than as a list of Token
+# namedtuples, a byte for the type, an int for the offset and one for
+# the value, which is an index into a table holding each
+# different value once, so a name used a thousand times is stored once
+# indexing it makes the Token on demand, so it can be used as a list,
+# the parser's checks and matches (contains, predict, match_t, match_v
+# and the like) read the arrays through type_code and value instead, so
+# no Token is made for them
+class TokenStore(object):
+    def __init__(self, tokens=()):
+        self.types = array.array('B')
+        self.positions = array.array('I')
+        self.values = array.array('I')
+        self.value_table = []
+        self.value_codes = dict()
+        for token in tokens:
+            self.append(token)
+
+    def append(self, token):
+        value_code = self.value_codes.get(token.value)
+        if value_code is None:
+            value_code = len(self.value_table)
+            self.value_codes[token.value] = value_code
+            self.value_table.append(token.value)
+        self.types.append(TOKEN_TYPE_CODES[token.type])
+        self.positions.append(token.pos)
+        self.values.append(value_code)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, i):
+        return tuple.__new__(Token, (TOKEN_TYPES[self.types[i]],
+                self.value_table[self.values[i]], self.positions[i]))
+
+    # the type of the token at i, as TOKEN_TYPE_CODES
+    def type_code(self, i):
+        return self.types[i]
+
+    def type(self, i):
+        return TOKEN_TYPES[self.types[i]]
+
+    def value(self, i):
+        return self.value_table[self.values[i]]
+
+# parses a program string with a new Parser and returns the ParseResult
+# prints nothing, so is safe to call from many threads at once
+def parse_program(program):
+    return Parser().parse_tokens(tokens_of(program), LineIndex(program))
+
+# same as parse_program but the tokens are streamed through a
+# TokenWindow, so only a window of them is ever held
+def parse_stream(program):
+    return Parser().parse_tokens(TokenWindow(token_stream(program)), LineIndex(program))
+
+# sends a TOKEN event for each token as it goes past
+def traced_tokens(tokens, trace_sink):
     for i, t in enumerate(tokens):
-        print(i,t)
-    print("Now the program starts fo real")
-    i = 0
+        trace_sink(TraceEvent(TOKEN, None, i, 0, t))
+        yield t
+
+# runs a new parser over program, as parse below does, without printing
+# with a cache (a baba_cache.ParseCache) a program that has been parsed
+# before is not parsed again, its result has tokens of None then, the
+# cache is not used when tracing as there would be nothing to trace
+# engine is one of ENGINES, recover and max_errors are as for Parser,
+# see make_parser, timer is a baba_stats.StageTimer to time the stages
+# with, or None
+# lex_jobs is as for token_stream
+def run_parser(program, trace_level=TRACE_OFF, trace_sink=None, stream=False, compact=False, cache=None,
+        engine=RECURSIVE, recover=False, max_errors=None, timer=None, lex_jobs=None):
+    key = None
+    if cache is not None and trace_level <= TRACE_OFF:
+        key = cache.key(program, "%s:%s:%s:%s" % (PARSER_VERSION, engine, recover, max_errors))
+        cached = run_stage(timer, STAGE_CACHE, lambda: cache.get(key))
+        if cached is not None:
+            return ParseResult.from_json(cached)
+
+    parser = make_parser(trace_level, trace_sink, engine, recover, max_errors)
+    tokens = token_stream(program, lex_jobs)
+    if trace_level >= TRACE_TOKENS:
+        tokens = traced_tokens(tokens, parser.trace_sink)
+    if stream:
+        # tokenized as the parse goes, so in its stage
+        tokens = TokenWindow(tokens)
+    elif compact:
+        tokens = run_stage(timer, STAGE_TOKENIZE, lambda: TokenStore(tokens), len)
+    else:
+        tokens = run_stage(timer, STAGE_TOKENIZE, lambda: list(tokens), len)
 
-    i_b = i
-    i, tokens = doIt(i, tokens)
-    print("Output:",[str(t.type)+": "+str(t.value) for t in tokens[i_b:i]])
+    result = run_stage(timer, STAGE_PARSE, lambda: parser.parse_tokens(tokens, LineIndex(program)), result_tokens)
+    if key is not None:
+        run_stage(timer, STAGE_CACHE, lambda: cache.put(key, result.to_json()))
+    return result
 
-    # if any errors
-    if len(error_list) > 0:
-        f = error_list_string
+# the main function called into the run the program
+# tokenizes the file given as argument
+# runs the program by calling doIt on a new Parser
+# prints the functions etc. nicely and returns the ParseResult
+# with trace_level above TRACE_OFF a TracingParser is used instead that
+# sends what it does to trace_sink, see the tracing section below
+# with stream the tokens are pulled from the tokenizer as the parser
+# needs them rather than all made first, with compact they are all made
+# first but kept in a TokenStore
+# cache, engine, recover, max_errors, timer and lex_jobs are as for run_parser
+def parse(fname, trace_level=TRACE_OFF, trace_sink=None, stream=False, compact=False, cache=None,
+        engine=RECURSIVE, recover=False, max_errors=None, timer=None, lex_jobs=None):
+    program = run_stage(timer, STAGE_READ, lambda: read_program(fname))
+    result = run_parser(program, trace_level, trace_sink, stream, compact, cache, engine, recover, max_errors,
+            timer, lex_jobs)
+    print(run_stage(timer, STAGE_REPORT, result.report))
+    return result
+
+
+
+
+# stats
+# what each stage of a parse took, so a slow file can be told to be
+# lexer, parser or report bound, parse and run_parser run each stage
+# through run_stage, which times it with the timer given to them, a
+# baba_stats.StageTimer, and times nothing without one
+# - read, reading the file
+# - cache, looking the program up in the cache, and storing its result
+# - tokenize, making all of the tokens, not there when streaming them
+#   as then that is done as the parse goes
+# - parse, the parser over the tokens
+# - report, making the string printed at the end
+
+STAGE_READ = "read"
+STAGE_CACHE = "cache"
+STAGE_TOKENIZE = "tokenize"
+STAGE_PARSE = "parse"
+STAGE_REPORT = "report"
+
+# f() as the stage name of timer, or just f() if timer is None
+def run_stage(timer, name, f, count=None):
+    if timer is None:
+        return f()
+    return timer.run(name, f, count)
+
+# the tokens a parse went over, None if that is not known, ie. when it
+# was streamed and stopped before the end
+def result_tokens(result):
+    n = len(result.tokens)
+    return n if n != sys.maxsize else None
+
+
+
+# batch
+# parsing many files at once over a pool of processes, each file is
+# parsed by itself as parse does, and the results come back in the
+# order of the files, only the file names go to the workers and only
+# the results without their tokens come back
+
+LUA_SUFFIX = ".lua"
+
+# what one file of a batch gave, failure is the exception as a string
+# if the parser gave up on it, then result is None
+BatchResult = collections.namedtuple('BatchResult', ['fname', 'result', 'failure'])
+
+# the files named by paths, a directory is every .lua file under it
+# and a path with *?[ in it a glob, in order and each file once
+def expand_paths(paths):
+    fnames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for f in sorted(files):
+                    if f.endswith(LUA_SUFFIX):
+                        fnames.append(os.path.join(root, f))
+        elif any(c in path for c in "*?["):
+            fnames.extend(sorted(glob.glob(path, recursive=True)))
+        else:
+            fnames.append(path)
+    return unique(fnames)
+
+# parses one file of a batch, an exception from the parser is caught so
+# one bad file does not end the batch
+def parse_batch_file(fname, stream=False, compact=False, cache=None, engine=RECURSIVE, recover=False,
+        max_errors=None):
+    try:
+        result = run_parser(read_program(fname), stream=stream, compact=compact, cache=cache, engine=engine,
+                recover=recover, max_errors=max_errors)
+    except Exception as e:
+        return BatchResult(fname, None, "%s: %s" % (type(e).__name__, e))
+    return BatchResult(fname, result._replace(tokens=None), None)
+
+# each worker process opens its own cache, see init_batch_worker
+batch_worker_options = dict()
+
+def init_batch_worker(stream, compact, cache_path, cache_bytes, engine, recover, max_errors):
+    batch_worker_options["stream"] = stream
+    batch_worker_options["compact"] = compact
+    batch_worker_options["cache"] = open_cache(cache_path, cache_bytes)
+    batch_worker_options["engine"] = engine
+    batch_worker_options["recover"] = recover
+    batch_worker_options["max_errors"] = max_errors
+
+def batch_worker(fname):
+    return parse_batch_file(fname, **batch_worker_options)
+
+# a baba_cache.ParseCache at cache_path, or None if there is no path
+def open_cache(cache_path, cache_bytes=None):
+    if not cache_path:
+        return None
+    import baba_cache
+    if cache_bytes is None:
+        return baba_cache.ParseCache(cache_path)
+    return baba_cache.ParseCache(cache_path, cache_bytes)
+
+# yields a BatchResult for each of fnames, in order, parsed over jobs
+# processes (all of the cpus if None), with one job they are parsed here
+# the files go to the workers in chunks, small enough that the workers
+# finish at about the same time
+def parse_files(fnames, jobs=None, stream=False, compact=False, cache_path=None, cache_bytes=None,
+        engine=RECURSIVE, recover=False, max_errors=None):
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(fnames))
+    if jobs <= 1:
+        cache = open_cache(cache_path, cache_bytes)
+        for fname in fnames:
+            yield parse_batch_file(fname, stream, compact, cache, engine, recover, max_errors)
+        return
+    chunksize = max(1, len(fnames) // (jobs * 16))
+    with multiprocessing.Pool(jobs, init_batch_worker,
+            (stream, compact, cache_path, cache_bytes, engine, recover, max_errors)) as pool:
+        for batch_result in pool.imap(batch_worker, fnames, chunksize):
+            yield batch_result
+
+# a BatchResult as one line of JSON
+def batch_result_json(batch_result):
+    record = collections.OrderedDict()
+    record["file"] = batch_result.fname
+    if batch_result.failure is not None:
+        record["failure"] = batch_result.failure
     else:
-        f = functions_string
-    print(f(tokens))
-
+        result_record(batch_result.result, record)
+    return json.dumps(record)
+
+# adds the functions and errors of a ParseResult to record, for JSON
+def result_record(result, record):
+    record["functions"] = [{"line": line, "name": f_name, "params": params}
+            for (line, f_name, params) in result.functions()]
+    record["errors"] = [err.to_dict() for err in result.error_list]
+    return record
+
+# a BatchResult as text, the file name then its report as parse prints it
+def batch_result_text(batch_result):
+    if batch_result.failure is not None:
+        report = "Failed: " + batch_result.failure + "\n"
+    else:
+        report = batch_result.result.report()
+    return "==> " + batch_result.fname + " <==\n" + report + "\n"
+
+# parses every file in paths (see expand_paths) and writes the results
+# to out in order, as text or as NDJSON, one line per file
+# returns the number of files that had errors or failed
+def batch(paths, jobs=None, output_format="text", out=None, stream=False, compact=False,
+        cache_path=None, cache_bytes=None, engine=RECURSIVE, recover=False, max_errors=None):
+    out = out or sys.stdout
+    fnames = expand_paths(paths)
+    format_result = batch_result_json if output_format == "ndjson" else batch_result_text
+    bad = 0
+    for batch_result in parse_files(fnames, jobs, stream, compact, cache_path, cache_bytes, engine,
+            recover, max_errors):
+        if batch_result.failure is not None or batch_result.result.error_list:
+            bad += 1
+        out.write(format_result(batch_result) + ("\n" if output_format == "ndjson" else ""))
+    out.flush()
+    return bad
+
+
+
+# kinds of ParseError
+ERROR_TYPE = "type" # the token was not of the type expected
+ERROR_VALUE = "value" # the token was not the value expected
+ERROR_EXPECTED = "expected" # none of the set named by expected starts with the token
+ERROR_EOF = "eof" # the file ended where there had to be more
+ERROR_LIMIT = "limit" # max_errors, expected, had been logged so the parse stopped
+
+# expected-set ids of the sets in baba_grammar's table start with this
+TABLE_SET_PREFIX = "table:"
+
+# one error logged by a parse, kept as what went wrong rather than as a
+# message, which is only made by message() when it is printed
+# - index, the token it is at
+# - rule, the nonterminal it was logged in, None if not known
+# - expected, the type or value that had to be there, or the id of the
+#   set of them, see expected_set
+# - received, the (start, end) span of tokens got instead
+# - token, the token at index, None if there is not one, which has what
+#   was got, so no other tokens are needed
+# - line and column of the token, looked up when the error was logged,
+#   None if there is no token or the parser had no LineIndex
+class ParseError(collections.namedtuple('ParseError',
+        ['kind', 'index', 'rule', 'expected', 'received', 'token', 'line', 'column'])):
+    __slots__ = ()
+
+    # line and column as strings, empty if they are not known
+    def position(self):
+        if self.line is None:
+            return "", ""
+        return str(self.line), str(self.column)
+
+    def message(self):
+        token = self.token
+        if self.kind == ERROR_TYPE:
+            return "Expected-type '" + self.expected + "' but got '" + token.value + "' of type '" + token.type + "'"
+        if self.kind == ERROR_VALUE:
+            return "Expected-value '" + self.expected + "' but got '" + token.value + "'"
+        if self.kind == ERROR_EXPECTED:
+            return ("Expected one of " + ", ".join("`" + v + "´" for v in self.expected_items())
+                    + " but got `" + token.value + "´")
+        if self.kind == ERROR_LIMIT:
+            return "Too many errors, stopped after " + str(self.expected)
+        return "Unexpected end of file"
+
+    # the things one of which was expected, in order and each once, with
+    # Name as variable name, for an ERROR_EXPECTED
+    def expected_items(self):
+        items = []
+        for (value, match_type) in expected_set(self.expected):
+            if value == "Name" and match_type == MATCH_TYPE:
+                value = "variable name"
+            items.append(value)
+        return unique(items)
+
+    # as a JSON object, the message included
+    def to_dict(self):
+        (line, column) = self.position()
+        record = collections.OrderedDict()
+        record["line"] = int(line) if line else None
+        record["column"] = int(column) if column else None
+        record["message"] = self.message()
+        record["kind"] = self.kind
+        record["index"] = self.index
+        record["rule"] = self.rule
+        record["expected"] = self.expected
+        record["received"] = list(self.received)
+        return record
+
+# the (value, MATCH_TYPE/MATCH_VALUE) list an expected-set id stands for,
+# ids are the names in firstSets, or TABLE_SET_PREFIX and a rule of the
+# table TableParser runs
+def expected_set(set_id):
+    if set_id.startswith(TABLE_SET_PREFIX):
+        import baba_grammar
+        return baba_grammar.expected_set(set_id[len(TABLE_SET_PREFIX):])
+    return firstSets[set_id]
+
+# everything found by one parse, the tokens it ran over, the
+# (line, name) of the functions, their params and the errors as
+# ParseErrors, made by Parser.parse_tokens so it holds nothing global,
+# the text is taken from the tokens when it is logged so none of the
+# lists need the tokens to still be there
+class ParseResult(collections.namedtuple('ParseResult',
+        ['tokens', 'function_name_list', 'function_params_list', 'error_list'])):
+    __slots__ = ()
+
+    # pairs up function_name_list and function_params_list into
+    # (line, name, params) tuples, ie. (3, "foo.bar:baz", "a,b,...")
+    def functions(self):
+        ret = []
+        for ((line, f_name), params) in zip(self.function_name_list, self.function_params_list):
+            ret.append( (line, f_name, params) )
+        return ret
+
+    # the functions found as a nice string
+    def functions_string(self):
+        ret = ""
+        if len(self.function_name_list) != len(self.function_params_list):
+            # we're screwed, errors so function declares and
+            # func params don't line up, so we don't know
+            ret += "Length of functions name list does not match that of functions params list, cannot print functions list\n"
+        else:
+            ret += "Printing functions\n"
+            for (line, f_name, params) in self.functions():
+                ret += "Line " + str(line) + ": " + f_name + " (" + params + ")" + '\n'
+
+        return ret
+
+    # turns the error list into a string
+    # that can be printed
+    def error_list_string(self):
+        errString = ""
+        for err in self.error_list:
+            (err_line, err_col) = err.position()
+            this_err = "Error (line " + err_line + ",col "+err_col+") " + err.message()
+            errString += this_err + "\n"
+
+        return errString
+
+    # the lists as JSON, without the tokens
+    def to_json(self):
+        return json.dumps([self.function_name_list, self.function_params_list, self.error_list])
+
+    # a ParseResult from what to_json gave, with tokens of None
+    @classmethod
+    def from_json(cls, text):
+        (function_name_list, function_params_list, error_list) = json.loads(text)
+        return cls(None,
+                [tuple(f) for f in function_name_list],
+                function_params_list,
+                [ParseError(kind, index, rule, expected, tuple(received), token and Token(*token), line, column)
+                        for (kind, index, rule, expected, received, token, line, column) in error_list])
+
+    # the string printed at the end of a run, the errors if there
+    # were any else the functions found
+    def report(self):
+        if len(self.error_list) > 0:
+            return self.error_list_string()
+        return self.functions_string()
 
 
-# converts the tuples of function positions/args positions in the
-# function_name_list and function_params_list to a nice string
-def functions_string(tokens):
-    ret = ""
-    if len(function_name_list) != len(function_params_list):
-        # we're screwed, errors so function declares and
-        # func params don't line up, so we don't know
-        print("Length of functions name list does not match that of functions params list, cannot print functions list")
-        pass
-    else:
-        ret += "Printing functions\n"
-        n = len(function_name_list)
-        for j in range(0, n):
-            f_name = ""
-            params = ""
-            line = ""
-            line += str(tokens[function_name_list[j][0]].line)
-            # name of function
-            if function_name_list[j][0] == ANON or function_name_list[j][1] == ANON:
-                # anon function
-                f_name += ANONYMOUS_FUNCTION
-            else:
-                for k in range(function_name_list[j][0],
-                        function_name_list[j][1]):
-                    f_name += tokens[k].value
-
-            # params list string
-            params += "("
-            for k in range(function_params_list[j][0],
-                    function_params_list[j][1]):
-                params += tokens[k].value
-            params += ")"
-            ret += "Line " + line + ": " + f_name + " " + params + '\n'
-
-    return ret
-
-# appends start and end index of function name to function_name_list
-# ie. (i,ANON) -> anon function
-# (5,6) -> function bla where bla at 5
-# (5 8) -> function bla.blabla
-def log_function_name(start_i, end_i):
-    global function_name_list
-    function_name_list.append( (start_i, end_i) )
-
-# same as above but for logging function parameters
-def log_params(start_i, end_i):
-    print("Logging params",start_i,end_i)
-    global function_params_list
-    function_params_list.append( (start_i, end_i) )
-
-# function to take error and print it
-# only if errors switch is 0
-def error(i_tup,tokens,*err):
-    global error_list
-    global errors_switch
-    if errors_switch == 0:
-        print("Logging error, i is",i_tup[0])
-        err_str_list = []
-        for err_print in err:
-            err_str_list.append(err_print)
-        error_list.append( (i_tup,err_str_list) )
-
-# wrapper for 'error' function in the case where entered a grammar function
-# but could not find any matches, is passed lists that are first sets
-# and prints adds the unique elements of these to the err printout
-# to say expected item from that set
-def error_expected(i_tup,tokens,firstSets,*err):
-    err_print = ""
-    expected_values = []
-    # add "=", ";", "Name" etc
-    for (value,type) in firstSets:
-        # change name to nicer case of variable name
-        val = value
-        if value == "Name" and type == MATCH_TYPE:
-            val = "variable name"
-        expected_values.append(val)
-
-    expected_values_uniq = unique(expected_values)
-
-    err_print += "Expected one of "
-    err_print_expected_items = ""
-    for v in expected_values_uniq:
-        err_print_expected_items += "`" + v + '´' + ", "
-    # strip trailing comma and space
-    if err_print_expected_items:
-        err_print_expected_items = err_print_expected_items[:-2]
-    err_print += err_print_expected_items
-    
-    # add the variable to err printout,
-    # even if it's like a.b[3]
-    received_var = ""
-    start_tok = i_tup[0]
-    end_tok = i_tup[1]
-    if start_tok == end_tok:
-        end_tok += 1
-    for j in range(start_tok, end_tok):
-        received_var += tokens[j].value
-    err_print += " but got `" + received_var + '´'
-
-    error(i_tup,tokens,err_print,*err)
 
 # unique elements from a list, optim is func in local var
 # http://stackoverflow.com/questions/480214/how-do-you-remove-duplicates-from-a-list-in-whilst-preserving-order
@@ -321,703 +1263,1090 @@ def unique(seq):
     seen_add = seen.add
     return [x for x in seq if not (x in seen or seen_add(x))]
 
-# turns the error list into a string
-# that can be printed
-def error_list_string(tokens):
-    errString = ""
-    for j in range(0, len(error_list)):
-        err_start_token_index = error_list[j][0][0]
-        err_end_token_index = error_list[j][0][1]
-        err_print_list = error_list[j][1]
+# function that checks if the current token matches to any in the
+# compiled firstSet passed in, returning a boolean
+# -- and not changing program state --
+# no match_v/match_t calls are made so no errors can be logged here
+def contains(i, tokens, firstSet):
+    if 0 <= i < len(tokens):
+        if tokens.__class__ is TokenStore:
+            return tokens.value(i) in firstSet.values or tokens.type_code(i) in firstSet.type_codes
+        token = tokens[i]
+        return token.value in firstSet.values or token.type in firstSet.types
+    return False
 
-        this_err = ""
-        items = ""
+# the values of the tokens from start_i up to end_i joined together,
+# stops at the end of the tokens
+def tokens_text(tokens, start_i, end_i):
+    text = ""
+    try:
+        for k in range(start_i, end_i):
+            text += token_value(tokens, k)
+    except IndexError:
+        pass
+    return text
+
+# the value and the type of the token at i, without making the Token if
+# tokens is a TokenStore
+def token_value(tokens, i):
+    if tokens.__class__ is TokenStore:
+        return tokens.value(i)
+    return tokens[i].value
+
+def token_type(tokens, i):
+    if tokens.__class__ is TokenStore:
+        return tokens.type(i)
+    return tokens[i].type
+
+# line of the token at i, or "" if there is none or no line_index
+def token_line(tokens, i, line_index):
+    try:
+        token = tokens[i]
+    except IndexError:
+        return ""
+    return line_index.line(token.pos) if line_index is not None else ""
+
+# returns the alternative of a nonterminal that the current token
+# predicts from its prediction table, or None if no alternative can
+# start with that token, only looks at the table, no errors logged
+NO_PREDICTION = (sys.maxsize, None)
+def predict(i, tokens, prediction):
+    if 0 <= i < len(tokens):
+        if tokens.__class__ is TokenStore:
+            by_value = prediction.values.get(tokens.value(i), NO_PREDICTION)
+            by_type = prediction.type_codes.get(tokens.type_code(i), NO_PREDICTION)
+            return min(by_value, by_type)[1]
+        token = tokens[i]
+        by_value = prediction.values.get(token.value, NO_PREDICTION)
+        by_type = prediction.types.get(token.type, NO_PREDICTION)
+        return min(by_value, by_type)[1]
+    return None
+
+# the star/optional operators of the grammar, '{ B C }' and '[ B C ]'
+# these are made once when the grammar functions are defined (as class
+# attributes of Parser), not on every call, and run with
+# repeater.run(parser, i, tokens)
+# func_tuples are the things to match in order, either (value,MATCH_VALUE)
+# (type,MATCH_TYPE) or (rule,MATCH_FUNCTION) where rule is the name of a
+# grammar function of the parser or another Star/Optional
+# before doing the next 'B C' it looks ahead lookahead_n items to check
+# if it may, if not it stops, the first sets for this are worked out here
+# the reason for lookback is there is case in the grammar that is ambiguous
+# with fixed lookahead, for example { exp_args_back } exp_back
+# where an exp_args_back contains an exp_back
+# here a Star shall consume all it can, and then move the index back by
+# lookback to emulate not having consumed the last token
+# this behaviour is not backtracking, to be clear
+class Repeater:
+    repeat = False
+
+    def __init__(self, func_tuples, lookahead_n, lookback=0):
+        # only ever need to give back the last repetition
+        assert lookback in (0, 1)
+        self.func_tuples = func_tuples
+        self.lookback = lookback
+        lookahead_sets = []
+        for (match, match_type) in func_tuples[:lookahead_n]:
+            if match_type == MATCH_FUNCTION:
+                lookahead_sets.append(firstSetLookup[match])
+            else:
+                lookahead_sets.append(compile_first_set([(match, match_type)]))
+        self.lookahead_sets = tuple(lookahead_sets)
+        self.steps = dict()
+        # the func_tuples with the grammar functions looked up for
+        # each parser class that has used this, indexed by class
+
+    # for each item, (match, match_type) where for MATCH_FUNCTION match is
+    # the function to call with (parser, i, tokens)
+    def steps_for(self, parser_class):
+        steps = self.steps.get(parser_class)
+        if steps is None:
+            steps = []
+            for (match, match_type) in self.func_tuples:
+                if match_type == MATCH_FUNCTION:
+                    if isinstance(match, Repeater):
+                        match = match.run
+                    else:
+                        match = getattr(parser_class, match)
+                steps.append( (match, match_type) )
+            steps = tuple(steps)
+            self.steps[parser_class] = steps
+        return steps
+
+    # this function performs lookahead of up to lookahead_n, if a match
+    # fails it will return immediately False, else if
+    # all lookahead succeeds it will return true
+    def lookahead(self, i, tokens):
+        for firstSet in self.lookahead_sets:
+            if not contains(i, tokens, firstSet):
+                return False
+            i += 1
+        return True
+
+    def run(self, parser, i, tokens):
+        if not parser.lookahead(self, i, tokens):
+            # if no match at all
+            return i, tokens
+        steps = self.steps_for(parser.__class__)
+        pins = self.pins_of(tokens)
+        while True:
+            previous_i = i
+            if pins is not None:
+                pins[-1] = i
+            for (match, match_type) in steps:
+                if match_type == MATCH_FUNCTION:
+                    i, tokens = match(parser, i, tokens)
+                elif match_type == MATCH_VALUE:
+                    if parser.match_v(tokens, i, match):
+                        i += 1
+                elif parser.match_t(tokens, i, match):
+                    i += 1
+            if not self.repeat:
+                return i, tokens
+            # next iter
+            if not parser.lookahead(self, i, tokens):
+                # we're breaking
+                # moving the index back in case of lookback
+                if self.lookback:
+                    i = previous_i
+                    parser.backtrack(i)
+                if pins is not None:
+                    pins.pop()
+                return i, tokens
+
+    # the pins of tokens if it is a TokenWindow and this may give back a
+    # repetition, with one more for this run, which keeps the start of
+    # its repetition, otherwise None
+    def pins_of(self, tokens):
+        if self.lookback and self.repeat and tokens.__class__ is TokenWindow:
+            tokens.pins.append(0)
+            return tokens.pins
+        return None
+
+    # the same as run but as a generator for baba_stack.StackParser,
+    # rather than calling a grammar function it yields (name or Repeater,
+    # i, tokens) and is sent back the i, tokens it gave
+    def walk(self, parser, i, tokens):
+        if not parser.lookahead(self, i, tokens):
+            return i, tokens
+        pins = self.pins_of(tokens)
+        while True:
+            previous_i = i
+            if pins is not None:
+                pins[-1] = i
+            for (match, match_type) in self.func_tuples:
+                if match_type == MATCH_FUNCTION:
+                    i, tokens = yield (match, i, tokens)
+                elif match_type == MATCH_VALUE:
+                    if parser.match_v(tokens, i, match):
+                        i += 1
+                elif parser.match_t(tokens, i, match):
+                    i += 1
+            if not self.repeat:
+                return i, tokens
+            if not parser.lookahead(self, i, tokens):
+                if self.lookback:
+                    i = previous_i
+                    parser.backtrack(i)
+                if pins is not None:
+                    pins.pop()
+                return i, tokens
+
+# Star([(",",MATCH_VALUE),("var",MATCH_FUNCTION)], 2)
+# will continue to match things of form ', var' as long as both exist next
+# in the tokens list
+class Star(Repeater):
+    repeat = True
 
-        err_line = ""
-        err_col = ""
+# Optional([(",",MATCH_VALUE),("var",MATCH_FUNCTION)], 1)
+# will match things of form ', var' if it can look 1 ahead and find a comma
+# in the tokens list
+class Optional(Repeater):
+    repeat = False
+
+
+
+# raised by Parser.error once max_errors have been logged, parse_tokens
+# catches it and returns what was found up to there
+class TooManyErrors(Exception):
+    pass
+
+# one parse session, owns all the state that used to be module globals
+# so any number of these can be used one after another or at the same
+# time from different threads, each Parser should only be used for one
+# program at a time, parse_tokens returns a ParseResult
+class Parser:
+    def __init__(self):
+        self.errors_switch = 0
+        # used to turn off error logging when matching terminals
+        # but whilst looking ahead, as a non-match there is not an error
+        # when 0 errors are not logged, when entering lookahead function
+        # switch inced, when leaving switch decremented
+
+        self.function_name_list = []
+        self.function_params_list = []
+        # both of these are tuples that are the things named
+        # these are used to put tuples that are token positions in
+        # so later the function arguments and names can be used
+        self.function_name_starts = []
+        self.function_params_starts = []
+        # the token each of the above was logged at, for backtrack
+
+        self.error_list = []
+        # list of errors to print out later
+
+        self.recover = False
+        # panic mode error recovery, a token that does not match is not
+        # just skipped but everything up to a token in SYNC_SET, and the
+        # errors on the way there are not logged, see synchronize
+        self.max_errors = None
+        # the parse stops once this many errors are logged, None for no limit
+        self.quiet_until = -1
+        # errors at tokens up to this one are not logged when recovering
+        self.line_index = None
+        # the LineIndex of the program, to give the functions and errors
+        # logged their lines, without one they have none
+
+    # runs the whole program in tokens (which must end with the EOF token)
+    # through the parser and returns what was found, line_index is the
+    # program's LineIndex
+    def parse_tokens(self, tokens, line_index=None):
+        self.line_index = line_index
         try:
-            err_line += str(tokens[err_start_token_index].line)
-            err_col += str(tokens[err_start_token_index].column)
-        except IndexError:
+            i, tokens = self.doIt(0, tokens)
+        except TooManyErrors:
             pass
+        return self.result(tokens)
+
+    # what has been found so far, over the given tokens
+    def result(self, tokens):
+        return ParseResult(tokens, self.function_name_list,
+                self.function_params_list, self.error_list)
+
+    # appends line and name of the function to function_name_list
+    # from the tokens start_i up to end_i, end_i of ANON is an anon function
+    # ie. (5,6) -> function bla where bla at 5
+    # (5 8) -> function bla.blabla
+    def log_function_name(self, start_i, end_i, tokens):
+        line = token_line(tokens, start_i, self.line_index)
+        if end_i == ANON:
+            f_name = ANONYMOUS_FUNCTION
+        else:
+            f_name = tokens_text(tokens, start_i, end_i)
+        self.function_name_list.append( (line, f_name) )
+        self.function_name_starts.append(start_i)
+
+    # same as above but for logging function parameters
+    def log_params(self, start_i, end_i, tokens):
+        self.function_params_list.append(tokens_text(tokens, start_i, end_i))
+        self.function_params_starts.append(start_i)
+
+    # called by a Repeater with lookback when it gives back its last
+    # repetition, which is matched again from i by what comes after it,
+    # the functions logged in it are dropped as they are logged again then
+    def backtrack(self, i):
+        starts = self.function_name_starts
+        while starts and starts[-1] >= i:
+            starts.pop()
+            self.function_name_list.pop()
+        starts = self.function_params_starts
+        while starts and starts[-1] >= i:
+            starts.pop()
+            self.function_params_list.pop()
+
+    # called by exp for each operator once it has both its operands
+    # (the one operand for a unary one), in the order they would be
+    # evaluated, so a + b * c gives * then +, op_i is its token index
+    def reduce_operator(self, op, unary, op_i):
+        pass
 
-        for item in err_print_list:
-            items += item
-        this_err = "Error (line " + err_line + ",col "+err_col+") " + items
-        errString += this_err + "\n"
-
-    return errString
-    
-
-
-
-# wrapper/entry point for the parsing of the program
-def doIt(i, tokens):
-    i, tokens = chunk(i, tokens)
-    i, tokens = matchTypeNow(i, tokens, "EOF")
-    return i, tokens
-
-
-
-
-### subsequent functions all follow a similar structure and correspond
-# to the grammar
-# comments for them are therefore minimal as the grammar is the explaination
-# and any commenting would be very repetitive for the mostpart
-# some comments are provided in cases that differ somewhat from the norm
-
-def exp_p(i, tokens):
-    i, tokens = optional(i, tokens, [(binop,MATCH_FUNCTION),(exp,MATCH_FUNCTION),(exp_p,MATCH_FUNCTION)], 1)
-    return i, tokens
-
-def stat_for(i, tokens):
-    if contains(i, tokens, [("Name",MATCH_TYPE)]) and contains(i+1, tokens, [("=",MATCH_VALUE)]):
-        i, tokens = matchTypeNow(i, tokens, "Name")
-        i, tokens = matchValueNow(i, tokens, "=")
-        i, tokens = exp(i, tokens)
-        i, tokens = matchValueNow(i, tokens, ",")
-        i, tokens = exp(i, tokens)
-        i, tokens = optional(i, tokens, [(",",MATCH_VALUE),(exp,MATCH_FUNCTION)], 1)
-        i, tokens = matchValueNow(i, tokens, "do")
-        i, tokens = block(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "end")
-    elif contains(i, tokens, firstSets["namelist"]) and contains(i+1, tokens, [(",",MATCH_VALUE),("in",MATCH_VALUE)]):
-        i, tokens = namelist(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "in")
-        i, tokens = explist(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "do")
-        i, tokens = block(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "end")
-    else:
-        error_expected((i,i),tokens,firstSets["stat_for"])
-    return i, tokens
+    # function to take error and log it
+    # only if errors switch is 0
+    # logs a ParseError of kind at the token at the start of i_tup, no
+    # message is made until it is printed
+    # raises TooManyErrors once max_errors have been logged
+    def error(self, kind, i_tup, tokens, expected=None, rule=None):
+        if self.errors_switch == 0:
+            if self.recover and i_tup[0] <= self.quiet_until:
+                return
+            try:
+                token = tokens[i_tup[0]]
+            except IndexError:
+                token = None
+            (line, column) = (None, None)
+            if token is not None and self.line_index is not None:
+                (line, column) = self.line_index.position(token.pos)
+            self.error_list.append(ParseError(kind, i_tup[0], rule, expected, i_tup, token, line, column))
+            self.quiet_until = i_tup[0]
+            if self.max_errors is not None and len(self.error_list) >= self.max_errors:
+                self.error_list.append(ParseError(ERROR_LIMIT, i_tup[0], rule, self.max_errors, i_tup, token,
+                        line, column))
+                raise TooManyErrors()
+
+    # wrapper for 'error' function in the case where entered a grammar function
+    # but could not find any matches, set_id names the first set of the
+    # rule (see expected_set) whose items go in the message
+    # past the end (exp skips a token even at EOF) it is the end of file
+    # error at the last token, as match_t/match_v log there
+    def error_expected(self, i_tup, tokens, set_id):
+        if i_tup[0] >= len(tokens):
+            j = len(tokens) - 1
+            self.error(ERROR_EOF, (j,j), tokens, None, set_id)
+        else:
+            self.error(ERROR_EXPECTED, i_tup, tokens, set_id, set_id)
+
+    # wrapper/entry point for the parsing of the program
+    def doIt(self, i, tokens):
+        i, tokens = self.chunk(i, tokens)
+        # when recovering, a token the chunk stopped at (a stray end, say)
+        # is skipped along with anything up to the next statement, and
+        # the rest parsed as another chunk, up to EOF
+        while self.recover and i < len(tokens) and not self.match_t(tokens, i, "EOF"):
+            i = self.synchronize(i + 1, tokens, None)
+            i, tokens = self.chunk(i, tokens)
+        i, tokens = self.matchTypeNow(i, tokens, "EOF")
+        return i, tokens
+
+    ### subsequent functions all follow a similar structure and correspond
+    # to the grammar
+    # comments for them are therefore minimal as the grammar is the explaination
+    # and any commenting would be very repetitive for the mostpart
+    # some comments are provided in cases that differ somewhat from the norm
+
+    for_step = Optional([(",",MATCH_VALUE),("exp",MATCH_FUNCTION)], 1)
+    def stat_for(self, i, tokens):
+        if self.contains(i, tokens, NAME_SET) and self.contains(i+1, tokens, EQUALS_SET):
+            i, tokens = self.matchTypeNow(i, tokens, "Name")
+            i, tokens = self.matchValueNow(i, tokens, "=")
+            i, tokens = self.exp(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, ",")
+            i, tokens = self.exp(i, tokens)
+            i, tokens = self.for_step.run(self, i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "do")
+            i, tokens = self.block(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "end")
+        elif self.contains(i, tokens, firstSetLookup["namelist"]) and self.contains(i+1, tokens, COMMA_IN_SET):
+            i, tokens = self.namelist(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "in")
+            i, tokens = self.explist(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "do")
+            i, tokens = self.block(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "end")
+        else:
+            self.error_expected((i,i), tokens, "stat_for")
+        return i, tokens
+
+    local_assign = Optional([("=",MATCH_VALUE),("explist",MATCH_FUNCTION)], 1)
+    def stat_local(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["stat_local"])
+        if alternative == "function":
+            i, tokens = self.matchValueNow(i, tokens, "function")
+            i_b = i
+            i, tokens = self.matchTypeNow(i, tokens, "Name")
+            self.log_function_name(i_b, i, tokens)
+            i, tokens = self.funcbody(i, tokens)
+        elif alternative == "namelist":
+            i, tokens = self.namelist(i, tokens)
+            i, tokens = self.local_assign.run(self, i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "stat_local")
+        return i, tokens
+
+    def stat_name(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["stat_name"])
+        if alternative == "stat_name_eap":
+            i, tokens = self.stat_name_eap(i, tokens)
+        elif alternative == "end_explist":
+            i, tokens = self.end_explist(i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "stat_name")
+        return i, tokens
+
+    def stat_name_eap(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["stat_name_eap"])
+        if alternative == "exp_back":
+            i, tokens = self.exp_back(i, tokens)
+            i, tokens = self.end_explist(i, tokens)
+        elif alternative == "args_back":
+            i, tokens = self.args_back(i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "stat_name_eap")
+        return i, tokens
+
+    more_vars = Star([(",",MATCH_VALUE),("var",MATCH_FUNCTION)], 1)
+    def end_explist(self, i, tokens):
+        i, tokens = self.more_vars.run(self, i, tokens)
+        i, tokens = self.matchValueNow(i, tokens, "=")
+        i, tokens = self.explist(i, tokens)
+        return i, tokens
 
-def stat_local(i, tokens):
-    print("In stat local",i)
-    if contains(i, tokens, [("function",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "function")
+    elseifs = Star([("elseif",MATCH_VALUE),("exp",MATCH_FUNCTION),("then",MATCH_VALUE),("block",MATCH_FUNCTION)], 1)
+    else_block = Optional([("else",MATCH_VALUE),("block",MATCH_FUNCTION)], 1)
+    # the last exp_args_back matched is given back, see Star
+    exp_args_backs_lookback = Star([("exp_args_back",MATCH_FUNCTION)], 1, 1)
+    def stat(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["stat"])
+        if alternative == "Name":
+            i, tokens = self.matchTypeNow(i, tokens, "Name")
+            i, tokens = self.exp_args_backs_lookback.run(self, i, tokens)
+            i, tokens = self.stat_name(i, tokens)
+        elif alternative == "(":
+            i, tokens = self.matchValueNow(i, tokens, "(")
+            i, tokens = self.exp(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, ")")
+            i, tokens = self.exp_args_backs_lookback.run(self, i, tokens)
+            i, tokens = self.stat_name_eap(i, tokens)
+        elif alternative == "do":
+            i, tokens = self.matchValueNow(i, tokens, "do")
+            i, tokens = self.block(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "end")
+        elif alternative == "while":
+            i, tokens = self.matchValueNow(i, tokens, "while")
+            i, tokens = self.exp(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "do")
+            i, tokens = self.block(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "end")
+        elif alternative == "repeat":
+            i, tokens = self.matchValueNow(i, tokens, "repeat")
+            i, tokens = self.block(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "until")
+            i, tokens = self.exp(i, tokens)
+        elif alternative == "if":
+            i, tokens = self.matchValueNow(i, tokens, "if")
+            i, tokens = self.exp(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "then")
+            i, tokens = self.block(i, tokens)
+            i, tokens = self.elseifs.run(self, i, tokens)
+            i, tokens = self.else_block.run(self, i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "end")
+        elif alternative == "for":
+            i, tokens = self.matchValueNow(i, tokens, "for")
+            i, tokens = self.stat_for(i, tokens)
+        elif alternative == "function":
+            i, tokens = self.matchValueNow(i, tokens, "function")
+            i_b = i
+            i, tokens = self.funcname(i, tokens)
+            self.log_function_name(i_b, i, tokens)
+            i, tokens = self.funcbody(i, tokens)
+        elif alternative == "local":
+            i, tokens = self.matchValueNow(i, tokens, "local")
+            i, tokens = self.stat_local(i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "stat")
+            #error("Error in statement",tokens[i])
+            pass
+        
+        return i, tokens
+
+    def functiondef(self, i, tokens):
         i_b = i
-        i, tokens = matchTypeNow(i, tokens, "Name")
-        log_function_name(i_b,i)
-        i, tokens = funcbody(i, tokens)
-    elif contains(i, tokens, firstSets["namelist"]):
-        i, tokens = namelist(i, tokens)
-        i, tokens = optional(i, tokens,[("=",MATCH_VALUE),(explist,MATCH_FUNCTION)], 1)
-    else:
-        error_expected((i,i),tokens,firstSets["stat_local"])
-    return i, tokens
-
-def stat_name(i, tokens):
-    print("Welcome to the real world of stat_name",i)
-    if contains(i, tokens, firstSets["stat_name_eap"]):
-        i, tokens = stat_name_eap(i, tokens)
-    elif contains(i, tokens, firstSets["end_explist"]):
-        print("In stat name, should be going to end_explist",i)
-        i, tokens = end_explist(i, tokens)
-        print("Done with stat_name_explist",i)
-    else:
-        error_expected((i,i),tokens,firstSets["stat_name"])
-    print("Leaving the real world of stat_name",i)
-    return i, tokens
-
-def stat_name_eap(i, tokens):
-    if contains(i, tokens, firstSets["exp_back"]):
-        i, tokens = exp_back(i, tokens)
-        i, tokens = end_explist(i, tokens)
-    elif contains(i, tokens, firstSets["args_back"]):
-        i, tokens = args_back(i, tokens)
-    else:
-        error_expected((i,i),tokens,firstSets["stat_name_eap"])
-    return i, tokens
-
-def end_explist(i, tokens):
-    print("In end_explist",i)
-    i, tokens = star(i, tokens, [(",",MATCH_VALUE),(var,MATCH_FUNCTION)], 1)
-    print("In end_explist, done with star(,var) matches",i)
-    i, tokens = matchValueNow(i, tokens, "=")
-    print("In end_explist, matched = ",i)
-    i, tokens = explist(i, tokens)
-    print("In end_explist exiting, end",i)
-    return i, tokens
-
-def stat(i, tokens):
-    print("In stat",i)
-    if contains(i, tokens, [("Name",MATCH_TYPE)]):
-        print("\tIn name in stat",i)
-        i, tokens = matchTypeNow(i, tokens, "Name")
-        print("\tMatched name in stat",i)
-        i, tokens = star(i, tokens, [(exp_args_back,MATCH_FUNCTION)], 1, 1)
-        print("\tDone stat in exp_args_back in stat",i)
-        i, tokens = stat_name(i, tokens)
-        print("\tDone stat_name in stat",i)
-    elif contains(i, tokens, [("(",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "(")
-        i, tokens = exp(i, tokens)
-        i, tokens = matchValueNow(i, tokens, ")")
-        i, tokens = star(i, tokens, [(exp_args_back,MATCH_FUNCTION)], 1, 1)
-        i, tokens = stat_name_eap(i, tokens)
-    elif contains(i, tokens, [("do",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "do")
-        i, tokens = block(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "end")
-    elif contains(i, tokens, [("while",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "while")
-        i, tokens = exp(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "do")
-        i, tokens = block(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "end")
-    elif contains(i, tokens, [("repeat",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "repeat")
-        i, tokens = block(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "until")
-        i, tokens = exp(i, tokens)
-    elif contains(i, tokens, [("if",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "if")
-        i, tokens = exp(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "then")
-        i, tokens = block(i, tokens)
-        i, tokens = star(i, tokens, [("elseif",MATCH_VALUE),(exp,MATCH_FUNCTION),("then",MATCH_VALUE),(block,MATCH_FUNCTION)], 1)
-        i, tokens = optional(i, tokens, [("else",MATCH_VALUE),(block,MATCH_FUNCTION)], 1)
-        i, tokens = matchValueNow(i, tokens, "end")
-    elif contains(i, tokens, [("for",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "for")
-        i, tokens = stat_for(i, tokens)
-    elif contains(i, tokens, [("function",MATCH_VALUE)]):
-        print("In stat in function",i)
-        i, tokens = matchValueNow(i, tokens, "function")
+        i, tokens = self.matchValueNow(i, tokens, "function")
+        self.log_function_name(i_b, ANON, tokens)
+        i, tokens = self.funcbody(i, tokens)
+        return i, tokens
+
+    optional_parlist = Optional([("parlist",MATCH_FUNCTION)], 1)
+    def funcbody(self, i, tokens):
+        i, tokens = self.matchValueNow(i, tokens, "(")
         i_b = i
-        i, tokens = funcname(i, tokens)
-        log_function_name(i_b, i)
-        i, tokens = funcbody(i, tokens)
-        print("Out stat in function",i)
-    elif contains(i, tokens, [("local",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "local")
-        i, tokens = stat_local(i, tokens)
-    else:
-        error_expected((i,i),tokens,firstSets["stat"])
-        #error("Error in statement",tokens[i])
-        pass
-    
-    return i, tokens
-
-def functiondef(i, tokens):
-    i_b = i
-    print("In func def")
-    i, tokens = matchValueNow(i, tokens, "function")
-    log_function_name(i_b, ANON)
-    i, tokens = funcbody(i, tokens)
-    print("Out func def")
-    return i, tokens
-
-def funcbody(i, tokens):
-    i, tokens = matchValueNow(i, tokens, "(")
-    i_b = i
-    i, tokens = optional(i, tokens, [(parlist,MATCH_FUNCTION)], 1)
-    log_params(i_b, i)
-    i, tokens = matchValueNow(i, tokens, ")")
-    i, tokens = block(i, tokens)
-    i, tokens = matchValueNow(i, tokens, "end")
-    return i, tokens
-
-def block(i, tokens):
-    i, tokens = chunk(i, tokens)
-    return i, tokens
-
-def chunk(i, tokens):
-    my_i = i
-    print("In chunk, calling stat star",i)
-    i, tokens = star(i, tokens, [(stat,MATCH_FUNCTION),
-        (optional_curry([(";",MATCH_VALUE)],1),MATCH_FUNCTION)], 1)
-    print("Finished chunk star of stat",i)
-    i, tokens = optional(i, tokens, [(laststat,MATCH_FUNCTION),
-        (optional_curry([(";",MATCH_VALUE)],1),MATCH_FUNCTION)], 1)
-    print("Leaving chunk",i)
-    return i, tokens
-
-def laststat(i, tokens):
-    if contains(i, tokens, [("return",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "return")
-        i, tokens = optional(i, tokens, [(explist,MATCH_FUNCTION)], 1)
-    elif contains(i, tokens, [("break",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "break")
-    else:
-        error_expected((i,i),tokens,firstSets["laststat"])
-    return i, tokens
-
-def prefixexp(i, tokens):
-    print("Entered prefixexp",i)
-    if contains(i, tokens, [("Name",MATCH_TYPE)]):
-        i, tokens = matchTypeNow(i, tokens, "Name")
-        i, tokens = star(i, tokens, [(exp_args_back,MATCH_FUNCTION)], 1)
-    elif contains(i, tokens, [("(",MATCH_VALUE)]):
-        print("In prefixexp, in bracket 2nd",i)
-        i, tokens = matchValueNow(i, tokens, "(")
-        print("In prefixexp, matched bracket",i)
-        i, tokens = exp(i, tokens)
-        i, tokens = matchValueNow(i, tokens, ")")
-        i, tokens = star(i, tokens, [(exp_args_back,MATCH_FUNCTION)], 1)
-    else:
-        error_expected((i,i),tokens,firstSets["prefixexp"])
-    return i, tokens
-
-def var(i, tokens):
-    original_i = i
-    print("In var")
-    if contains(i, tokens, [("Name",MATCH_TYPE)]) and contains(i+1, tokens, [(",", MATCH_VALUE), ("=", MATCH_VALUE)]):
-        print("I'm actually never picked - kappa")
-        i, tokens = matchTypeNow(i, tokens, "Name")
-    elif contains(i, tokens, firstSets["exp_front"]):
-        print("In var, matched exp_front")
-        i, tokens = exp_front(i, tokens)
-        print("Done exp_front",i)
-        i, tokens = star(i, tokens, [(exp_args_back,MATCH_FUNCTION)], 1, 1)
-        print("Done exp_front",i)
-        i, tokens = exp_back(i, tokens)
-        print("Done exp_back that never happens, see i",i)
-    else:
-        error_expected((i,i),tokens,firstSets["var"])
-        i += 1
-    return i, tokens
-
-def exp_args_back(i, tokens):
-    print("In exp_args_back",i)
-    if contains(i, tokens, firstSets["exp_back"]):
-        print("Going from exp_args_back into exp_back",i)
-        i, tokens = exp_back(i, tokens)
-    elif contains(i, tokens, firstSets["args_back"]):
-        print("Going from exp_args_back into args_back",i)
-        i, tokens = args_back(i, tokens)
-        print("DOne with args_back in exp_args_back",i)
-    else:
-        error_expected((i,i),tokens,firstSets["exp_args_back"])
-    print("Exiting exp_args_back",i)
-    return i, tokens
-
-def exp_front(i, tokens):
-    if contains(i, tokens, [("Name",MATCH_TYPE)]):
-        i, tokens = matchTypeNow(i, tokens, "Name")
-    elif contains(i, tokens, [("(",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "(")
-        i, tokens = exp(i, tokens)
-        i, tokens = matchValueNow(i, tokens, ")")
-    else:
-        error_expected((i,i),tokens,firstSets["exp_front"])
-        i += 1
-    return i, tokens
-
-def exp_back(i, tokens):
-    print("In exp_back",i)
-    if contains(i, tokens, [("[",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "[")
-        i, tokens = exp(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "]")
-    elif contains(i, tokens, [(".",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, ".")
-        i, tokens = matchTypeNow(i, tokens, "Name")
-    else:
-        error_expected((i,i),tokens,firstSets["exp_back"])
-    print("Out exp_back",i)
-    return i, tokens
-
-def args_back(i, tokens):
-    print("In args_back",i)
-    if contains(i, tokens, firstSets["args"]):
-        print("GOING from args_back to args",i)
-        i, tokens = args(i, tokens)
-    elif contains(i, tokens, [(":",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, ":")
-        i, tokens = matchTypeNow(i, tokens, "Name")
-        i, tokens = args(i, tokens)
-    else:
-        error_expected((i,i),tokens,firstSets["args_back"])
-    print("Leaving args_back",i)
-    return i, tokens
-
-def args(i, tokens):
-    print("In args",i)
-    if contains(i, tokens, [("(",MATCH_VALUE)]):
-        print("In args, matching ( ",i)
-        i, tokens = matchValueNow(i, tokens, "(")
-        print("In args, matchED (, now doing explist ",i)
-        i, tokens = optional(i, tokens, [(explist,MATCH_FUNCTION)], 1)
-        print("In args, DONE WITH matchED explist ",i)
-        i, tokens = matchValueNow(i, tokens, ")")
-    elif contains(i, tokens, firstSets["tableconstructor"]):
-        i, tokens = tableconstructor(i, tokens)
-    elif contains(i, tokens, [("String",MATCH_TYPE)]):
-        i, tokens = matchTypeNow(i, tokens, "String")
-    else:
-        error_expected((i,i),tokens,firstSets["args"])
-    print("Out args",i)
-    return i, tokens
-
-def explist(i, tokens):
-    i_b = i
-    print("---------Entering explist",i,"(",i_b,")")
-    i, tokens = exp(i, tokens)
-    print("In explist, have done exp, about to do star",i)
-    i, tokens = star(i, tokens, [(",",MATCH_VALUE),(exp,MATCH_FUNCTION)], 2)
-    print("---------Exiting explist",i,"(",i_b,")")
-    return i, tokens
-
-def tableconstructor(i, tokens):
-    print("In tablecons",i)
-    i, tokens = matchValueNow(i, tokens, "{")
-    print("Enter optional fieldlist",i)
-    i, tokens = optional(i, tokens, [(fieldlist,MATCH_FUNCTION)], 1)
-    print("Out of optional fieldlist",i)
-    i, tokens = matchValueNow(i, tokens, "}")
-    print("Out tablecons",i)
-    return i, tokens
-
-def fieldlist(i, tokens):
-    i, tokens = field(i, tokens)
-    i, tokens = star(i, tokens, [(fieldsep,MATCH_FUNCTION),(field,MATCH_FUNCTION)], 2)
-    i, tokens = optional(i, tokens, [(fieldsep,MATCH_FUNCTION)], 1)
-    return i, tokens
-
-def field(i, tokens):
-    print("In field",i)
-    if contains(i, tokens, [("[",MATCH_VALUE)]):
-        # todo, fill the aftermath of each of these
-        # with checks and should haves
-        i, tokens = matchValueNow(i, tokens, "[")
-        i, tokens = exp(i, tokens)
-        i, tokens = matchValueNow(i, tokens, "]")
-        i, tokens = matchValueNow(i, tokens, "=")
-        i, tokens = exp(i, tokens)
-    elif contains(i, tokens, [("Name",MATCH_TYPE)]) and contains(i+1, tokens, [("=",MATCH_VALUE)]):
-        # need lookahead 2 to decide if going to Name and then = or
-        # just exp that can be Name
-        print("In name in field",i)
-        i, tokens = matchTypeNow(i, tokens, "Name")
-        i, tokens = matchValueNow(i, tokens, "=")
-        i, tokens = exp(i, tokens)
-        print("Out name in field",i)
-    elif contains(i, tokens, firstSets["exp"]):
-        i, tokens = exp(i, tokens)
-    else:
-        error_expected((i,i),tokens,firstSets["field"])
-    print("Out field",i)
-    return i, tokens
-
-def exp(i, tokens):
-    if contains(i, tokens, [("nil",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "nil")
-        i, tokens = exp_p(i, tokens)
-    elif contains(i, tokens, [("false",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "false")
-        i, tokens = exp_p(i, tokens)
-    elif contains(i, tokens, [("true",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "true")
-        i, tokens = exp_p(i, tokens)
-    elif contains(i, tokens, [("Number",MATCH_TYPE)]):
-        i, tokens = matchTypeNow(i, tokens, "Number")
-        i, tokens = exp_p(i, tokens)
-    elif contains(i, tokens, [("String",MATCH_TYPE)]):
-        i, tokens = matchTypeNow(i, tokens, "String")
-        i, tokens = exp_p(i, tokens)
-    elif contains(i, tokens, [("...",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "...")
-        i, tokens = exp_p(i, tokens)
-    elif contains(i, tokens, firstSets["functiondef"]):
-        i, tokens = functiondef(i, tokens)
-        i, tokens = exp_p(i, tokens)
-    elif contains(i, tokens, firstSets["prefixexp"]):
-        i, tokens = prefixexp(i, tokens)
-        i, tokens = exp_p(i, tokens)
-    elif contains(i, tokens, firstSets["tableconstructor"]):
-        i, tokens = tableconstructor(i, tokens)
-        i, tokens = exp_p(i, tokens)
-    elif contains(i, tokens, firstSets["unop"]):
-        i, tokens = unop(i, tokens)
-        i, tokens = exp(i, tokens)
-        i, tokens = exp_p(i, tokens)
-    else:
-        error_expected((i,i),tokens,firstSets["exp"])
-        i += 1
-    return i, tokens
-
-def funcname(i, tokens):
-    i, tokens = matchTypeNow(i,tokens,"Name")
-    i, tokens = star(i, tokens, [(".",MATCH_VALUE), ("Name",MATCH_TYPE)], 1)
-    i, tokens = optional(i, tokens, [(":",MATCH_VALUE), ("Name",MATCH_TYPE)], 1)
-    return i, tokens
-
-def parlist(i, tokens):
-    # chosen the ... only
-    if contains(i, tokens, [("...",MATCH_VALUE)]):
-        i, tokens = matchValueNow(i, tokens, "...")
-    # namelist
-    elif contains(i, tokens, [("Name",MATCH_TYPE)]):
-        i, tokens = namelist(i, tokens)
-        i, tokens = optional(i, tokens, [(",",MATCH_VALUE),("...",MATCH_VALUE)], 1)
-    else:
-        error_expected((i,i),tokens,firstSets["parlist"])
-    return i, tokens
+        i, tokens = self.optional_parlist.run(self, i, tokens)
+        self.log_params(i_b, i, tokens)
+        i, tokens = self.matchValueNow(i, tokens, ")")
+        i, tokens = self.block(i, tokens)
+        i, tokens = self.matchValueNow(i, tokens, "end")
+        return i, tokens
 
-def namelist(i, tokens):
-    i, tokens = matchTypeNow(i,tokens,"Name")
-    i, tokens = star(i, tokens, [(",",MATCH_VALUE), ("Name",MATCH_TYPE)], 2)
-    return i, tokens
+    def block(self, i, tokens):
+        i, tokens = self.chunk(i, tokens)
+        return i, tokens
+
+    # a Star/Optional can itself be used as a MATCH_FUNCTION, as here for
+    # the optional semicolons
+    optional_semicolon = Optional([(";",MATCH_VALUE)], 1)
+    stats = Star([("stat",MATCH_FUNCTION),(optional_semicolon,MATCH_FUNCTION)], 1)
+    last_stat = Optional([("laststat",MATCH_FUNCTION),(optional_semicolon,MATCH_FUNCTION)], 1)
+    def chunk(self, i, tokens):
+        i, tokens = self.stats.run(self, i, tokens)
+        i, tokens = self.last_stat.run(self, i, tokens)
+        return i, tokens
 
-def binop(i, tokens):
-    i, tokens = matchTerminalInList(i, tokens, firstSets["binop"])
-    return i, tokens
+    optional_explist = Optional([("explist",MATCH_FUNCTION)], 1)
+    def laststat(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["laststat"])
+        if alternative == "return":
+            i, tokens = self.matchValueNow(i, tokens, "return")
+            i, tokens = self.optional_explist.run(self, i, tokens)
+        elif alternative == "break":
+            i, tokens = self.matchValueNow(i, tokens, "break")
+        else:
+            self.error_expected((i,i), tokens, "laststat")
+        return i, tokens
 
-def unop(i, tokens):
-    return matchTerminalInList(i, tokens, firstSets["unop"])
+    exp_args_backs = Star([("exp_args_back",MATCH_FUNCTION)], 1)
+    def prefixexp(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["prefixexp"])
+        if alternative == "Name":
+            i, tokens = self.matchTypeNow(i, tokens, "Name")
+            i, tokens = self.exp_args_backs.run(self, i, tokens)
+        elif alternative == "(":
+            i, tokens = self.matchValueNow(i, tokens, "(")
+            i, tokens = self.exp(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, ")")
+            i, tokens = self.exp_args_backs.run(self, i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "prefixexp")
+        return i, tokens
 
-def fieldsep(i, tokens):
-    return matchTerminalInList(i, tokens, firstSets["fieldsep"])
+    def var(self, i, tokens):
+        if self.contains(i, tokens, NAME_SET) and self.contains(i+1, tokens, COMMA_EQUALS_SET):
+            i, tokens = self.matchTypeNow(i, tokens, "Name")
+        elif self.contains(i, tokens, firstSetLookup["exp_front"]):
+            i, tokens = self.exp_front(i, tokens)
+            i, tokens = self.exp_args_backs_lookback.run(self, i, tokens)
+            i, tokens = self.exp_back(i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "var")
+            i += 1
+        return i, tokens
 
+    def exp_args_back(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["exp_args_back"])
+        if alternative == "exp_back":
+            i, tokens = self.exp_back(i, tokens)
+        elif alternative == "args_back":
+            i, tokens = self.args_back(i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "exp_args_back")
+        return i, tokens
 
+    def exp_front(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["exp_front"])
+        if alternative == "Name":
+            i, tokens = self.matchTypeNow(i, tokens, "Name")
+        elif alternative == "(":
+            i, tokens = self.matchValueNow(i, tokens, "(")
+            i, tokens = self.exp(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, ")")
+        else:
+            self.error_expected((i,i), tokens, "exp_front")
+            i += 1
+        return i, tokens
+
+    def exp_back(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["exp_back"])
+        if alternative == "[":
+            i, tokens = self.matchValueNow(i, tokens, "[")
+            i, tokens = self.exp(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "]")
+        elif alternative == ".":
+            i, tokens = self.matchValueNow(i, tokens, ".")
+            i, tokens = self.matchTypeNow(i, tokens, "Name")
+        else:
+            self.error_expected((i,i), tokens, "exp_back")
+        return i, tokens
+
+    def args_back(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["args_back"])
+        if alternative == "args":
+            i, tokens = self.args(i, tokens)
+        elif alternative == ":":
+            i, tokens = self.matchValueNow(i, tokens, ":")
+            i, tokens = self.matchTypeNow(i, tokens, "Name")
+            i, tokens = self.args(i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "args_back")
+        return i, tokens
+
+    def args(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["args"])
+        if alternative == "(":
+            i, tokens = self.matchValueNow(i, tokens, "(")
+            i, tokens = self.optional_explist.run(self, i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, ")")
+        elif alternative == "tableconstructor":
+            i, tokens = self.tableconstructor(i, tokens)
+        elif alternative == "String":
+            i, tokens = self.matchTypeNow(i, tokens, "String")
+        else:
+            self.error_expected((i,i), tokens, "args")
+        return i, tokens
 
+    more_exps = Star([(",",MATCH_VALUE),("exp",MATCH_FUNCTION)], 2)
+    def explist(self, i, tokens):
+        i, tokens = self.exp(i, tokens)
+        i, tokens = self.more_exps.run(self, i, tokens)
+        return i, tokens
 
+    optional_fieldlist = Optional([("fieldlist",MATCH_FUNCTION)], 1)
+    def tableconstructor(self, i, tokens):
+        i, tokens = self.matchValueNow(i, tokens, "{")
+        i, tokens = self.optional_fieldlist.run(self, i, tokens)
+        i, tokens = self.matchValueNow(i, tokens, "}")
+        return i, tokens
 
-### this marks the end of the series of functions that
-# implement a structure equivalent to the grammar
+    more_fields = Star([("fieldsep",MATCH_FUNCTION),("field",MATCH_FUNCTION)], 2)
+    optional_fieldsep = Optional([("fieldsep",MATCH_FUNCTION)], 1)
+    def fieldlist(self, i, tokens):
+        i, tokens = self.field(i, tokens)
+        i, tokens = self.more_fields.run(self, i, tokens)
+        i, tokens = self.optional_fieldsep.run(self, i, tokens)
+        return i, tokens
 
+    def field(self, i, tokens):
+        if self.contains(i, tokens, OPEN_SQUARE_SET):
+            # todo, fill the aftermath of each of these
+            # with checks and should haves
+            i, tokens = self.matchValueNow(i, tokens, "[")
+            i, tokens = self.exp(i, tokens)
+            i, tokens = self.matchValueNow(i, tokens, "]")
+            i, tokens = self.matchValueNow(i, tokens, "=")
+            i, tokens = self.exp(i, tokens)
+        elif self.contains(i, tokens, NAME_SET) and self.contains(i+1, tokens, EQUALS_SET):
+            # need lookahead 2 to decide if going to Name and then = or
+            # just exp that can be Name
+            i, tokens = self.matchTypeNow(i, tokens, "Name")
+            i, tokens = self.matchValueNow(i, tokens, "=")
+            i, tokens = self.exp(i, tokens)
+        elif self.contains(i, tokens, firstSetLookup["exp"]):
+            i, tokens = self.exp(i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "field")
+        return i, tokens
 
-# helper function to be able to match a terminal in a list of terminals
-# and if a match succeeded increment i based on the result
-def matchTerminalInList(i, tokens, list):
-    global errors_switch
-    errors_switch += 1 # disable errors
-    success = False
-    if contains(i, tokens, list):
-        for op in list:
-            b = match_v(tokens, i, op[0])
-            if b:
-                successOp = op[0]
-                success = True
+    # exp ::= { unop } operand { binop { unop } operand }
+    # which is what the grammar's exp/exp_p recursion matches, but done
+    # in a loop so a long chain of operators takes no more stack than
+    # one, operators waiting for their right operand are kept on the
+    # pending stack and taken off in Lua's order of priority, calling
+    # reduce_operator for each as it gets both its operands
+    def exp(self, i, tokens):
+        if self.predict(i, tokens, predictions["exp"]) is None:
+            # nothing an exp starts with, as in the grammar the error
+            # ends the exp here without an exp_p, after a unop or binop
+            # it carries on with the operators after it
+            return self.operand(i, tokens)
+        pending = []
+        # (operator, right priority, unary, index of the operator)
+        while True:
+            while self.contains(i, tokens, UNOP_SET):
+                pending.append( (token_value(tokens, i), UNARY_PRIORITY, True, i) )
+                i, tokens = self.unop(i, tokens)
+            i, tokens = self.operand(i, tokens)
+            if not self.contains(i, tokens, BINOP_SET):
                 break
-    errors_switch -= 1 # enable errors
-    if not success:
+            op = token_value(tokens, i)
+            (left, right) = BINARY_PRIORITY[op]
+            while pending and pending[-1][1] >= left:
+                (pending_op, _, unary, op_i) = pending.pop()
+                self.reduce_operator(pending_op, unary, op_i)
+            pending.append( (op, right, False, i) )
+            i, tokens = self.binop(i, tokens)
+        while pending:
+            (pending_op, _, unary, op_i) = pending.pop()
+            self.reduce_operator(pending_op, unary, op_i)
+        return i, tokens
+
+    # the exp alternatives other than unop exp
+    def operand(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["exp"])
+        if alternative == "nil":
+            i, tokens = self.matchValueNow(i, tokens, "nil")
+        elif alternative == "false":
+            i, tokens = self.matchValueNow(i, tokens, "false")
+        elif alternative == "true":
+            i, tokens = self.matchValueNow(i, tokens, "true")
+        elif alternative == "Number":
+            i, tokens = self.matchTypeNow(i, tokens, "Number")
+        elif alternative == "String":
+            i, tokens = self.matchTypeNow(i, tokens, "String")
+        elif alternative == "...":
+            i, tokens = self.matchValueNow(i, tokens, "...")
+        elif alternative == "functiondef":
+            i, tokens = self.functiondef(i, tokens)
+        elif alternative == "prefixexp":
+            i, tokens = self.prefixexp(i, tokens)
+        elif alternative == "tableconstructor":
+            i, tokens = self.tableconstructor(i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "exp")
+            if self.recover:
+                i = self.synchronize(i, tokens, None)
+            else:
+                i += 1
+        return i, tokens
+
+    dotted_names = Star([(".",MATCH_VALUE), ("Name",MATCH_TYPE)], 1)
+    method_name = Optional([(":",MATCH_VALUE), ("Name",MATCH_TYPE)], 1)
+    def funcname(self, i, tokens):
+        i, tokens = self.matchTypeNow(i,tokens,"Name")
+        i, tokens = self.dotted_names.run(self, i, tokens)
+        i, tokens = self.method_name.run(self, i, tokens)
+        return i, tokens
+
+    varargs = Optional([(",",MATCH_VALUE),("...",MATCH_VALUE)], 1)
+    def parlist(self, i, tokens):
+        alternative = self.predict(i, tokens, predictions["parlist"])
+        # chosen the ... only
+        if alternative == "...":
+            i, tokens = self.matchValueNow(i, tokens, "...")
+        # namelist
+        elif alternative == "Name":
+            i, tokens = self.namelist(i, tokens)
+            i, tokens = self.varargs.run(self, i, tokens)
+        else:
+            self.error_expected((i,i), tokens, "parlist")
+        return i, tokens
+
+    more_names = Star([(",",MATCH_VALUE), ("Name",MATCH_TYPE)], 2)
+    def namelist(self, i, tokens):
+        i, tokens = self.matchTypeNow(i,tokens,"Name")
+        i, tokens = self.more_names.run(self, i, tokens)
+        return i, tokens
+
+    def binop(self, i, tokens):
+        i, tokens = self.matchTerminalInList(i, tokens, firstSetLookup["binop"])
+        return i, tokens
+
+    def unop(self, i, tokens):
+        return self.matchTerminalInList(i, tokens, firstSetLookup["unop"])
+
+    def fieldsep(self, i, tokens):
+        return self.matchTerminalInList(i, tokens, firstSetLookup["fieldsep"])
+
+    ### this marks the end of the series of functions that
+    # implement a structure equivalent to the grammar
+
+    # the checks of the next tokens the grammar functions and Repeaters
+    # make go through these, so a subclass can count them (see
+    # baba_profile.ProfilingParser), here they are the functions
+    # themselves, with no call in between, lookahead(repeater, i, tokens)
+    # is whether a Repeater can go (again) at i
+    contains = staticmethod(contains)
+    predict = staticmethod(predict)
+    lookahead = staticmethod(Repeater.lookahead)
+
+    # helper function to be able to match a terminal in a list of terminals
+    # and if a match succeeded increment i based on the result
+    # the list is a compiled first set of values, so the token matched
+    # is whatever value the current token has if it is in the set
+    def matchTerminalInList(self, i, tokens, firstSet):
         successOp = ""
-    i, tokens = matchValueNow(i, tokens, successOp)
-    return i, tokens
-
-# helper function that immediately calls curried match type function
-# that was returned by matchType, to avoid matchType(type)(i, tokens)
-def matchTypeNow(i, tokens, type):
-    global errors_switch # unnecessary
-    i_b = i
-    i, tokens = matchType(type)(i,tokens)
-    success = i_b != i
-    # in the case where i has not been incremented ie. token
-    # not consumed, had a mismatch
-    # shall log the error and increment i anyway
-    if errors_switch == 0 and not success:
-        print("Matching ", type,"not matched- Incing i anyway")
-        i += 1
-        pass
-    return i, tokens
-
-# helper function that immediately calls curried match value function
-# that was returned by matchValue, to avoid matchType(value)(i, tokens)
-def matchValueNow(i, tokens, value):
-    i_b = i
-    i, tokens = matchValue(value)(i,tokens)
-    success = i_b != i
+        if self.contains(i, tokens, firstSet):
+            successOp = token_value(tokens, i)
+        i, tokens = self.matchValueNow(i, tokens, successOp)
+        return i, tokens
+
+    # matches the type passed in and increments i if the match was a success
     # in the case where i has not been incremented ie. token
     # not consumed, had a mismatch
     # shall log the error and increment i anyway
-    if errors_switch == 0 and not success:
-        print("Matching ", value,"not matched- Incing i anyway")
-        i += 1
-        pass
-    return i, tokens
-
-# returns a curried function that matches the type passed in
-# and increments i if the match was a success
-# also sets the name of the returned partial function to the name
-# of the func passed in, corresponds to the nonterminal
-def matchType(type):
-    def f(i, tokens):
-        if match_t(tokens,i,type):
-            i += 1
+    def matchTypeNow(self, i, tokens, type):
+        if self.match_t(tokens,i,type):
+            return i + 1, tokens
+        if self.errors_switch == 0:
+            i = self.mismatch(i, tokens, type)
         return i, tokens
-    # for nice error error
-    f.__name__ = type
-    return f
 
-# returns a curried function that matches the value passed in
-# and increments i if the match was a success
-# also sets the name of the returned partial function to the name
-# of the func passed in, corresponds to the nonterminal
-def matchValue(value):
-    def f(i, tokens):
-        if match_v(tokens,i,value):
-            i += 1
+    # same as matchTypeNow but matching the value passed in
+    def matchValueNow(self, i, tokens, value):
+        if self.match_v(tokens,i,value):
+            return i + 1, tokens
+        if self.errors_switch == 0:
+            i = self.mismatch(i, tokens, value)
         return i, tokens
-    # for nice error error
-    f.__name__ = value
-    return f
 
-# function that checks if the current token matches to any in the
-# firstSet passed in, returning a boolean
-# -- and not changing program state --
-# also disables error switch as unsuccessful matches are fine inside func
-def contains(i, tokens, firstSet):
-    global errors_switch
-    errors_switch += 1
-    # don't want errors printed here as checking
-    for _, (val,match_type) in enumerate(firstSet):
-        b = False
-        if match_type == MATCH_VALUE:
-            b = match_v(tokens, i, val)
-        elif match_type == MATCH_TYPE:
-            b = match_t(tokens, i, val)
-        if b:
-            errors_switch -= 1
-            return True
-    errors_switch -= 1
-    return False
-
-# lookahead function right here
-# this function performs lookahead of up to lookahead_n, it is called inside the
-# function that actually applies the star or question mark (regex) operators
-# to decide whether or not to continue
-# if a match fails it will return immediately False, else if
-# all lookahead succeeds it will return true
-def lookahead(i, tokens, func_tuples, lookahead_n):
-    global errors_switch
-    errors_switch += 1
-    for j in range(0, min(len(func_tuples),lookahead_n)):
-        b = False
-        if func_tuples[j][1] == MATCH_VALUE:
-            b = match_v(tokens, i+j, func_tuples[j][0])
-        elif func_tuples[j][1] == MATCH_TYPE:
-            b = match_t(tokens, i+j, func_tuples[j][0])
-        elif func_tuples[j][1] == MATCH_FUNCTION:
-            firstSet = firstSets[func_tuples[j][0].__name__]
-            b = contains(i+j, tokens, firstSet)
+    # called when a token that had to be there was not, the error has
+    # already been logged by match_t/match_v, returns the i to carry on
+    # from, which is past the token that did not match, or where
+    # synchronize got to when recovering
+    def mismatch(self, i, tokens, expected):
+        if self.recover:
+            return self.synchronize(i, tokens, expected)
+        return i + 1
+
+    # panic mode, skips from i up to the expected token (a value or a
+    # type) and returns past it, or up to a token in SYNC_SET, or a Name
+    # or ( past i that can start a statement, and returns that, leaving it
+    # for the rules further out which can carry on from there, the errors
+    # they log until then are about the same mistake so are not logged
+    # (see quiet_until)
+    def synchronize(self, i, tokens, expected):
+        j = i
+        while True:
+            try:
+                (value, type) = (token_value(tokens, j), token_type(tokens, j))
+            except IndexError:
+                break
+            if value == expected or type == expected:
+                self.quiet_until = j
+                return j + 1
+            if value in SYNC_SET.values or type in SYNC_SET.types:
+                break
+            if j > i and (type == "Name" or value == "(") and self.contains(j - 1, tokens, STAT_END_SET):
+                break
+            j += 1
+        self.quiet_until = j
+        return j
+
+    # simple function to match the current token on a type
+    # will log error message if it fails, and if not looking ahead
+    def match_t(self, tokens,i,type):
+        #error("Type:Trying to match",tokens[i].type,"to",type)
+        b = i >= 0 and i < len(tokens) and token_type(tokens, i) == type
         if not b:
-            errors_switch -= 1
-            return False
-    errors_switch -= 1
-    return True
-
-# this function is passed a list of func_tuples that may either be simple
-# value or type matches or may be functions in themselves that implement the same
-# functionality - this list is the func_tuples arg
-# it is also passed a repeater function that is the generator that is the actual
-# application of the star/optional operator (eg. 'star_do')
-# the reason for lookback is there is case in the grammar that is ambiguous
-# with fixed lookahead, for example { exp_args_back } exp_back
-# where an exp_args_back contains an exp_back
-# here this function shall consume all it can, and then move the index back by
-# lookback to emulate not having consumed the last token
-# this behaviour is not backtracking, to be clear
-# this function applies the repeater function passed in, which likely
-# corresponds to something like '{ B C }' in the grammar
-# before doing the next 'B C' it looks ahead to check if it may, if not it breaks
-# else it continues
-def something(i, tokens, func_tuples, lookahead_n, repeater, lookback=0):
-    # creates list of funcs that are that grammar
-    # thing that we're doing
-    funcs = []
-    for _, (match, match_type) in enumerate(func_tuples):
-        if match_type == MATCH_VALUE:
-            funcs.append(matchValue(match))
-        elif match_type == MATCH_TYPE:
-            funcs.append(matchType(match))
-        elif match_type == MATCH_FUNCTION:
-            funcs.append(match)
-    i_series = []
-    if lookahead(i, tokens, func_tuples, lookahead_n):
-        i_series.append(i)
-        for i, tokens in repeater(i, tokens, funcs):
-            i_series.append(i)
+            j = i
+            if j >= len(tokens):
+                j -= 1
+                self.error(ERROR_EOF, (j,j), tokens, type)
+            else:
+                self.error(ERROR_TYPE, (j,j), tokens, type)
+        return b
+
+    # simple function to match the current token to a value
+    # will log error message if it fails, and if not looking ahead
+    def match_v(self, tokens,i,val):
+        #error("Val:Trying to match",tokens[i].value,"to",val)
+        b = i >= 0 and i < len(tokens) and token_value(tokens, i) == val
+        if not b:
+            j = i
+            # if at EOF
+            if j >= len(tokens):
+                j -= 1
+                self.error(ERROR_EOF, (j,j), tokens, val)
+            else:
+                self.error(ERROR_VALUE, (j,j), tokens, val)
+        return b
+
+
+
+# tracing
+# the plain Parser has no tracing in it at all, so costs nothing when
+# tracing is off, TracingParser is a subclass of it made at import time
+# with every grammar function wrapped to send enter/exit events, and the
+# error/skip/params functions overridden to send those too
+# events go to a sink, any function taking a TraceEvent
+
+# kinds of event
+ENTER = "enter"
+EXIT = "exit"
+ERROR = "error"
+SKIP = "skip"
+PARAMS = "params"
+TOKEN = "token"
+REDUCE = "reduce"
+
+# one thing that happened, rule is the nonterminal it happened in (None
+# for tokens), index the token index i at the time, depth how many
+# nonterminals deep the parser was and detail anything else, ie. the
+# ParseError or the token
+TraceEvent = collections.namedtuple('TraceEvent', ['kind', 'rule', 'index', 'depth', 'detail'])
+
+# the functions of Parser that are nonterminals in the grammar
+GRAMMAR_RULES = ("chunk", "block", "stat", "stat_for", "stat_local",
+        "stat_name", "stat_name_eap", "end_explist", "laststat",
+        "functiondef", "funcbody", "funcname", "parlist", "namelist",
+        "prefixexp", "var", "exp_args_back", "exp_front", "exp_back",
+        "args_back", "args", "explist", "exp", "operand", "tableconstructor",
+        "fieldlist", "field", "binop", "unop", "fieldsep")
+
+# default sink, prints the event indented by its depth to stderr so
+# it does not get mixed up with the report on stdout
+def print_trace_event(event):
+    detail = ""
+    if event.detail is not None:
+        if event.kind == ERROR:
+            detail = event.detail.message()
+        else:
+            detail = str(event.detail)
+    print("  " * event.depth + event.kind, event.rule or "", event.index, detail,
+            file=sys.stderr)
+
+class TracingParser(Parser):
+    def __init__(self, trace_sink=print_trace_event, trace_level=TRACE_RULES):
+        Parser.__init__(self)
+        self.trace_sink = trace_sink
+        self.trace_level = trace_level
+        self.trace_depth = 0
+        self.trace_rules = []
+        # stack of the nonterminals currently in, for the rule of events
+
+    def trace(self, kind, index, detail=None):
+        rule = self.trace_rules[-1] if self.trace_rules else None
+        self.trace_sink(TraceEvent(kind, rule, index, self.trace_depth, detail))
+
+    def log_params(self, start_i, end_i, tokens):
+        if self.trace_level >= TRACE_ERRORS:
+            self.trace(PARAMS, start_i, (start_i, end_i))
+        Parser.log_params(self, start_i, end_i, tokens)
+
+    def reduce_operator(self, op, unary, op_i):
+        self.trace(REDUCE, op_i, ("unary " if unary else "") + op)
+
+    # errors are logged with the nonterminal they were in, and the
+    # ParseErrors actually logged are sent on
+    def error(self, kind, i_tup, tokens, expected=None, rule=None):
+        if rule is None and self.trace_rules:
+            rule = self.trace_rules[-1]
+        logged = len(self.error_list)
+        try:
+            Parser.error(self, kind, i_tup, tokens, expected, rule)
+        finally:
+            if self.trace_level >= TRACE_ERRORS:
+                for err in self.error_list[logged:]:
+                    self.trace(ERROR, err.index, err)
+
+    def mismatch(self, i, tokens, expected):
+        if self.trace_level >= TRACE_ERRORS:
+            self.trace(SKIP, i, expected)
+        return Parser.mismatch(self, i, tokens, expected)
+
+# wraps a grammar function so it sends an event on entering and leaving
+def traced_rule(name, rule):
+    def f(self, i, tokens):
+        self.trace_sink(TraceEvent(ENTER, name, i, self.trace_depth, None))
+        self.trace_depth += 1
+        self.trace_rules.append(name)
+        i, tokens = rule(self, i, tokens)
+        self.trace_rules.pop()
+        self.trace_depth -= 1
+        self.trace_sink(TraceEvent(EXIT, name, i, self.trace_depth, None))
+        return i, tokens
+    f.__name__ = name
+    return f
 
-            # next iter
-            if not lookahead(i, tokens, func_tuples, lookahead_n):
-                # we're breaking
-                # moving the index back in case of lookback
-                i = i_series[max(0,len(i_series)-1-lookback)]
-                break
+for _name in GRAMMAR_RULES:
+    setattr(TracingParser, _name, traced_rule(_name, getattr(Parser, _name)))
+
+# a Parser for the trace level, the plain one when tracing is off
+# engine picks how the grammar is run, only the recursive one can trace
+# - RECURSIVE, Parser, a grammar function per nonterminal
+# - STACK, baba_stack.StackParser, the same functions with the stack in
+#   a list, finds the same but can go as deep as memory allows
+# - TABLE, baba_grammar.TableParser, a loop over a prediction table
+#   made from the grammar text, finds the same functions in a valid
+#   program and rejects the same invalid ones, the first error is most
+#   often the same but not always, as Parser looks past a separator
+#   before it repeats and the table does not, nor are the ones after it
+# recover turns on panic mode error recovery and max_errors is the most
+# errors logged before the parse stops, see Parser
+def make_parser(trace_level=TRACE_OFF, trace_sink=None, engine=RECURSIVE, recover=False, max_errors=None):
+    if engine not in ENGINES:
+        raise ValueError("no engine %r, one of %s" % (engine, ", ".join(ENGINES)))
+    if engine != RECURSIVE and trace_level > TRACE_OFF:
+        raise ValueError("only the %s engine can trace" % RECURSIVE)
+    if engine == STACK:
+        import baba_stack
+        parser = baba_stack.StackParser()
+    elif engine == TABLE:
+        import baba_grammar
+        parser = baba_grammar.TableParser()
+    elif trace_level <= TRACE_OFF:
+        parser = Parser()
     else:
-        pass
-        # if no match at all
-        # return i, tokens
-
-    return i, tokens
-
-# simple generator that applies function and affects state of
-# i with the result, then yields before going again
-# functions that call this will break of the loop to stop it
-def star_do(i, tokens, funcs):
-    while True:
-        for f in funcs:
-            i, tokens = f(i, tokens)
-        yield i, tokens
-
-# similar to star_do but without the loop
-def optional_do(i, tokens, funcs):
-    for f in funcs:
-        i, tokens = f(i, tokens)
-    yield i, tokens
-
-# this partial func returned is to deal with the case of chunk, where
-# a normal optional function cannot be applied as it will only pass the arguments
-# (i, tokens), so using this the functionality of optional is emulated
-# but with a partial application of other functions and a lookahead given
-def optional_curry(func_tuples, lookahead):
-    def f(i, tokens):
-        return something(i, tokens, func_tuples, lookahead, optional_do)
-    return f
+        parser = TracingParser(trace_sink or print_trace_event, trace_level)
+    parser.recover = recover
+    parser.max_errors = max_errors
+    return parser
 
-# wrapper to implement optional function on a list of functions in
-# func_tuples eg. given (i, tokens, [(",",MATCH_VALUE),(var,MATCH_FUNCTION)], 1)
-# will match things of form ', var' if it can look 1 ahead and find a comma
-# in the tokens list
-def optional(i, tokens, func_tuples, lookahead):
-    return something(i, tokens, func_tuples, lookahead, optional_do)
 
-# wrapper to implement star function on a list of functions in
-# func_tuples eg. given (i, tokens, [(",",MATCH_VALUE),(var,MATCH_FUNCTION)], 2)
-# will continue to match things of form ', var' as long as both exist next
-# in the tokens list
-def star(i, tokens, func_tuples, lookahead, lookback=0):
-    org_i = i
-    i, tokens = something(i, tokens, func_tuples, lookahead, star_do, lookback)
-    if i < org_i:
-        raise ValueError("Ahhhh, i got lower?")
-    return i, tokens
-
-# simple function to match the current token on a type
-# will log error message if it fails, and if not looking ahead
-def match_t(tokens,i,type):
-    #error("Type:Trying to match",tokens[i].type,"to",type)
-    b = i >= 0 and i < len(tokens) and tokens[i].type == type
-    if not b:
-        j = i
-        if j >= len(tokens):
-            j -= 1
-            error((j,j),tokens,"Unexpected end of file")
-        else:
-            error((j,j),tokens,"Expected-type '",type,"' but got '",tokens[j].value,"' of type '",tokens[j].type,"'")
-    return b
-
-# simple function to match the current token to a value
-# will log error message if it fails, and if not looking ahead
-def match_v(tokens,i,val):
-    #error("Val:Trying to match",tokens[i].value,"to",val)
-    b = i >= 0 and i < len(tokens) and tokens[i].value == val
-    if not b:
-        j = i
-        # if at EOF
-        if j >= len(tokens):
-            j -= 1
-            error((j,j),tokens,"Unexpected end of file")
-            #error((j,j),tokens,"Expected-value '",val,"' but got '",tokens[j].value,"'")
-        else:
-            error((j,j),tokens,"Expected-value '",val,"' but got '",tokens[j].value,"'")
-    return b
 
 if __name__ == "__main__":
-    parse(sys.argv[1])
+    import argparse
+    argparser = argparse.ArgumentParser(description="Parse Lua files and print their functions or errors")
+    argparser.add_argument("fnames", nargs="+", metavar="fname",
+            help="Lua file to parse, more than one, a directory or a glob parses them all as a batch")
+    argparser.add_argument("--trace", type=int, default=TRACE_OFF, choices=range(TRACE_OFF, TRACE_TOKENS + 1),
+            help="trace level printed to stderr, 0 off, 1 nonterminals, 2 errors/skips, 3 tokens")
+    token_storage = argparser.add_mutually_exclusive_group()
+    token_storage.add_argument("--stream", action="store_true",
+            help="pull tokens as they are needed instead of tokenizing the whole file first")
+    token_storage.add_argument("--compact", action="store_true",
+            help="keep the tokens in arrays rather than a list of tuples, less memory but slower")
+    argparser.add_argument("--cache", metavar="PATH",
+            help="sqlite file to keep results in, files that have not changed are not parsed again")
+    argparser.add_argument("--cache-size", type=int, default=64, metavar="MB",
+            help="size the cached results are kept under, least recently used dropped first")
+    argparser.add_argument("--jobs", "-j", type=int, default=None,
+            help="processes to parse a batch with, all of the cpus by default")
+    argparser.add_argument("--lex-jobs", type=int, default=None, metavar="N",
+            help="processes to lex a single very big file with, split into chunks, at most one per cpu")
+    argparser.add_argument("--format", choices=("text", "ndjson"), default="text",
+            help="output of a batch, text or one JSON object per file")
+    argparser.add_argument("--engine", choices=ENGINES, default=RECURSIVE,
+            help="how the grammar is run, stack has no limit on how deep the code is nested, "
+            "table is driven by a table made from the grammar")
+    argparser.add_argument("--recover", action="store_true",
+            help="after an error skip to the next statement or block end, rather than one token")
+    argparser.add_argument("--max-errors", type=int, default=None, metavar="N",
+            help="stop parsing a file after N errors")
+    argparser.add_argument("--validate", action="store_true",
+            help="only check the syntax, print the first error of each file that has one "
+            "and exit with 1 if any did")
+    argparser.add_argument("--stats", action="store_true",
+            help="print the wall and cpu time and tokens of each stage of the parse to stderr")
+    argparser.add_argument("--stats-memory", action="store_true",
+            help="also trace the peak memory allocated in each stage, which slows the stages down, "
+            "those that allocate most the most, implies --stats")
+    argparser.add_argument("--stats-json", metavar="PATH",
+            help="append the stats of the parse to PATH as a line of JSON, implies --stats")
+    argparser.add_argument("--profile", action="store_true",
+            help="parse the files in this process counting the calls, tokens and time of each "
+            "nonterminal and the first set checks, and print those instead of the functions")
+    argparser.add_argument("--profile-json", metavar="PATH",
+            help="write the counts of --profile to PATH as JSON as well")
+    args = argparser.parse_args()
+    if args.max_errors is not None and args.max_errors < 1:
+        argparser.error("--max-errors must be at least 1")
+    if args.engine != RECURSIVE and args.trace > TRACE_OFF:
+        argparser.error("--trace only works with the %s engine" % RECURSIVE)
+    if args.lex_jobs is not None and args.lex_jobs < 1:
+        argparser.error("--lex-jobs must be at least 1")
+    if args.lex_jobs is not None and args.stream:
+        argparser.error("--lex-jobs lexes all of the file first, it does not work with --stream")
+
+    if args.validate:
+        if args.trace > TRACE_OFF or args.engine != RECURSIVE:
+            argparser.error("--validate does not trace and only runs the %s engine" % RECURSIVE)
+        import baba_validate
+        sys.exit(1 if baba_validate.validate_paths(args.fnames, args.jobs) else 0)
+
+    if args.profile or args.profile_json:
+        if args.trace > TRACE_OFF or args.engine != RECURSIVE:
+            argparser.error("--profile does not trace and only runs the %s engine" % RECURSIVE)
+        import baba_profile
+        profile = baba_profile.profile_paths(args.fnames, args.recover, args.max_errors)
+        print(profile.report(), end="")
+        if args.profile_json:
+            with open(args.profile_json, "w") as out:
+                json.dump(profile.to_dict(), out, indent=1, sort_keys=True)
+        sys.exit(0)
+
+    single = len(args.fnames) == 1 and os.path.isfile(args.fnames[0]) and args.format == "text"
+    if single:
+        cache = open_cache(args.cache, args.cache_size * 1024 * 1024)
+        if args.stats or args.stats_memory or args.stats_json:
+            import baba_stats
+            (result, stats) = baba_stats.parse_with_stats(args.fnames[0], args.trace, stream=args.stream,
+                    compact=args.compact, cache=cache, engine=args.engine, recover=args.recover,
+                    max_errors=args.max_errors, memory=args.stats_memory, lex_jobs=args.lex_jobs)
+            sys.stderr.write(stats.report())
+            if args.stats_json:
+                with open(args.stats_json, "a") as out:
+                    out.write(json.dumps(stats.to_dict(), sort_keys=True) + "\n")
+        else:
+            parse(args.fnames[0], args.trace, stream=args.stream, compact=args.compact, cache=cache,
+                    engine=args.engine, recover=args.recover, max_errors=args.max_errors, lex_jobs=args.lex_jobs)
+    else:
+        if args.trace > TRACE_OFF:
+            argparser.error("--trace works on a single file only")
+        if args.stats or args.stats_memory or args.stats_json:
+            argparser.error("--stats works on a single file only")
+        if args.lex_jobs is not None:
+            argparser.error("--lex-jobs works on a single file only, --jobs parses files in parallel")
+        bad = batch(args.fnames, args.jobs, args.format, stream=args.stream, compact=args.compact,
+                cache_path=args.cache, cache_bytes=args.cache_size * 1024 * 1024, engine=args.engine,
+                recover=args.recover, max_errors=args.max_errors)
+        sys.exit(1 if bad else 0)
 
 
 # the grammar
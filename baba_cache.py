@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import hashlib
+import sqlite3
+import time
+
+# on disk cache of parse results for baba.py, so a file that has not
+# changed since it was last parsed is not tokenized or parsed again
+# - results are keyed by a hash of the program and the parser version
+# - kept in one sqlite file, which does the locking so several
+#   processes can share it
+# - the least recently used results are dropped once the results add
+#   up to more than max_bytes
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# seconds to wait for another process holding the lock on the cache
+LOCK_TIMEOUT = 30
+
+# key for a program parsed by a given parser version
+def cache_key(program, version):
+    h = hashlib.sha256()
+    h.update(version.encode("utf-8"))
+    h.update(b"\0")
+    h.update(program.encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+class ParseCache:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        # autocommit, transactions are started explicitly below
+        self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        # readers do not block the writer and the other way round
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+
+    def close(self):
+        self.connection.close()
+
+    def key(self, program, version):
+        return cache_key(program, version)
+
+    # the value stored for key, or None if there is not one
+    # a hit marks it as used now, so it is the last to be evicted
+    def get(self, key):
+        try:
+            row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.OperationalError:
+            # locked for longer than LOCK_TIMEOUT, a miss is always safe
+            return None
+        return row[0]
+
+    # stores value for key, then evicts until under max_bytes
+    # all in one transaction so other processes never see it half done
+    def put(self, key, value):
+        try:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.execute("INSERT OR REPLACE INTO results (key, value, size, used) VALUES (?, ?, ?, ?)",
+                        (key, value, len(value), time.time()))
+                self.evict()
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError:
+            # could not get the lock, not storing it only costs a parse later
+            pass
+
+    # drops the least recently used results past max_bytes
+    def evict(self):
+        self.connection.execute("DELETE FROM results WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY used DESC, key) AS total FROM results) "
+                "WHERE total > ?)", (self.max_bytes,))
+
+    # number of results and the bytes they take
+    def stats(self):
+        row = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return row[0], row[1]
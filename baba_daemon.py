@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+# a long running baba.py serving parses over a Unix domain socket, so
+# editors and hooks that parse a file at a time do not start Python,
+# import baba.py and build its first sets and regexes for each one
+# - a request is one line of JSON, {"op": ..., "path": ...}, and its
+#   response one line of JSON, a connection can send any number of them
+# - ops are parse (the report baba.py prints, functions and errors),
+#   validate (as baba.py --validate), functions, stats and stop
+# - a request can send the text of the file as "text", for a buffer in
+#   an editor that has not been saved
+# - results of files are kept in memory by path, mtime and size, so a
+#   file that has not changed is not read or parsed again
+# - at most max_requests requests run at once, the rest wait for up to
+#   QUEUE_TIMEOUT seconds and then get an error
+# the client side below does not import baba.py, that is the point
+
+# requests that run at once, and results kept in memory by default
+DEFAULT_MAX_REQUESTS = 4
+DEFAULT_CACHE_ENTRIES = 1024
+
+# seconds a request waits for one of the others to finish
+QUEUE_TIMEOUT = 30
+
+# seconds the client waits for a response
+CLIENT_TIMEOUT = 60
+
+OP_PARSE = "parse"
+OP_VALIDATE = "validate"
+OP_FUNCTIONS = "functions"
+OP_STATS = "stats"
+OP_STOP = "stop"
+FILE_OPS = (OP_PARSE, OP_VALIDATE, OP_FUNCTIONS)
+
+# what a request gave when it could not be answered, the message goes
+# back as the response's error
+class RequestError(Exception):
+    pass
+
+# counts of what the daemon has done, for the stats op
+ServerStats = collections.namedtuple('ServerStats',
+        ['requests', 'failed', 'hits', 'misses', 'running', 'cached', 'uptime'])
+
+# parse and validate results of files, by (kind, path, mtime, size and
+# options), least recently used dropped first, shared by the threads
+class ResultCache:
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.results = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # the result for key, made by make() if it is not kept
+    # two requests for the same file at once can both make it, which is
+    # cheaper than holding the lock over a parse
+    def get(self, key, make):
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+        result = make()
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+        return result
+
+    def __len__(self):
+        return len(self.results)
+
+
+
+# server
+
+class ParseServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, max_requests=DEFAULT_MAX_REQUESTS, cache_entries=DEFAULT_CACHE_ENTRIES):
+        # baba.py is imported once, here, and kept warm
+        import baba
+        import baba_validate
+        self.baba = baba
+        self.baba_validate = baba_validate
+        self.slots = threading.BoundedSemaphore(max_requests)
+        self.cache = ResultCache(cache_entries)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failed = 0
+        self.running = 0
+        self.started = time.time()
+        remove_stale_socket(path)
+        socketserver.UnixStreamServer.__init__(self, path, RequestHandler)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+    def stats(self):
+        return ServerStats(self.requests, self.failed, self.cache.hits, self.cache.misses, self.running,
+                len(self.cache), time.time() - self.started)
+
+    # the response to request, a dict, as a dict, raises RequestError
+    def answer(self, request):
+        op = request.get("op")
+        if op == OP_STATS:
+            return dict(self.stats()._asdict())
+        if op == OP_STOP:
+            # the handler stops the server once the response is sent
+            return {}
+        if op not in FILE_OPS:
+            raise RequestError("unknown op %r" % (op,))
+        if not self.slots.acquire(timeout=QUEUE_TIMEOUT):
+            raise RequestError("busy, no request finished in %d seconds" % QUEUE_TIMEOUT)
+        try:
+            with self.lock:
+                self.running += 1
+            return self.answer_file(op, request)
+        finally:
+            with self.lock:
+                self.running -= 1
+            self.slots.release()
+
+    def answer_file(self, op, request):
+        baba = self.baba
+        path = request.get("path")
+        text = request.get("text")
+        if text is None and not path:
+            raise RequestError("%s needs a path or a text" % op)
+        recover = bool(request.get("recover", False))
+        max_errors = request.get("max_errors")
+        if op == OP_VALIDATE:
+            make = lambda program: self.baba_validate.validate(program)
+            kind = OP_VALIDATE
+        else:
+            make = lambda program: baba.run_parser(program, recover=recover,
+                    max_errors=max_errors)._replace(tokens=None)
+            kind = OP_PARSE
+        try:
+            if text is not None:
+                result = make(text)
+            else:
+                st = os.stat(path)
+                key = (kind, os.path.abspath(path), st.st_mtime_ns, st.st_size, recover, max_errors)
+                result = self.cache.get(key, lambda: make(baba.read_program(path)))
+        except Exception as e:
+            raise RequestError("%s: %s" % (type(e).__name__, e))
+
+        if op == OP_VALIDATE:
+            response = {"valid": result.valid}
+            if not result.valid:
+                (line, column) = result.error.position()
+                response.update(line=line, column=column, message=result.error.message())
+            return response
+        if op == OP_FUNCTIONS:
+            return {"functions": [{"line": line, "name": f_name, "params": params}
+                    for (line, f_name, params) in result.functions()]}
+        return baba.result_record(result, {"report": result.report()})
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode("utf-8"))
+                if not isinstance(request, dict):
+                    raise RequestError("a request is a JSON object")
+                response = server.answer(request)
+                response["ok"] = True
+            except (ValueError, RequestError) as e:
+                response = {"ok": False, "error": str(e)}
+            with server.lock:
+                server.requests += 1
+                if not response["ok"]:
+                    server.failed += 1
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            if response["ok"] and request.get("op") == OP_STOP:
+                # shutdown waits for serve_forever, which is not on this thread
+                threading.Thread(target=server.shutdown).start()
+                return
+
+# a socket file left by a daemon that did not stop cleanly is removed,
+# one that a daemon is listening on is not
+def remove_stale_socket(path):
+    if not os.path.exists(path):
+        return
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+        return
+    finally:
+        s.close()
+    raise OSError("a daemon is already listening on %s" % path)
+
+# serves requests on path until a stop request or an interrupt
+def serve(path, max_requests=DEFAULT_MAX_REQUESTS, cache_entries=DEFAULT_CACHE_ENTRIES):
+    server = ParseServer(path, max_requests, cache_entries)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+
+# client
+
+# sends requests (dicts) to the daemon on path over one connection and
+# returns the responses, raises OSError if there is no daemon
+def send_requests(path, requests, timeout=CLIENT_TIMEOUT):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(timeout)
+    try:
+        s.connect(path)
+        with s.makefile("rwb") as stream:
+            responses = []
+            for request in requests:
+                stream.write(json.dumps(request).encode("utf-8") + b"\n")
+                stream.flush()
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("the daemon closed the connection")
+                responses.append(json.loads(line.decode("utf-8")))
+            return responses
+    finally:
+        s.close()
+
+# runs op on each of fnames through the daemon on path, printing as
+# baba.py would, returns the number of files with errors or that failed
+def run_client(path, op, fnames, recover=False, max_errors=None, out=None):
+    out = out or sys.stdout
+    requests = [{"op": op, "path": os.path.abspath(fname), "recover": recover, "max_errors": max_errors}
+            for fname in fnames]
+    bad = 0
+    for (fname, response) in zip(fnames, send_requests(path, requests)):
+        if len(fnames) > 1 and op != OP_VALIDATE:
+            out.write("==> " + fname + " <==\n")
+        if not response["ok"]:
+            out.write("%s: %s\n" % (fname, response["error"]))
+            bad += 1
+        elif op == OP_VALIDATE:
+            if not response["valid"]:
+                out.write("%s:%s:%s: %s\n" % (fname, response["line"], response["column"], response["message"]))
+                bad += 1
+        elif op == OP_FUNCTIONS:
+            for f in response["functions"]:
+                out.write("Line %s: %s (%s)\n" % (f["line"], f["name"], f["params"]))
+        else:
+            out.write(response["report"])
+            if response["errors"]:
+                bad += 1
+        if len(fnames) > 1 and op != OP_VALIDATE:
+            out.write("\n")
+    out.flush()
+    return bad
+
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Parse Lua files through a long running daemon")
+    argparser.add_argument("socket", help="Unix domain socket the daemon listens on")
+    commands = argparser.add_subparsers(dest="command")
+    commands.required = True
+    serve_command = commands.add_parser("serve", help="run the daemon until it is stopped")
+    serve_command.add_argument("--max-requests", type=int, default=DEFAULT_MAX_REQUESTS, metavar="N",
+            help="requests run at once, the others wait")
+    serve_command.add_argument("--cache-entries", type=int, default=DEFAULT_CACHE_ENTRIES, metavar="N",
+            help="results of files kept in memory")
+    for op, help_text in ((OP_PARSE, "print what baba.py prints for files"),
+            (OP_VALIDATE, "check the syntax of files, as baba.py --validate"),
+            (OP_FUNCTIONS, "print the functions defined in files")):
+        command = commands.add_parser(op, help=help_text)
+        command.add_argument("fnames", nargs="+", metavar="fname")
+        if op != OP_VALIDATE:
+            command.add_argument("--recover", action="store_true", help="as for baba.py")
+            command.add_argument("--max-errors", type=int, default=None, metavar="N", help="as for baba.py")
+    commands.add_parser(OP_STATS, help="print what the daemon has done")
+    commands.add_parser(OP_STOP, help="stop the daemon")
+    args = argparser.parse_args()
+
+    if args.command == "serve":
+        if args.max_requests < 1 or args.cache_entries < 1:
+            argparser.error("--max-requests and --cache-entries must be at least 1")
+        try:
+            serve(args.socket, args.max_requests, args.cache_entries)
+        except OSError as e:
+            argparser.error(str(e))
+        sys.exit(0)
+
+    try:
+        if args.command in FILE_OPS:
+            sys.exit(1 if run_client(args.socket, args.command, args.fnames,
+                    getattr(args, "recover", False), getattr(args, "max_errors", None)) else 0)
+        (response,) = send_requests(args.socket, [{"op": args.command}])
+    except OSError as e:
+        sys.stderr.write("no daemon on %s (%s), start one with: %s %s serve\n" % (
+                args.socket, e, sys.argv[0], args.socket))
+        sys.exit(2)
+    if args.command == OP_STATS:
+        for field in ServerStats._fields:
+            print("%s: %s" % (field, response[field]))
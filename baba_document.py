@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+import bisect
+import collections
+import sys
+
+import baba
+
+# a Lua file open in an editor, kept parsed as it is edited, for each
+# edit only a part of it is lexed and parsed again
+# - lexing starts again from the start of the line the edit is on (see
+#   Lexer.tokenize's line_starts) and stops at the first line start
+#   after the edit that the lexer also went past before it, the tokens
+#   after that are the old ones, with their offsets moved
+# - what parsing each top level stat logged is kept, so only the stats
+#   from the one the edit is in are parsed again, up to the first one
+#   that starts on the same tokens as one did before
+# - the result is always the same as parsing the whole text again
+# the tokens after an edit that adds or takes away text all have their
+# offset changed, which is a pass over the tokens but no lexing or parsing
+
+# how many tokens past where it ended the parse of a stat can look at
+LOOKAHEAD = 2
+
+# a line start the lexer can be started again from, see Lexer.tokenize,
+# index is the number of tokens before it
+LineState = collections.namedtuple('LineState', ['pos', 'index'])
+
+# what parsing one top level stat (with the ; after it) logged, for the
+# tokens from start up to end, the last unit of a document is what the
+# laststat and the EOF at the end logged
+Unit = collections.namedtuple('Unit', ['start', 'end', 'function_names', 'function_params', 'errors'])
+
+# a unit that was parsed before an edit, for where its tokens are now,
+# its errors take their tokens from tokens again, as the offsets of the
+# tokens can have moved when their index and line have not
+def shifted_unit(unit, index_shift, line_shift, tokens):
+    if index_shift == 0 and line_shift == 0 and not unit.errors:
+        return unit
+    errors = []
+    for err in unit.errors:
+        index = err.index + index_shift
+        token = tokens[index] if err.token is not None else None
+        errors.append(err._replace(index=index, token=token,
+                received=(err.received[0] + index_shift, err.received[1] + index_shift),
+                line=err.line + line_shift if err.line is not None else None))
+    return Unit(unit.start + index_shift, unit.end + index_shift,
+            [(line + line_shift if line != "" else line, name) for (line, name) in unit.function_names],
+            unit.function_params, errors)
+
+class Document:
+    def __init__(self, text=""):
+        self.text = text
+        self.tokens = None
+        # None when the text could not be lexed, then the next edit
+        # lexes all of it again
+        self.line_index = None
+        self.states = None
+        # LineStates in order of pos, the first at the start of the text
+        self.unclosed = None
+        # positions of the long string openers that are not closed
+        self.units = None
+        self.reset()
+
+    # lexes and parses all of the text, returns the ParseResult
+    def reset(self):
+        self.tokens = None
+        self.line_index = baba.LineIndex(self.text)
+        (tokens, states, unclosed, matched) = self.lex(LineState(0, 0), None)
+        self.states = states
+        self.unclosed = unclosed
+        self.tokens = tokens + [baba.eof_token(self.text)]
+        self.units = self.parse_units(0, [], None, 0, 0)
+        return self.result()
+
+    # lexes self.text from the state start until resync(state) gives the
+    # old state it is the same as, or to the end, returns the tokens and
+    # states from start, the positions of long string openers not closed
+    # and (state, index of the old state) from resync or None
+    def lex(self, start, resync):
+        tokens = []
+        states = [start]
+        unclosed = []
+        line_starts = []
+        seen = 0
+        token_iter = baba.LEXER.tokenize(self.text, start.pos, line_starts, unclosed)
+        while True:
+            token = next(token_iter, None)
+            # the line starts the lexer went past before token
+            while seen < len(line_starts):
+                state = LineState(line_starts[seen], start.index + len(tokens))
+                seen += 1
+                old = resync(state) if resync is not None else None
+                if old is not None:
+                    # the lexer can be a token past state, an opener
+                    # there is the old one's
+                    return tokens, states, [pos for pos in unclosed if pos < state.pos], (state, old)
+                states.append(state)
+            if token is None:
+                return tokens, states, unclosed, None
+            tokens.append(token)
+
+    # replaces the text from offset start up to end with new_text and
+    # returns the ParseResult for the text now, as baba.run_parser would
+    # give, raises as it would if the text cannot be lexed
+    def edit(self, start, end, new_text):
+        line_shift = new_text.count("\n") - self.text.count("\n", start, end)
+        self.text = self.text[:start] + new_text + self.text[end:]
+        if self.tokens is None:
+            return self.reset()
+        self.line_index = baba.LineIndex(self.text)
+        delta = len(new_text) - (end - start)
+        new_end = start + len(new_text)
+        states = self.states
+
+        # the last line start at or before the edit, or before the first
+        # long string opener before it that is not closed, as a ]] in the
+        # edit could close it
+        restart_pos = start
+        if self.unclosed and self.unclosed[0] < start:
+            restart_pos = self.unclosed[0]
+        k = bisect.bisect_right(states, (restart_pos, sys.maxsize)) - 1
+
+        # the same as a state from before the edit if it is at the same
+        # place in the text after the edit
+        def resync(state):
+            if state.pos < new_end:
+                return None
+            j = bisect.bisect_left(states, (state.pos - delta,))
+            if j < len(states) and states[j].pos == state.pos - delta:
+                return j
+            return None
+
+        try:
+            (new_tokens, new_states, new_unclosed, matched) = self.lex(states[k], resync)
+        except Exception:
+            self.tokens = None
+            raise
+
+        old_tokens = self.tokens
+        first = states[k].index
+        # the tokens from first up to the old index old_index are new, all
+        # of them to the end if nothing matched, then old_index is None
+        if matched is None:
+            tokens = old_tokens[:first] + new_tokens
+            tokens.append(baba.eof_token(self.text))
+            self.states = states[:k] + new_states
+            self.unclosed = [pos for pos in self.unclosed if pos < states[k].pos] + new_unclosed
+            old_index = None
+            index_shift = 0
+            line_shift = 0
+        else:
+            (state, j) = matched
+            old = states[j]
+            index_shift = state.index - old.index
+            old_index = old.index
+            rest = old_tokens[old_index:-1]
+            if delta != 0:
+                # the tokens moved on delta, made without going through
+                # Token's __new__ as there can be a lot
+                new = tuple.__new__
+                rest = [new(baba.Token, (t[0], t[1], t[2] + delta)) for t in rest]
+            tokens = old_tokens[:first] + new_tokens + rest
+            tokens.append(baba.eof_token(self.text))
+            self.states = states[:k] + new_states + [state] + [
+                    LineState(s.pos + delta, s.index + index_shift) for s in states[j + 1:]]
+            self.unclosed = ([pos for pos in self.unclosed if pos < states[k].pos] + new_unclosed
+                    + [pos + delta for pos in self.unclosed if pos >= old.pos])
+        self.tokens = tokens
+
+        # the first stat whose parse looked at any of the new tokens
+        units = self.units
+        d = 0
+        while d < len(units) - 1 and units[d].end + LOOKAHEAD <= first:
+            d += 1
+        # the units that can be used again as they are, by start
+        reuse = None
+        if old_index is not None:
+            reuse = dict((unit.start, n) for (n, unit) in enumerate(units) if unit.start >= old_index)
+        self.units = self.parse_units(units[d].start, units[:d], reuse, index_shift, line_shift)
+        return self.result()
+
+    # parses the top level stats from token i on, as Parser.chunk then
+    # doIt do, after the units before, until a stat starts where one in
+    # reuse (old start -> index in self.units) did, then the units from
+    # that one on are used as they are, returns all of the units
+    def parse_units(self, i, before, reuse, index_shift, line_shift):
+        tokens = self.tokens
+        units = list(before)
+        parser = baba.Parser()
+        parser.line_index = self.line_index
+        stat_set = baba.firstSetLookup["stat"]
+        while True:
+            if reuse:
+                n = reuse.get(i - index_shift)
+                if n is not None:
+                    units.extend(shifted_unit(unit, index_shift, line_shift, tokens) for unit in self.units[n:])
+                    return units
+            names = len(parser.function_name_list)
+            params = len(parser.function_params_list)
+            errors = len(parser.error_list)
+            start = i
+            if baba.contains(i, tokens, stat_set):
+                i, tokens = parser.stat(i, tokens)
+                i, tokens = baba.Parser.optional_semicolon.run(parser, i, tokens)
+                last = False
+            else:
+                i, tokens = baba.Parser.last_stat.run(parser, i, tokens)
+                i, tokens = parser.matchTypeNow(i, tokens, "EOF")
+                last = True
+            units.append(Unit(start, i, parser.function_name_list[names:],
+                    parser.function_params_list[params:], parser.error_list[errors:]))
+            if last:
+                return units
+
+    # the ParseResult for the text as it is now
+    def result(self):
+        names = []
+        params = []
+        errors = []
+        for unit in self.units:
+            names.extend(unit.function_names)
+            params.extend(unit.function_params)
+            errors.extend(unit.errors)
+        return baba.ParseResult(self.tokens, names, params, errors)
+
+    # offset in the text of column (counted in characters) of line,
+    # which counts from 1 as the lines of tokens do
+    def offset(self, line, column):
+        pos = 0
+        for _ in range(line - 1):
+            pos = self.text.index("\n", pos) + 1
+        return pos + column
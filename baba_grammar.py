@@ -0,0 +1,707 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import hashlib
+import json
+import os
+import re
+
+import baba
+
+# table driven parser for baba.py, made from the grammar text
+# - reading the grammar notation (::= | { } [ ]) into rules, with the
+#   { } and [ ] turned into rules of their own
+# - FIRST/FOLLOW sets, for one and two tokens of lookahead
+# - the LL(1)/LL(2) conflicts of the grammar, and the prediction table
+# - the table saved as JSON in lua_table.json, which is checked in, so
+#   it is only made again when the grammar changes, by running this file
+# - TableParser, one loop over a stack of symbols driven by the table
+#
+# python3 baba_grammar.py [grammar file] writes the table and prints
+# the conflicts, the grammar at the end of baba.py is used if no file
+
+TABLE_FORMAT = "1"
+# bump when the table layout or the way it is made changes
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lua_table.json")
+
+START = "chunk"
+
+# the rules of the grammar that are not LL(k) as written, they are
+# parsed by Parser with a Star that gives back its last repetition, a
+# table cannot look that far ahead, so for the table they are replaced
+# by these, which take every suffix and then check the last of them with
+# the @ actions, see TableParser.check_chain, as a table cannot tell a
+# call from a field until after it
+# - a statement that is not an assignment has to end in a call
+# - an assignment to a name and some suffixes has to end in a field
+# - so does a var, unless it is a name followed by , or =
+LL_OVERRIDES = '''
+stat ::=
+     Name @chain_name { stat_suffix } stat_end |
+     `(´ exp `)´ @chain_paren { stat_suffix } stat_end |
+     do block end |
+     while exp do block end |
+     repeat block until exp |
+     if exp then block { elseif exp then block } [ else block ] end |
+     for stat_for |
+     function funcname funcbody |
+     local stat_local
+
+stat_suffix ::= @mark exp_back @field | @mark args_back @call
+
+stat_end ::= @assign end_explist | @call_end
+
+var ::=
+     Name @chain_name { stat_suffix } @var_end |
+     `(´ exp `)´ @chain_paren { stat_suffix } @var_end
+'''
+
+# where the function names and params are, as (rule, first symbol of
+# the alternative, position in the alternative, action), the action
+# gets the tokens that the item at that position matched
+TABLE_ACTIONS = [
+    ("stat", "function", 1, "function_name"), # function funcname funcbody
+    ("stat_local", "function", 1, "function_name"), # local function Name funcbody
+    ("functiondef", "function", 0, "anonymous_function"), # function funcbody
+    ("funcbody", "(", 1, "params"), # ( [ parlist ] ) block end
+]
+
+# the token types that are terminals, any other word that is not a rule
+# is a keyword matched by its value
+TOKEN_TYPES = ("Name", "Number", "String", "EOF")
+
+# the rules that, as in Parser, skip the token none of their
+# alternatives start with, the others leave it for what comes after them
+SKIPPING_RULES = ("exp", "var")
+
+
+
+# reading the grammar
+# a rule is a list of alternatives, each a list of items, an item is
+# ("t", terminal), ("n", rule name), ("star", alternatives) for { },
+# ("opt", alternatives) for [ ] or ("action", name) for @name
+# a terminal is (baba.MATCH_VALUE, text) or (baba.MATCH_TYPE, type)
+
+GRAMMAR_TOKEN_REGEX = re.compile(r"::=|[|{}\[\]]|`[^´]*´|[^\s|{}\[\]`]+")
+
+# the rules in grammar text, as an OrderedDict of name to alternatives
+# lines starting with # are comments, a rule goes on until the next
+# word followed by ::=, names are words that are rules in text or in
+# known_names, the rules of the grammar being added to
+def read_grammar(text, known_names=()):
+    words = []
+    for line in text.split("\n"):
+        if line.strip().startswith("#"):
+            continue
+        words.extend(GRAMMAR_TOKEN_REGEX.findall(line))
+
+    # split into rules, name ::= ...
+    rule_words = collections.OrderedDict()
+    name = None
+    for k, word in enumerate(words):
+        if k + 1 < len(words) and words[k + 1] == "::=":
+            name = word
+            rule_words[name] = []
+        elif word == "::=":
+            continue
+        elif name is None:
+            raise ValueError("grammar does not start with a rule: %r" % word)
+        else:
+            rule_words[name].append(word)
+
+    rule_names = set(rule_words) | set(known_names)
+    rules = collections.OrderedDict()
+    for name, body in rule_words.items():
+        alternatives, k = read_alternatives(body, 0, rule_names, name)
+        if k != len(body):
+            raise ValueError("unmatched %r in rule %s" % (body[k], name))
+        rules[name] = alternatives
+    return rules
+
+# reads alternatives from words[k:] up to a closing } or ], returns
+# them and the index of the closing word (or the end)
+def read_alternatives(words, k, rule_names, rule):
+    alternatives = [[]]
+    while k < len(words):
+        word = words[k]
+        if word == "|":
+            alternatives.append([])
+        elif word in ("{", "["):
+            inner, k = read_alternatives(words, k + 1, rule_names, rule)
+            close = "}" if word == "{" else "]"
+            if k >= len(words) or words[k] != close:
+                raise ValueError("%s not closed in rule %s" % (word, rule))
+            alternatives[-1].append(("star" if word == "{" else "opt", inner))
+        elif word in ("}", "]"):
+            return alternatives, k
+        elif word.startswith("`"):
+            alternatives[-1].append(("t", (baba.MATCH_VALUE, word[1:-1])))
+        elif word.startswith("@") and len(word) > 1:
+            alternatives[-1].append(("action", word[1:]))
+        elif word in rule_names:
+            alternatives[-1].append(("n", word))
+        elif word in TOKEN_TYPES:
+            alternatives[-1].append(("t", (baba.MATCH_TYPE, word)))
+        else:
+            alternatives[-1].append(("t", (baba.MATCH_VALUE, word)))
+        k += 1
+    return alternatives, k
+
+# wraps the items named by TABLE_ACTIONS in a mark and the action
+def add_actions(rules, actions):
+    for (rule, first, position, action) in actions:
+        for alternative in rules[rule]:
+            if alternative and alternative[0][0] == "t" and alternative[0][1][1] == first:
+                alternative[position:position + 1] = [("action", "mark"), alternative[position], ("action", action)]
+                break
+        else:
+            raise ValueError("no alternative of %s starts with %r" % (rule, first))
+
+
+
+# the grammar as plain productions, every { } and [ ] made into a rule
+# of its own, named after the rule it is in, ie. chunk.1
+# productions[name] is a list of tuples of symbols, a symbol is a
+# terminal tuple, a rule name or ("action", name), () is empty
+class Grammar:
+    def __init__(self, rules, start=START):
+        self.start = start
+        self.productions = collections.OrderedDict()
+        self.helpers = collections.Counter()
+        for name, alternatives in rules.items():
+            self.productions[name] = None
+        for name, alternatives in rules.items():
+            self.productions[name] = [self.flatten(name, alternative) for alternative in alternatives]
+        self.drop_unreachable()
+        self.terminals = []
+        for alternatives in self.productions.values():
+            for alternative in alternatives:
+                for symbol in alternative:
+                    if is_terminal(symbol) and symbol not in self.terminals:
+                        self.terminals.append(symbol)
+        eof = (baba.MATCH_TYPE, "EOF")
+        if eof not in self.terminals:
+            self.terminals.append(eof)
+
+    # the items of an alternative as symbols, making rules for { } [ ]
+    def flatten(self, name, alternative):
+        symbols = []
+        for (kind, item) in alternative:
+            if kind in ("t", "action"):
+                symbols.append(item if kind == "t" else ("action", item))
+            elif kind == "n":
+                symbols.append(item)
+            else:
+                self.helpers[name] += 1
+                helper = "%s.%d" % (name, self.helpers[name])
+                self.productions[helper] = None
+                inner = [self.flatten(helper, a) for a in item]
+                if kind == "star":
+                    # helper ::= X helper | empty
+                    inner = [a + (helper,) for a in inner]
+                self.productions[helper] = inner + [()]
+                symbols.append(helper)
+        return tuple(symbols)
+
+    def drop_unreachable(self):
+        reached = set([self.start])
+        todo = [self.start]
+        while todo:
+            for alternative in self.productions[todo.pop()]:
+                for symbol in alternative:
+                    if symbol.__class__ is str and symbol not in reached:
+                        reached.add(symbol)
+                        todo.append(symbol)
+        for name in list(self.productions):
+            if name not in reached:
+                del self.productions[name]
+
+def is_terminal(symbol):
+    return symbol.__class__ is tuple and symbol[0] != "action"
+
+def is_action(symbol):
+    return symbol.__class__ is tuple and symbol[0] == "action"
+
+# a terminal as it is written in the grammar
+def terminal_text(terminal):
+    if terminal[0] == baba.MATCH_TYPE:
+        return terminal[1]
+    return "`" + terminal[1] + "´"
+
+
+
+# FIRST/FOLLOW sets
+# for k tokens of lookahead, as sets of tuples of up to k terminals,
+# a tuple shorter than k is the end of the input, () is empty
+
+# every a + b cut to k long
+def concat_k(first, second, k):
+    ret = set()
+    for a in first:
+        if len(a) >= k:
+            ret.add(a)
+        else:
+            for b in second:
+                ret.add((a + b)[:k])
+    return ret
+
+class LookaheadSets:
+    def __init__(self, grammar, k=2):
+        self.grammar = grammar
+        self.k = k
+        self.first = dict((name, set()) for name in grammar.productions)
+        self.follow = dict((name, set()) for name in grammar.productions)
+        self.follow[grammar.start].add( ((baba.MATCH_TYPE, "EOF"),) )
+
+        changed = True
+        while changed:
+            changed = False
+            for name, alternatives in grammar.productions.items():
+                for alternative in alternatives:
+                    first = self.first_of(alternative)
+                    if not first <= self.first[name]:
+                        self.first[name] |= first
+                        changed = True
+
+        changed = True
+        while changed:
+            changed = False
+            for name, alternatives in grammar.productions.items():
+                for alternative in alternatives:
+                    symbols = [s for s in alternative if not is_action(s)]
+                    for j, symbol in enumerate(symbols):
+                        if symbol.__class__ is not str:
+                            continue
+                        follow = concat_k(self.first_of(symbols[j + 1:]), self.follow[name], k)
+                        if not follow <= self.follow[symbol]:
+                            self.follow[symbol] |= follow
+                            changed = True
+
+    # FIRST_k of a sequence of symbols
+    def first_of(self, symbols):
+        ret = set([()])
+        for symbol in symbols:
+            if is_action(symbol):
+                continue
+            if is_terminal(symbol):
+                ret = concat_k(ret, set([(symbol,)]), self.k)
+            else:
+                ret = concat_k(ret, self.first[symbol], self.k)
+            if all(len(a) >= self.k for a in ret):
+                break
+        return ret
+
+    # the token sequences that predict an alternative of name
+    def lookahead(self, name, alternative):
+        return concat_k(self.first_of(alternative), self.follow[name], self.k)
+
+    def nullable(self, name):
+        return () in self.first[name]
+
+    # FIRST_1/FOLLOW_1 of name, as sets of terminals
+    def first_1(self, name):
+        return set(a[0] for a in self.first[name] if a)
+
+    def follow_1(self, name):
+        return set(a[0] for a in self.follow[name] if a)
+
+
+
+# the prediction table
+# for each rule, a dict of the next terminal to the alternative to take,
+# or to a dict of the terminal after that to the alternative, with
+# None for any other, where one token is not enough
+# a conflict is where the lookahead does not pick one alternative, the
+# first of them in the grammar is taken, which for a { } or [ ] is to
+# go into it rather than skip it, as Parser does
+
+Conflict = collections.namedtuple('Conflict', ['rule', 'lookahead', 'alternatives', 'k'])
+
+def build_table(grammar, sets):
+    table = collections.OrderedDict()
+    conflicts = []
+    for name, alternatives in grammar.productions.items():
+        predicts = [sets.lookahead(name, alternative) for alternative in alternatives]
+        by_first = dict()
+        for n, sequences in enumerate(predicts):
+            for sequence in sequences:
+                by_first.setdefault(sequence[0], set()).add(n)
+        row = collections.OrderedDict()
+        for t1 in sorted(by_first, key=grammar.terminals.index):
+            choices = by_first[t1]
+            if len(choices) == 1:
+                row[t1] = min(choices)
+                continue
+            conflicts.append(Conflict(name, (t1,), sorted(choices), 1))
+            by_second = dict()
+            for n in sorted(choices):
+                for sequence in predicts[n]:
+                    if sequence[0] == t1:
+                        t2 = sequence[1] if len(sequence) > 1 else None
+                        by_second.setdefault(t2, set()).add(n)
+            # None is any other token, or the end
+            split = collections.OrderedDict([(None, min(choices))])
+            unresolved = []
+            unresolved_choices = set()
+            for t2 in sorted(by_second, key=lambda t: -1 if t is None else grammar.terminals.index(t)):
+                second_choices = by_second[t2]
+                if len(second_choices) > 1:
+                    unresolved.append(t2)
+                    unresolved_choices |= second_choices
+                split[t2] = min(second_choices)
+            if unresolved:
+                conflicts.append(Conflict(name, (t1, unresolved), sorted(unresolved_choices), 2))
+            if len(set(split.values())) == 1:
+                row[t1] = split[None]
+            else:
+                row[t1] = split
+        table[name] = row
+    return table, conflicts
+
+def conflict_string(grammar, conflict):
+    alternatives = []
+    for n in conflict.alternatives:
+        symbols = [s for s in grammar.productions[conflict.rule][n] if not is_action(s)]
+        alternatives.append(" ".join(terminal_text(s) if is_terminal(s) else s for s in symbols) or "(empty)")
+    lookahead = terminal_text(conflict.lookahead[0])
+    if conflict.k == 2:
+        lookahead += " then " + " ".join(terminal_text(t) if t else "(end)" for t in conflict.lookahead[1])
+    return "LL(%d) conflict in %s on %s between %s" % (conflict.k, conflict.rule, lookahead,
+            " | ".join(alternatives))
+
+
+
+# the table as saved, everything is numbered, terminals from 0, rules
+# after them, and actions below 0, see TableParser for what it holds
+
+ACTION_CODES = {"mark": -1, "function_name": -2, "anonymous_function": -3, "params": -4,
+        "chain_name": -5, "chain_paren": -6, "field": -7, "call": -8,
+        "assign": -9, "call_end": -10, "var_end": -11}
+CHAIN_NAME = ACTION_CODES["chain_name"]
+CHAIN_PAREN = ACTION_CODES["chain_paren"]
+FIELD = ACTION_CODES["field"]
+CALL = ACTION_CODES["call"]
+ASSIGN = ACTION_CODES["assign"]
+CALL_END = ACTION_CODES["call_end"]
+
+def grammar_hash(text):
+    h = hashlib.sha256()
+    for part in (TABLE_FORMAT, text, LL_OVERRIDES, repr(TABLE_ACTIONS)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+# makes the table for grammar text, with the conflicts found
+def generate(text):
+    rules = read_grammar(text)
+    for name, alternatives in read_grammar(LL_OVERRIDES, rules).items():
+        rules[name] = alternatives
+    add_actions(rules, TABLE_ACTIONS)
+    grammar = Grammar(rules)
+    sets = LookaheadSets(grammar)
+    table, conflicts = build_table(grammar, sets)
+
+    terminals = grammar.terminals
+    names = list(grammar.productions)
+    codes = dict((t, n) for (n, t) in enumerate(terminals))
+    codes.update((name, len(terminals) + n) for (n, name) in enumerate(names))
+    codes.update((("action", a), c) for (a, c) in ACTION_CODES.items())
+
+    productions = []
+    alternatives = []
+    for name in names:
+        ids = []
+        for alternative in grammar.productions[name]:
+            ids.append(len(productions))
+            # reversed, so it is pushed onto the stack as it is
+            productions.append([codes[s] for s in reversed(alternative)])
+        alternatives.append(ids)
+
+    rows = []
+    for name in names:
+        row = dict()
+        for t1, choice in table[name].items():
+            if isinstance(choice, dict):
+                choice = dict((-1 if t2 is None else codes[t2], alternatives[names.index(name)][n])
+                        for (t2, n) in choice.items())
+                row[codes[t1]] = choice
+            else:
+                row[codes[t1]] = alternatives[names.index(name)][choice]
+        rows.append(row)
+
+    empty = []
+    for n, name in enumerate(names):
+        empty.append(None)
+        for k, alternative in enumerate(grammar.productions[name]):
+            if not [s for s in alternative if not is_action(s)]:
+                empty[n] = alternatives[n][k]
+
+    expected = []
+    for name in names:
+        first = sets.first_1(name)
+        expected.append([[t[1], t[0]] for t in terminals if t in first])
+
+    saved = {
+        "format": TABLE_FORMAT,
+        "grammar_hash": grammar_hash(text),
+        "terminals": [[t[0], t[1]] for t in terminals],
+        "rules": names,
+        "start": codes[grammar.start],
+        "productions": productions,
+        "table": [[[t1, choice if not isinstance(choice, dict) else sorted(choice.items())]
+                for (t1, choice) in sorted(row.items())] for row in rows],
+        "empty": empty,
+        "expected": expected,
+    }
+    return saved, grammar, sets, conflicts
+
+def save_table(saved, path=TABLE_PATH):
+    with open(path, "w") as out:
+        json.dump(saved, out, separators=(",", ":"))
+        out.write("\n")
+
+# the table for the grammar text, loaded from path if it was made from
+# the same grammar, else made again, but only in memory, the table is
+# saved by running this file and not at run time, where the directory
+# it is in may not be writable
+def load_table(text=None, path=TABLE_PATH):
+    if text is None:
+        text = baba.grammar
+    try:
+        with open(path) as ins:
+            saved = json.load(ins)
+        if saved.get("format") == TABLE_FORMAT and saved.get("grammar_hash") == grammar_hash(text):
+            return ParseTable(saved)
+    except (IOError, ValueError):
+        pass
+    return ParseTable(generate(text)[0])
+
+# the table for baba.grammar, loaded once
+loaded_tables = []
+
+def default_table():
+    if not loaded_tables:
+        loaded_tables.append(load_table())
+    return loaded_tables[0]
+
+# the set of tokens that can start the named rule of the default table,
+# see baba.expected_set
+def expected_set(rule):
+    table = default_table()
+    return table.expected[table.rules.index(rule)]
+
+
+
+
+# the loaded table, as lists indexed by the numbers in it
+class ParseTable:
+    def __init__(self, saved):
+        self.terminals = [tuple(t) for t in saved["terminals"]]
+        self.n_terminals = len(self.terminals)
+        self.rules = saved["rules"]
+        self.start = saved["start"]
+        self.productions = [tuple(p) for p in saved["productions"]]
+        self.table = []
+        for row in saved["table"]:
+            entry = dict()
+            for (t1, choice) in row:
+                if isinstance(choice, list):
+                    choice = dict((t2, p) for (t2, p) in choice)
+                entry[t1] = choice
+            self.table.append(entry)
+        self.empty = saved["empty"]
+        # the alternative of each rule that has only the one, which is gone
+        # into even when the token does not predict it, as Parser does, so
+        # the error is logged by what in it does not match, None for others
+        self.only = []
+        for row in self.table:
+            choices = set()
+            for choice in row.values():
+                choices.update(choice.values() if isinstance(choice, dict) else (choice,))
+            self.only.append(choices.pop() if len(choices) == 1 else None)
+        self.expected = [[(text, kind) for (text, kind) in e] for e in saved["expected"]]
+        # codes of tokens, keywords and operators by value, the rest by type
+        self.type_codes = dict()
+        self.value_codes = dict()
+        for code, (kind, text) in enumerate(self.terminals):
+            if kind == baba.MATCH_TYPE:
+                self.type_codes[text] = code
+            else:
+                self.value_codes[text] = code
+        self.eof = self.type_codes["EOF"]
+        # the production of end_explist, which has one alternative
+        self.end_explist = self.productions[self.only[self.rules.index("end_explist")]]
+        # the id of the set of tokens each rule expects, for its errors,
+        # Parser's first set of the rule where that has the same tokens,
+        # so the message is the same as Parser's
+        self.expected_ids = []
+        for (name, expected) in zip(self.rules, self.expected):
+            if name in baba.firstSets and set(baba.firstSets[name]) == set(expected):
+                self.expected_ids.append(name)
+            else:
+                self.expected_ids.append(baba.TABLE_SET_PREFIX + name)
+
+# table driven parser, the grammar functions of Parser are not used, one
+# loop pops symbols off a stack, matching terminals against the tokens
+# and replacing rules with the alternative the table predicts
+# errors are logged with Parser's messages, a token that does not match
+# is skipped, as matchValueNow does, and a rule with nothing predicted
+# is dropped, so the errors are not always the same ones Parser finds
+class TableParser(baba.Parser):
+    def __init__(self, table=None):
+        baba.Parser.__init__(self)
+        self.table = table or default_table()
+        self.chain = None
+        # the suffixes of the statement or var being parsed, as
+        # (CHAIN_NAME or CHAIN_PAREN, FIELD, CALL or None if there are
+        # none yet, the token the last one starts at)
+
+    def doIt(self, i, tokens):
+        table = self.table
+        n_terminals = table.n_terminals
+        rows = table.table
+        productions = table.productions
+        type_codes = table.type_codes
+        value_codes = table.value_codes
+        stack = [table.eof, table.start]
+        marks = []
+
+        # code of the token at i, -1 for one that is no terminal or past
+        # the end, which picks the None entry of a two token row
+        def code_at(i):
+            try:
+                code = type_codes.get(baba.token_type(tokens, i))
+                if code is None:
+                    code = value_codes.get(baba.token_value(tokens, i), -1)
+            except IndexError:
+                return -1
+            return code
+
+        # code of the token at i, only worked out again when i moves
+        code = code_at(i)
+        while stack:
+            symbol = stack.pop()
+            if symbol >= n_terminals:
+                rule = symbol - n_terminals
+                choice = rows[rule].get(code)
+                if choice.__class__ is dict:
+                    choice = choice.get(code_at(i + 1), choice.get(-1))
+                if choice is None:
+                    choice = table.empty[rule]
+                if choice is None:
+                    choice = table.only[rule]
+                if choice is None:
+                    i = self.expected(i, tokens, rule)
+                    code = code_at(i)
+                    continue
+                stack.extend(productions[choice])
+            elif symbol >= 0:
+                if code == symbol:
+                    i += 1
+                    code = code_at(i)
+                    continue
+                (kind, text) = table.terminals[symbol]
+                if kind == baba.MATCH_TYPE:
+                    self.match_t(tokens, i, text)
+                else:
+                    self.match_v(tokens, i, text)
+                if symbol == table.eof and self.recover and i < len(tokens):
+                    # a token the start rule stopped at (a stray end,
+                    # say) is skipped along with anything up to the next
+                    # statement, and the rest parsed from the start rule
+                    # again, up to EOF, as Parser.doIt does
+                    i = self.synchronize(i + 1, tokens, None)
+                    code = code_at(i)
+                    stack.extend((table.eof, table.start))
+                    continue
+                i = self.mismatch(i, tokens, text)
+                code = code_at(i)
+            elif symbol == -1:
+                marks.append(i)
+            elif symbol == -2:
+                self.log_function_name(marks.pop(), i, tokens)
+            elif symbol == -3:
+                self.log_function_name(marks.pop(), baba.ANON, tokens)
+            elif symbol == -4:
+                self.log_params(marks.pop(), i, tokens)
+            elif symbol >= CHAIN_PAREN:
+                self.chain = (symbol, None, i)
+            elif symbol >= CALL:
+                self.chain = (self.chain[0], symbol, marks.pop())
+            else:
+                j = self.check_chain(symbol, i, tokens, stack)
+                if j != i:
+                    i = j
+                    code = code_at(i)
+        return i, tokens
+
+    # what Parser checks by giving back the last suffix of a statement or
+    # a var, once all of them are matched, action is ASSIGN before an
+    # end_explist, CALL_END for a statement without one or var_end
+    # the errors are the ones Parser logs, and the parse goes on as it
+    # does, which for a statement that has to end in a field is to match
+    # an end_explist, and one ending in a call to end there, leaving the
+    # , or = to what comes after it, returns the i to go on from
+    def check_chain(self, action, i, tokens, stack):
+        (head, last, start) = self.chain
+        if action == ASSIGN:
+            if last == CALL:
+                stack.pop()
+            elif last is None and head == CHAIN_PAREN:
+                self.error_expected((i,i), tokens, "stat_name_eap")
+                stack.pop()
+        elif action == CALL_END:
+            if last == FIELD:
+                stack.extend(self.table.end_explist)
+            elif last is None:
+                self.error_expected((i,i), tokens, "stat_name" if head == CHAIN_NAME else "stat_name_eap")
+        elif last == CALL:
+            # a var, the call is given back and an exp_back expected there
+            self.backtrack(start)
+            self.error_expected((start,start), tokens, "exp_back")
+            return start
+        elif last is None and not (head == CHAIN_NAME and baba.contains(i, tokens, baba.COMMA_EQUALS_SET)):
+            self.error_expected((i,i), tokens, "exp_back")
+        return i
+
+    # logs that none of a rule's alternatives can start at i, the
+    # expected set is only looked up if the error is printed, returns the
+    # i to go on from, past the token for SKIPPING_RULES as for Parser's
+    # operand and var
+    def expected(self, i, tokens, rule):
+        self.error_expected((i,i), tokens, self.table.expected_ids[rule])
+        if self.table.rules[rule] not in SKIPPING_RULES:
+            return i
+        if self.recover and self.table.rules[rule] == "exp":
+            return self.synchronize(i, tokens, None)
+        return i + 1
+
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Make the parse table for TableParser from the grammar")
+    argparser.add_argument("grammar", nargs="?", help="grammar file, the grammar in baba.py if not given")
+    argparser.add_argument("--output", "-o", default=TABLE_PATH, help="where to save the table")
+    argparser.add_argument("--sets", action="store_true", help="print the FIRST/FOLLOW sets of every rule")
+    args = argparser.parse_args()
+
+    if args.grammar:
+        with open(args.grammar) as ins:
+            text = ins.read()
+    else:
+        text = baba.grammar
+    saved, grammar, sets, conflicts = generate(text)
+    if args.sets:
+        for name in grammar.productions:
+            print(name)
+            print("  FIRST  " + " ".join(sorted(terminal_text(t) for t in sets.first_1(name)))
+                    + (" (empty)" if sets.nullable(name) else ""))
+            print("  FOLLOW " + " ".join(sorted(terminal_text(t) for t in sets.follow_1(name))))
+    for conflict in conflicts:
+        print(conflict_string(grammar, conflict))
+    print("%d rules, %d terminals, %d LL(1) conflicts, %d left after LL(2)" % (len(grammar.productions),
+            len(grammar.terminals), len([c for c in conflicts if c.k == 1]),
+            len([c for c in conflicts if c.k == 2])))
+    save_table(saved, args.output)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import hashlib
+import os
+import sqlite3
+
+import baba
+
+# index of the functions defined across a tree of Lua files, kept in one
+# sqlite file so looking a function up needs no parsing at all
+# - each function is its qualified name (a.b:c), the last part of the
+#   name (c), its params, file and line, anonymous functions included
+# - update only parses the files that changed since they were indexed,
+#   a file whose mtime and size are the same is not read, one whose
+#   hash is the same is not parsed
+# - lookups by name, last part of the name or prefix of the name go
+#   through indexes on the names so take well under a millisecond
+
+# seconds to wait for another process holding the lock on the index
+LOCK_TIMEOUT = 30
+
+# one function in the index
+Definition = collections.namedtuple('Definition', ['name', 'params', 'fname', 'line', 'anonymous'])
+
+# what an update did, numbers of files
+UpdateStats = collections.namedtuple('UpdateStats', ['parsed', 'unchanged', 'removed', 'failed'])
+
+# sha256 of the file's bytes
+def file_hash(fname):
+    with open(fname, "rb") as ins:
+        return hashlib.sha256(ins.read()).hexdigest()
+
+# the last part of a function name, c of a.b:c, or all of it
+def short_name(name):
+    for sep in (":", "."):
+        k = name.rfind(sep)
+        if k >= 0:
+            return name[k + 1:]
+    return name
+
+class FunctionIndex:
+    def __init__(self, path):
+        self.path = path
+        # autocommit, transactions are started explicitly below
+        self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS files ("
+                "fname TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL, "
+                "hash TEXT NOT NULL, errors INTEGER NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS functions ("
+                "fname TEXT NOT NULL, line INTEGER, name TEXT NOT NULL, short TEXT NOT NULL, "
+                "params TEXT NOT NULL, anonymous INTEGER NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS functions_name ON functions (name)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS functions_short ON functions (short)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS functions_fname ON functions (fname)")
+        # files indexed by another version of the parser are parsed again
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'parser_version'").fetchone()
+        if row is None or row[0] != baba.PARSER_VERSION:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("DELETE FROM functions")
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('parser_version', ?)",
+                    (baba.PARSER_VERSION,))
+            self.connection.execute("COMMIT")
+
+    def close(self):
+        self.connection.close()
+
+    # brings the index up to date with the files in paths (see
+    # baba.expand_paths), parsing the ones that changed over jobs
+    # processes, and drops the files in the index that are gone
+    def update(self, paths, jobs=None):
+        fnames = baba.expand_paths(paths)
+        known = dict((row[0], row[1:]) for row in
+                self.connection.execute("SELECT fname, mtime, size, hash FROM files"))
+        unchanged = 0
+        # files whose contents are the same but mtime is not, and files to parse
+        touched = []
+        changed = []
+        for fname in fnames:
+            st = os.stat(fname)
+            old = known.get(fname)
+            if old is not None and old[0] == st.st_mtime and old[1] == st.st_size:
+                unchanged += 1
+                continue
+            h = file_hash(fname)
+            if old is not None and old[2] == h:
+                unchanged += 1
+                touched.append((st.st_mtime, st.st_size, fname))
+            else:
+                changed.append((fname, st.st_mtime, st.st_size, h))
+
+        gone = [fname for fname in known if not os.path.exists(fname)]
+        # parsed before the write lock is taken, so other indexers are
+        # only held up by the writes
+        results = list(baba.parse_files([fname for (fname, mtime, size, h) in changed], jobs))
+        failed = sum(1 for batch_result in results if batch_result.failure is not None)
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            for ((fname, mtime, size, h), batch_result) in zip(changed, results):
+                self.store(fname, mtime, size, h, batch_result.result)
+            self.connection.executemany("UPDATE files SET mtime = ?, size = ? WHERE fname = ?", touched)
+            for fname in gone:
+                self.remove(fname)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return UpdateStats(len(changed), unchanged, len(gone), failed)
+
+    # replaces what is indexed for fname with the functions in result,
+    # None if the file could not be parsed
+    def store(self, fname, mtime, size, h, result):
+        self.remove(fname)
+        functions = result.functions() if result is not None else []
+        errors = len(result.error_list) if result is not None else 1
+        self.connection.execute("INSERT INTO files (fname, mtime, size, hash, errors) VALUES (?, ?, ?, ?, ?)",
+                (fname, mtime, size, h, errors))
+        self.connection.executemany("INSERT INTO functions (fname, line, name, short, params, anonymous) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(fname, line if line != "" else None, name, short_name(name), params,
+                        int(name == baba.ANONYMOUS_FUNCTION))
+                        for (line, name, params) in functions])
+
+    def remove(self, fname):
+        self.connection.execute("DELETE FROM functions WHERE fname = ?", (fname,))
+        self.connection.execute("DELETE FROM files WHERE fname = ?", (fname,))
+
+    # the functions matching where, in file and line order, at most
+    # limit of them if it is not None
+    def definitions(self, where, args, limit=None):
+        return [Definition(name, params, fname, line, bool(anonymous))
+                for (name, params, fname, line, anonymous) in self.connection.execute(
+                        "SELECT name, params, fname, line, anonymous FROM functions WHERE " + where
+                        + " ORDER BY fname, line LIMIT ?", args + (-1 if limit is None else limit,))]
+
+    # the functions named name, a qualified name (a.b:c) or the last part of one (c)
+    def find(self, name, limit=None):
+        return self.definitions("name = ? OR short = ?", (name, name), limit)
+
+    # the functions whose qualified name starts with prefix
+    def find_prefix(self, prefix, limit=None):
+        # a range on the index rather than LIKE, which would scan
+        return self.definitions("name >= ? AND name < ?", (prefix, prefix + "\U0010ffff"), limit)
+
+    # the functions defined in fname
+    def in_file(self, fname):
+        return self.definitions("fname = ?", (fname,))
+
+    # number of files and of functions in the index
+    def stats(self):
+        files = self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        functions = self.connection.execute("SELECT COUNT(*) FROM functions").fetchone()[0]
+        return files, functions
+
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Keep an index of the functions defined in Lua files")
+    argparser.add_argument("index", help="sqlite file the index is kept in")
+    commands = argparser.add_subparsers(dest="command")
+    commands.required = True
+    update_command = commands.add_parser("update", help="index the files that changed")
+    update_command.add_argument("paths", nargs="+", help="Lua files, directories or globs")
+    update_command.add_argument("--jobs", "-j", type=int, default=None,
+            help="processes to parse with, all of the cpus by default")
+    find_command = commands.add_parser("find", help="functions with a name, qualified or the last part")
+    find_command.add_argument("name")
+    prefix_command = commands.add_parser("prefix", help="functions whose qualified name starts with a prefix")
+    prefix_command.add_argument("prefix")
+    for command in (find_command, prefix_command):
+        command.add_argument("--limit", type=int, default=None, help="print at most this many")
+    args = argparser.parse_args()
+
+    index = FunctionIndex(args.index)
+    if args.command == "update":
+        stats = index.update(args.paths, args.jobs)
+        (files, functions) = index.stats()
+        print("%d parsed, %d unchanged, %d removed, %d failed, %d files, %d functions" % (
+                stats.parsed, stats.unchanged, stats.removed, stats.failed, files, functions))
+    else:
+        if args.command == "find":
+            definitions = index.find(args.name, args.limit)
+        else:
+            definitions = index.find_prefix(args.prefix, args.limit)
+        for d in definitions:
+            print("%s:%s: %s (%s)" % (d.fname, d.line, d.name, d.params))
+    index.close()
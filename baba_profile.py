@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import collections
+import time
+
+import baba
+
+# profiler for baba.py
+# where a parse spends its time, by nonterminal, ProfilingParser is a
+# subclass of Parser made at import time as baba.TracingParser is, with
+# - every grammar function wrapped to count the calls to it, the tokens
+#   it consumed and the time in it, with and without the rules it called
+# - Parser's contains, predict and lookahead, which the grammar
+#   functions and Repeaters check the next tokens with, overridden to
+#   count the checks and their hits by first set, prediction table or
+#   Repeater
+# the plain Parser has none of it, so costs nothing more when not profiling
+
+# kinds of check counted
+CONTAINS = "contains"
+PREDICT = "predict"
+LOOKAHEAD = "lookahead"
+
+# the counts of one or more parses, added up
+class Profile:
+    def __init__(self):
+        self.programs = 0
+        self.tokens = 0
+        self.failed = 0
+        # programs parsed, the tokens in them and those that could not be tokenized
+        self.rules = dict()
+        # name -> [calls, tokens consumed, time in it, time in it but not in the rules it called]
+        self.checks = dict()
+        # (kind, name of the set or table) -> [calls, hits]
+        self.child_times = []
+        # for each rule being run, the time in the rules it has called
+        self.running = collections.Counter()
+        # how many calls of each rule are being run, only the outermost
+        # one of a recursive rule adds its tokens and time, the inner
+        # ones are in them already
+
+    # counts a call of the rule name that consumed tokens in took seconds
+    def add_rule(self, name, consumed, took):
+        children = self.child_times.pop()
+        self.running[name] -= 1
+        counts = self.rules.get(name)
+        if counts is None:
+            counts = self.rules[name] = [0, 0, 0.0, 0.0]
+        counts[0] += 1
+        if not self.running[name]:
+            counts[1] += consumed
+            counts[2] += took
+        counts[3] += took - children
+        if self.child_times:
+            self.child_times[-1] += took
+
+    def add_check(self, kind, checked, hit):
+        key = (kind, set_name(checked))
+        counts = self.checks.get(key)
+        if counts is None:
+            counts = self.checks[key] = [0, 0]
+        counts[0] += 1
+        if hit:
+            counts[1] += 1
+
+    # the counts as a dict that json can dump, times in seconds
+    def to_dict(self):
+        return {"programs": self.programs, "tokens": self.tokens, "failed": self.failed,
+                "rules": dict((name, {"calls": calls, "tokens": consumed, "time": took, "self_time": self_took})
+                        for (name, (calls, consumed, took, self_took)) in self.rules.items()),
+                "checks": [{"kind": kind, "set": name, "calls": calls, "hits": hits}
+                        for ((kind, name), (calls, hits)) in sorted(self.checks.items())]}
+
+    # the rules, most time in them but not in the rules they called
+    # first, then the checks, most calls first, as a table
+    def report(self):
+        lines = ["%d programs, %d tokens, %d could not be tokenized" % (self.programs, self.tokens, self.failed)]
+        total = sum(counts[3] for counts in self.rules.values()) or 1.0
+        lines.append("%-18s %10s %10s %10s %10s %7s" % ("rule", "calls", "tokens", "total ms", "self ms", "self %"))
+        for (name, (calls, consumed, took, self_took)) in sorted(self.rules.items(),
+                key=lambda item: item[1][3], reverse=True):
+            lines.append("%-18s %10d %10d %10.1f %10.1f %6.1f%%" % (name, calls, consumed,
+                    took * 1000, self_took * 1000, 100.0 * self_took / total))
+        lines.append("")
+        lines.append("%-10s %-24s %10s %10s %7s" % ("check", "set", "calls", "hits", "hit %"))
+        for ((kind, name), (calls, hits)) in sorted(self.checks.items(),
+                key=lambda item: item[1][0], reverse=True):
+            lines.append("%-10s %-24s %10d %10d %6.1f%%" % (kind, name, calls, hits, 100.0 * hits / calls))
+        return "\n".join(lines) + "\n"
+
+# names of the first sets, prediction tables and Repeaters by id, the
+# named sets of the grammar functions, the ones for each nonterminal and
+# the Repeaters of Parser
+SET_NAMES = dict()
+for _name, _value in vars(baba).items():
+    if _name.endswith("_SET") and isinstance(_value, baba.FirstSet):
+        SET_NAMES[id(_value)] = _name
+for _name, _value in baba.firstSetLookup.items():
+    SET_NAMES[id(_value)] = _name
+for _name, _value in baba.predictions.items():
+    SET_NAMES[id(_value)] = _name
+for _name, _value in vars(baba.Parser).items():
+    if isinstance(_value, baba.Repeater):
+        SET_NAMES[id(_value)] = _name
+
+# the name of a first set, prediction table or Repeater, or what is in it
+# if it has not got one
+def set_name(checked):
+    name = SET_NAMES.get(id(checked))
+    if name is None:
+        if isinstance(checked, baba.Repeater):
+            checked = checked.lookahead_sets[0]
+        name = "{%s}" % ",".join(sorted(set(checked.values) | set(checked.types)))
+    return name
+
+class ProfilingParser(baba.Parser):
+    def __init__(self, profile=None):
+        baba.Parser.__init__(self)
+        self.profile = profile if profile is not None else Profile()
+
+    def contains(self, i, tokens, firstSet):
+        hit = baba.contains(i, tokens, firstSet)
+        self.profile.add_check(CONTAINS, firstSet, hit)
+        return hit
+
+    def predict(self, i, tokens, prediction):
+        alternative = baba.predict(i, tokens, prediction)
+        self.profile.add_check(PREDICT, prediction, alternative is not None)
+        return alternative
+
+    def lookahead(self, repeater, i, tokens):
+        hit = repeater.lookahead(i, tokens)
+        self.profile.add_check(LOOKAHEAD, repeater, hit)
+        return hit
+
+    def doIt(self, i, tokens):
+        self.profile.programs += 1
+        self.profile.tokens += len(tokens)
+        return baba.Parser.doIt(self, i, tokens)
+
+# wraps a grammar function so it counts its calls, tokens and time
+def profiled_rule(name, rule):
+    def f(self, i, tokens):
+        profile = self.profile
+        profile.child_times.append(0.0)
+        profile.running[name] += 1
+        consumed = 0
+        start = time.perf_counter()
+        try:
+            j, tokens = rule(self, i, tokens)
+            consumed = j - i
+        finally:
+            profile.add_rule(name, consumed, time.perf_counter() - start)
+        return j, tokens
+    f.__name__ = name
+    return f
+
+for _name in baba.GRAMMAR_RULES:
+    setattr(ProfilingParser, _name, profiled_rule(_name, getattr(baba.Parser, _name)))
+
+# parses every file in paths (see baba.expand_paths) in this process
+# with a ProfilingParser, returns the Profile of all of them added up, a
+# file that cannot be tokenized is counted as failed
+def profile_paths(paths, recover=False, max_errors=None):
+    profile = Profile()
+    for fname in baba.expand_paths(paths):
+        try:
+            program = baba.read_program(fname)
+            tokens = baba.tokens_of(program)
+        except Exception:
+            profile.failed += 1
+            continue
+        parser = ProfilingParser(profile)
+        parser.recover = recover
+        parser.max_errors = max_errors
+        parser.parse_tokens(tokens, baba.LineIndex(program))
+    return profile
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import argparse
+import ast
+import builtins
+import inspect
+import os
+import textwrap
+
+import baba
+import baba_stack_rules
+
+# stack parser for baba.py
+# Parser calls a grammar function for every nonterminal it goes into, so
+# deeply nested input (tables in tables, closures in closures) runs out
+# of Python stack, StackParser runs the same grammar functions with the
+# stack kept in a list, so nesting only costs memory
+# - run_stack, the loop that does the calls
+# - StackParser, Parser with its grammar functions run by run_stack
+# - writing baba_stack_rules.py, which is checked in
+#
+# the grammar functions are not written out twice by hand, each one's
+# source is taken from Parser and every call in it to another grammar
+# function, self.exp(i, tokens) or self.stats.run(self, i, tokens),
+# turned into a yield of ("exp", i, tokens) or (self.stats, i, tokens)
+# that is sent back what the call would have returned, the functions
+# that call no other grammar function stay as they are
+# that is done by python3 baba_stack.py, which writes the generator
+# functions to baba_stack_rules.py, run it after changing a grammar
+# function, the tests check the module is the one Parser makes
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baba_stack_rules.py")
+
+STACK_RULES = ("doIt",) + baba.GRAMMAR_RULES
+
+
+
+# running
+# runs the generator function rule, and the calls it yields, in a loop
+# the generators waiting on a call are kept on stack
+def run_stack(parser, rule, i, tokens):
+    rules = parser.stack_rules
+    stack = []
+    generator = rule(parser, i, tokens)
+    value = None
+    while True:
+        try:
+            (callee, i, tokens) = generator.send(value)
+        except StopIteration as stop:
+            if not stack:
+                return stop.value
+            value = stop.value
+            generator = stack.pop()
+            continue
+        if callee.__class__ is str:
+            (f, yields) = rules[callee]
+        else:
+            (f, yields) = (callee.walk, True)
+        if yields:
+            stack.append(generator)
+            generator = f(parser, i, tokens)
+            value = None
+        else:
+            value = f(parser, i, tokens)
+
+# the grammar function name as a method that runs it with run_stack
+def stack_rule(rule):
+    def f(self, i, tokens):
+        return run_stack(self, rule, i, tokens)
+    f.__name__ = rule.__name__
+    return f
+
+class StackParser(baba.Parser):
+    stack_rules = dict()
+    # for each grammar function, (function, True) if it is one of the
+    # generator functions in baba_stack_rules, (function, False) if it
+    # calls nothing and is Parser's
+
+for _rule in baba_stack_rules.RULES:
+    StackParser.stack_rules[_rule.__name__] = (_rule, True)
+    setattr(StackParser, _rule.__name__, stack_rule(_rule))
+for _name in STACK_RULES:
+    if _name not in StackParser.stack_rules:
+        StackParser.stack_rules[_name] = (getattr(baba.Parser, _name), False)
+
+
+
+# writing the rules
+# the generator functions are written with the globals of baba.py they
+# use as baba.name, as the module they are in is not baba.py
+
+RULES_HEADER = '''# the grammar functions of baba.Parser as generator functions for
+# baba_stack.StackParser, written by python3 baba_stack.py, do not edit
+
+import baba
+'''
+
+# turns the grammar function calls in a function's ast into yields
+class YieldRuleCalls(ast.NodeTransformer):
+    def __init__(self):
+        self.yields = False
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        if not isinstance(func, ast.Attribute):
+            return node
+        # self.rule(i, tokens)
+        if is_self(func.value) and func.attr in STACK_RULES:
+            callee = ast.Constant(func.attr)
+            args = node.args
+        # self.repeater.run(self, i, tokens)
+        elif func.attr == "run" and isinstance(func.value, ast.Attribute) and is_self(func.value.value):
+            callee = func.value
+            args = node.args[1:]
+        else:
+            return node
+        self.yields = True
+        return ast.copy_location(ast.Yield(ast.Tuple([callee] + args, ast.Load())), node)
+
+# turns the names of baba.py's globals a function uses into baba.name,
+# bar the ones it has as locals
+class QualifyGlobals(ast.NodeTransformer):
+    def __init__(self, local_names):
+        self.local_names = local_names
+
+    def visit_Name(self, node):
+        if (isinstance(node.ctx, ast.Load) and node.id not in self.local_names
+                and hasattr(baba, node.id) and not hasattr(builtins, node.id)):
+            return ast.copy_location(ast.Attribute(ast.Name("baba", ast.Load()), node.id, ast.Load()), node)
+        return node
+
+def is_self(node):
+    return isinstance(node, ast.Name) and node.id == "self"
+
+def local_names(function):
+    names = set(a.arg for a in function.args.args)
+    for node in ast.walk(function):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+    return names
+
+# the source of the grammar function f of Parser with its calls turned
+# into yields, None if it calls no other grammar function
+def yielding_source(f):
+    tree = ast.parse(textwrap.dedent(inspect.getsource(f)))
+    function = tree.body[0]
+    calls = YieldRuleCalls()
+    tree = calls.visit(tree)
+    if not calls.yields:
+        return None
+    tree = QualifyGlobals(local_names(function)).visit(tree)
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+# the text of baba_stack_rules.py for the grammar functions of Parser
+def rules_source():
+    functions = []
+    names = []
+    for name in STACK_RULES:
+        source = yielding_source(getattr(baba.Parser, name))
+        if source is not None:
+            functions.append(source)
+            names.append(name)
+    return (RULES_HEADER + "\n" + "".join("\n%s\n" % s for s in functions)
+            + "\n" + textwrap.fill("RULES = (%s)" % ", ".join(names), 90, subsequent_indent=" " * 8) + "\n")
+
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Write the generator functions of StackParser")
+    argparser.add_argument("--output", "-o", default=RULES_PATH, help="where to write them")
+    args = argparser.parse_args()
+
+    with open(args.output, "w") as out:
+        out.write(rules_source())
@@ -0,0 +1,366 @@
+# the grammar functions of baba.Parser as generator functions for
+# baba_stack.StackParser, written by python3 baba_stack.py, do not edit
+
+import baba
+
+
+def doIt(self, i, tokens):
+    i, tokens = (yield ('chunk', i, tokens))
+    while self.recover and i < len(tokens) and (not self.match_t(tokens, i, 'EOF')):
+        i = self.synchronize(i + 1, tokens, None)
+        i, tokens = (yield ('chunk', i, tokens))
+    i, tokens = self.matchTypeNow(i, tokens, 'EOF')
+    return (i, tokens)
+
+def chunk(self, i, tokens):
+    i, tokens = (yield (self.stats, i, tokens))
+    i, tokens = (yield (self.last_stat, i, tokens))
+    return (i, tokens)
+
+def block(self, i, tokens):
+    i, tokens = (yield ('chunk', i, tokens))
+    return (i, tokens)
+
+def stat(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['stat'])
+    if alternative == 'Name':
+        i, tokens = self.matchTypeNow(i, tokens, 'Name')
+        i, tokens = (yield (self.exp_args_backs_lookback, i, tokens))
+        i, tokens = (yield ('stat_name', i, tokens))
+    elif alternative == '(':
+        i, tokens = self.matchValueNow(i, tokens, '(')
+        i, tokens = (yield ('exp', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, ')')
+        i, tokens = (yield (self.exp_args_backs_lookback, i, tokens))
+        i, tokens = (yield ('stat_name_eap', i, tokens))
+    elif alternative == 'do':
+        i, tokens = self.matchValueNow(i, tokens, 'do')
+        i, tokens = (yield ('block', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'end')
+    elif alternative == 'while':
+        i, tokens = self.matchValueNow(i, tokens, 'while')
+        i, tokens = (yield ('exp', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'do')
+        i, tokens = (yield ('block', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'end')
+    elif alternative == 'repeat':
+        i, tokens = self.matchValueNow(i, tokens, 'repeat')
+        i, tokens = (yield ('block', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'until')
+        i, tokens = (yield ('exp', i, tokens))
+    elif alternative == 'if':
+        i, tokens = self.matchValueNow(i, tokens, 'if')
+        i, tokens = (yield ('exp', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'then')
+        i, tokens = (yield ('block', i, tokens))
+        i, tokens = (yield (self.elseifs, i, tokens))
+        i, tokens = (yield (self.else_block, i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'end')
+    elif alternative == 'for':
+        i, tokens = self.matchValueNow(i, tokens, 'for')
+        i, tokens = (yield ('stat_for', i, tokens))
+    elif alternative == 'function':
+        i, tokens = self.matchValueNow(i, tokens, 'function')
+        i_b = i
+        i, tokens = (yield ('funcname', i, tokens))
+        self.log_function_name(i_b, i, tokens)
+        i, tokens = (yield ('funcbody', i, tokens))
+    elif alternative == 'local':
+        i, tokens = self.matchValueNow(i, tokens, 'local')
+        i, tokens = (yield ('stat_local', i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'stat')
+        pass
+    return (i, tokens)
+
+def stat_for(self, i, tokens):
+    if self.contains(i, tokens, baba.NAME_SET) and self.contains(i + 1, tokens, baba.EQUALS_SET):
+        i, tokens = self.matchTypeNow(i, tokens, 'Name')
+        i, tokens = self.matchValueNow(i, tokens, '=')
+        i, tokens = (yield ('exp', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, ',')
+        i, tokens = (yield ('exp', i, tokens))
+        i, tokens = (yield (self.for_step, i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'do')
+        i, tokens = (yield ('block', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'end')
+    elif self.contains(i, tokens, baba.firstSetLookup['namelist']) and self.contains(i + 1, tokens, baba.COMMA_IN_SET):
+        i, tokens = (yield ('namelist', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'in')
+        i, tokens = (yield ('explist', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'do')
+        i, tokens = (yield ('block', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, 'end')
+    else:
+        self.error_expected((i, i), tokens, 'stat_for')
+    return (i, tokens)
+
+def stat_local(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['stat_local'])
+    if alternative == 'function':
+        i, tokens = self.matchValueNow(i, tokens, 'function')
+        i_b = i
+        i, tokens = self.matchTypeNow(i, tokens, 'Name')
+        self.log_function_name(i_b, i, tokens)
+        i, tokens = (yield ('funcbody', i, tokens))
+    elif alternative == 'namelist':
+        i, tokens = (yield ('namelist', i, tokens))
+        i, tokens = (yield (self.local_assign, i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'stat_local')
+    return (i, tokens)
+
+def stat_name(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['stat_name'])
+    if alternative == 'stat_name_eap':
+        i, tokens = (yield ('stat_name_eap', i, tokens))
+    elif alternative == 'end_explist':
+        i, tokens = (yield ('end_explist', i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'stat_name')
+    return (i, tokens)
+
+def stat_name_eap(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['stat_name_eap'])
+    if alternative == 'exp_back':
+        i, tokens = (yield ('exp_back', i, tokens))
+        i, tokens = (yield ('end_explist', i, tokens))
+    elif alternative == 'args_back':
+        i, tokens = (yield ('args_back', i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'stat_name_eap')
+    return (i, tokens)
+
+def end_explist(self, i, tokens):
+    i, tokens = (yield (self.more_vars, i, tokens))
+    i, tokens = self.matchValueNow(i, tokens, '=')
+    i, tokens = (yield ('explist', i, tokens))
+    return (i, tokens)
+
+def laststat(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['laststat'])
+    if alternative == 'return':
+        i, tokens = self.matchValueNow(i, tokens, 'return')
+        i, tokens = (yield (self.optional_explist, i, tokens))
+    elif alternative == 'break':
+        i, tokens = self.matchValueNow(i, tokens, 'break')
+    else:
+        self.error_expected((i, i), tokens, 'laststat')
+    return (i, tokens)
+
+def functiondef(self, i, tokens):
+    i_b = i
+    i, tokens = self.matchValueNow(i, tokens, 'function')
+    self.log_function_name(i_b, baba.ANON, tokens)
+    i, tokens = (yield ('funcbody', i, tokens))
+    return (i, tokens)
+
+def funcbody(self, i, tokens):
+    i, tokens = self.matchValueNow(i, tokens, '(')
+    i_b = i
+    i, tokens = (yield (self.optional_parlist, i, tokens))
+    self.log_params(i_b, i, tokens)
+    i, tokens = self.matchValueNow(i, tokens, ')')
+    i, tokens = (yield ('block', i, tokens))
+    i, tokens = self.matchValueNow(i, tokens, 'end')
+    return (i, tokens)
+
+def funcname(self, i, tokens):
+    i, tokens = self.matchTypeNow(i, tokens, 'Name')
+    i, tokens = (yield (self.dotted_names, i, tokens))
+    i, tokens = (yield (self.method_name, i, tokens))
+    return (i, tokens)
+
+def parlist(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['parlist'])
+    if alternative == '...':
+        i, tokens = self.matchValueNow(i, tokens, '...')
+    elif alternative == 'Name':
+        i, tokens = (yield ('namelist', i, tokens))
+        i, tokens = (yield (self.varargs, i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'parlist')
+    return (i, tokens)
+
+def namelist(self, i, tokens):
+    i, tokens = self.matchTypeNow(i, tokens, 'Name')
+    i, tokens = (yield (self.more_names, i, tokens))
+    return (i, tokens)
+
+def prefixexp(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['prefixexp'])
+    if alternative == 'Name':
+        i, tokens = self.matchTypeNow(i, tokens, 'Name')
+        i, tokens = (yield (self.exp_args_backs, i, tokens))
+    elif alternative == '(':
+        i, tokens = self.matchValueNow(i, tokens, '(')
+        i, tokens = (yield ('exp', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, ')')
+        i, tokens = (yield (self.exp_args_backs, i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'prefixexp')
+    return (i, tokens)
+
+def var(self, i, tokens):
+    if self.contains(i, tokens, baba.NAME_SET) and self.contains(i + 1, tokens, baba.COMMA_EQUALS_SET):
+        i, tokens = self.matchTypeNow(i, tokens, 'Name')
+    elif self.contains(i, tokens, baba.firstSetLookup['exp_front']):
+        i, tokens = (yield ('exp_front', i, tokens))
+        i, tokens = (yield (self.exp_args_backs_lookback, i, tokens))
+        i, tokens = (yield ('exp_back', i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'var')
+        i += 1
+    return (i, tokens)
+
+def exp_args_back(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['exp_args_back'])
+    if alternative == 'exp_back':
+        i, tokens = (yield ('exp_back', i, tokens))
+    elif alternative == 'args_back':
+        i, tokens = (yield ('args_back', i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'exp_args_back')
+    return (i, tokens)
+
+def exp_front(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['exp_front'])
+    if alternative == 'Name':
+        i, tokens = self.matchTypeNow(i, tokens, 'Name')
+    elif alternative == '(':
+        i, tokens = self.matchValueNow(i, tokens, '(')
+        i, tokens = (yield ('exp', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, ')')
+    else:
+        self.error_expected((i, i), tokens, 'exp_front')
+        i += 1
+    return (i, tokens)
+
+def exp_back(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['exp_back'])
+    if alternative == '[':
+        i, tokens = self.matchValueNow(i, tokens, '[')
+        i, tokens = (yield ('exp', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, ']')
+    elif alternative == '.':
+        i, tokens = self.matchValueNow(i, tokens, '.')
+        i, tokens = self.matchTypeNow(i, tokens, 'Name')
+    else:
+        self.error_expected((i, i), tokens, 'exp_back')
+    return (i, tokens)
+
+def args_back(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['args_back'])
+    if alternative == 'args':
+        i, tokens = (yield ('args', i, tokens))
+    elif alternative == ':':
+        i, tokens = self.matchValueNow(i, tokens, ':')
+        i, tokens = self.matchTypeNow(i, tokens, 'Name')
+        i, tokens = (yield ('args', i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'args_back')
+    return (i, tokens)
+
+def args(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['args'])
+    if alternative == '(':
+        i, tokens = self.matchValueNow(i, tokens, '(')
+        i, tokens = (yield (self.optional_explist, i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, ')')
+    elif alternative == 'tableconstructor':
+        i, tokens = (yield ('tableconstructor', i, tokens))
+    elif alternative == 'String':
+        i, tokens = self.matchTypeNow(i, tokens, 'String')
+    else:
+        self.error_expected((i, i), tokens, 'args')
+    return (i, tokens)
+
+def explist(self, i, tokens):
+    i, tokens = (yield ('exp', i, tokens))
+    i, tokens = (yield (self.more_exps, i, tokens))
+    return (i, tokens)
+
+def exp(self, i, tokens):
+    if self.predict(i, tokens, baba.predictions['exp']) is None:
+        return (yield ('operand', i, tokens))
+    pending = []
+    while True:
+        while self.contains(i, tokens, baba.UNOP_SET):
+            pending.append((baba.token_value(tokens, i), baba.UNARY_PRIORITY, True, i))
+            i, tokens = (yield ('unop', i, tokens))
+        i, tokens = (yield ('operand', i, tokens))
+        if not self.contains(i, tokens, baba.BINOP_SET):
+            break
+        op = baba.token_value(tokens, i)
+        left, right = baba.BINARY_PRIORITY[op]
+        while pending and pending[-1][1] >= left:
+            pending_op, _, unary, op_i = pending.pop()
+            self.reduce_operator(pending_op, unary, op_i)
+        pending.append((op, right, False, i))
+        i, tokens = (yield ('binop', i, tokens))
+    while pending:
+        pending_op, _, unary, op_i = pending.pop()
+        self.reduce_operator(pending_op, unary, op_i)
+    return (i, tokens)
+
+def operand(self, i, tokens):
+    alternative = self.predict(i, tokens, baba.predictions['exp'])
+    if alternative == 'nil':
+        i, tokens = self.matchValueNow(i, tokens, 'nil')
+    elif alternative == 'false':
+        i, tokens = self.matchValueNow(i, tokens, 'false')
+    elif alternative == 'true':
+        i, tokens = self.matchValueNow(i, tokens, 'true')
+    elif alternative == 'Number':
+        i, tokens = self.matchTypeNow(i, tokens, 'Number')
+    elif alternative == 'String':
+        i, tokens = self.matchTypeNow(i, tokens, 'String')
+    elif alternative == '...':
+        i, tokens = self.matchValueNow(i, tokens, '...')
+    elif alternative == 'functiondef':
+        i, tokens = (yield ('functiondef', i, tokens))
+    elif alternative == 'prefixexp':
+        i, tokens = (yield ('prefixexp', i, tokens))
+    elif alternative == 'tableconstructor':
+        i, tokens = (yield ('tableconstructor', i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'exp')
+        if self.recover:
+            i = self.synchronize(i, tokens, None)
+        else:
+            i += 1
+    return (i, tokens)
+
+def tableconstructor(self, i, tokens):
+    i, tokens = self.matchValueNow(i, tokens, '{')
+    i, tokens = (yield (self.optional_fieldlist, i, tokens))
+    i, tokens = self.matchValueNow(i, tokens, '}')
+    return (i, tokens)
+
+def fieldlist(self, i, tokens):
+    i, tokens = (yield ('field', i, tokens))
+    i, tokens = (yield (self.more_fields, i, tokens))
+    i, tokens = (yield (self.optional_fieldsep, i, tokens))
+    return (i, tokens)
+
+def field(self, i, tokens):
+    if self.contains(i, tokens, baba.OPEN_SQUARE_SET):
+        i, tokens = self.matchValueNow(i, tokens, '[')
+        i, tokens = (yield ('exp', i, tokens))
+        i, tokens = self.matchValueNow(i, tokens, ']')
+        i, tokens = self.matchValueNow(i, tokens, '=')
+        i, tokens = (yield ('exp', i, tokens))
+    elif self.contains(i, tokens, baba.NAME_SET) and self.contains(i + 1, tokens, baba.EQUALS_SET):
+        i, tokens = self.matchTypeNow(i, tokens, 'Name')
+        i, tokens = self.matchValueNow(i, tokens, '=')
+        i, tokens = (yield ('exp', i, tokens))
+    elif self.contains(i, tokens, baba.firstSetLookup['exp']):
+        i, tokens = (yield ('exp', i, tokens))
+    else:
+        self.error_expected((i, i), tokens, 'field')
+    return (i, tokens)
+
+RULES = (doIt, chunk, block, stat, stat_for, stat_local, stat_name, stat_name_eap,
+        end_explist, laststat, functiondef, funcbody, funcname, parlist, namelist,
+        prefixexp, var, exp_args_back, exp_front, exp_back, args_back, args, explist, exp,
+        operand, tableconstructor, fieldlist, field)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import collections
+import time
+import tracemalloc
+
+import baba
+
+# stage stats for baba.py
+# what each stage of a parse took (see the stats section of baba.py for
+# the stages), a StageTimer given to baba.parse or baba.run_parser times
+# each stage they run, and parse_with_stats gives them as ParseStats
+
+# one stage, seconds of wall and cpu time, the tokens it went over (None
+# for a stage that does not go over them) and the most memory allocated
+# during it on top of what there was at its start, None if not traced
+StageStats = collections.namedtuple('StageStats', ['stage', 'wall', 'cpu', 'tokens', 'peak_bytes'])
+
+# the stages of a parse of fname, in the order they ran
+class ParseStats(collections.namedtuple('ParseStats', ['fname', 'stages'])):
+    __slots__ = ()
+
+    # the stage name added up over the times it ran (cache runs twice
+    # on a miss), None if it did not run
+    def stage(self, name):
+        ran = [stage for stage in self.stages if stage.stage == name]
+        if not ran:
+            return None
+        peaks = [stage.peak_bytes for stage in ran if stage.peak_bytes is not None]
+        return StageStats(name, sum(stage.wall for stage in ran), sum(stage.cpu for stage in ran),
+                ran[0].tokens, max(peaks) if peaks else None)
+
+    # the stage that took the most wall time, ie. parse for a file that
+    # is parser bound
+    def bound(self):
+        names = baba.unique([stage.stage for stage in self.stages])
+        if not names:
+            return None
+        return max(names, key=lambda name: self.stage(name).wall)
+
+    def to_dict(self):
+        return {"fname": self.fname, "bound": self.bound(),
+                "wall": sum(stage.wall for stage in self.stages),
+                "cpu": sum(stage.cpu for stage in self.stages),
+                "stages": [stage._asdict() for stage in self.stages]}
+
+    # the stages as a table
+    def report(self):
+        lines = ["%-10s %10s %10s %10s %12s" % ("stage", "wall ms", "cpu ms", "tokens", "peak KiB")]
+        for stage in self.stages:
+            lines.append("%-10s %10.2f %10.2f %10s %12s" % (stage.stage, stage.wall * 1000, stage.cpu * 1000,
+                    "" if stage.tokens is None else stage.tokens,
+                    "" if stage.peak_bytes is None else "%.1f" % (stage.peak_bytes / 1024.0)))
+        lines.append("%s is %s bound" % (self.fname, self.bound()))
+        return "\n".join(lines) + "\n"
+
+# times stages, appending a StageStats to stages for each, with memory
+# their allocations are traced too
+class StageTimer:
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = []
+
+    # runs f() as the stage name and returns what it returned, count is
+    # a function of that giving the tokens it went over
+    def run(self, name, f, count=None):
+        started = False
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started = True
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            value = f()
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak_bytes = None
+            if self.memory:
+                peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - base)
+                if started:
+                    tracemalloc.stop()
+        self.stages.append(StageStats(name, wall, cpu, count(value) if count is not None else None, peak_bytes))
+        return value
+
+# parse, also returning the ParseStats of its stages, memory traces
+# their allocations with tracemalloc, which slows them down, the ones
+# that allocate the most (tokenize) the most
+def parse_with_stats(fname, trace_level=baba.TRACE_OFF, trace_sink=None, stream=False, compact=False,
+        cache=None, engine=baba.RECURSIVE, recover=False, max_errors=None, memory=False, lex_jobs=None):
+    timer = StageTimer(memory)
+    result = baba.parse(fname, trace_level, trace_sink, stream, compact, cache, engine, recover, max_errors, timer,
+            lex_jobs)
+    return result, ParseStats(fname, timer.stages)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+import array
+
+import baba
+
+# syntax trees for baba.py
+# the plain Parser only logs functions, TreeParser is a subclass of it
+# made at import time the same way as baba.TracingParser, with the
+# grammar functions in TREE_RULES wrapped to add a node to a SyntaxTree
+# for what they matched, so none of it costs anything when no tree is
+# wanted
+# the tree is an arena, the nodes are numbered and kept in arrays rather
+# than as objects, each node is its kind, the span of tokens it covers
+# and its first child and next sibling, 17 bytes, there are about 1.2
+# nodes a token so about 20 bytes a token, ie. 20MB for a 100k line file
+# of 10 tokens a line (see SyntaxTree.nbytes), on top of its tokens
+
+# the grammar functions that are nodes, the others (stat_name, exp_front
+# etc.) only split up the grammar, what is in them goes to the node of
+# the nearest of these around them
+TREE_RULES = ("chunk", "block", "stat", "laststat", "functiondef", "funcbody",
+        "funcname", "parlist", "namelist", "prefixexp", "var", "exp_back",
+        "args_back", "args", "explist", "exp", "tableconstructor", "field")
+
+# kinds of node that are not grammar functions
+# - literal, nil, false, true, a Number, a String or ...
+# - binop, a binary operator and its two operands, the operator is the
+#   token after the first operand
+# - unop, a unary operator (its first token) and its operand
+LITERAL = "literal"
+BINOP = "binop"
+UNOP = "unop"
+
+# the kind of a node is its index in here
+NODE_KINDS = TREE_RULES + (LITERAL, BINOP, UNOP)
+NODE_KIND_CODES = dict((kind, code) for (code, kind) in enumerate(NODE_KINDS))
+
+# no node, for a first child or next sibling that is not there
+NO_NODE = -1
+
+class SyntaxTree:
+    def __init__(self, tokens=None):
+        self.tokens = tokens
+        self.kinds = array.array('B')
+        self.starts = array.array('i')
+        self.ends = array.array('i')
+        # the tokens from start up to but not including end
+        self.first_children = array.array('i')
+        self.next_siblings = array.array('i')
+        self.root = NO_NODE
+        # the chunk, NO_NODE if the parse did not get to the end
+
+    def __len__(self):
+        return len(self.kinds)
+
+    # adds a node over the children, which must all be in the tree
+    # already and have no parent, returns its number
+    def add(self, kind_code, start, end, children):
+        node = len(self.kinds)
+        self.kinds.append(kind_code)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.first_children.append(children[0] if children else NO_NODE)
+        self.next_siblings.append(NO_NODE)
+        for k in range(1, len(children)):
+            self.next_siblings[children[k - 1]] = children[k]
+        return node
+
+    # drops node and every node after it, node must be the last child of
+    # the nodes being made, its first descendant is the first to go
+    def truncate(self, node):
+        while self.first_children[node] != NO_NODE:
+            node = self.first_children[node]
+        for a in (self.kinds, self.starts, self.ends, self.first_children, self.next_siblings):
+            del a[node:]
+
+    def kind(self, node):
+        return NODE_KINDS[self.kinds[node]]
+
+    def span(self, node):
+        return self.starts[node], self.ends[node]
+
+    def children(self, node):
+        child = self.first_children[node]
+        while child != NO_NODE:
+            yield child
+            child = self.next_siblings[child]
+
+    # the text of the tokens of the node run together, as log_params does
+    def text(self, node):
+        return baba.tokens_text(self.tokens, self.starts[node], self.ends[node])
+
+    # yields (node, depth) for node and everything under it, parents first
+    def walk(self, node=None):
+        if node is None:
+            node = self.root
+        if node == NO_NODE:
+            return
+        stack = [(node, 0)]
+        while stack:
+            (node, depth) = stack.pop()
+            yield node, depth
+            stack.extend(reversed([(child, depth + 1) for child in self.children(node)]))
+
+    # bytes held by the arrays of the tree, not counting the tokens
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in
+                (self.kinds, self.starts, self.ends, self.first_children, self.next_siblings))
+
+    # the tree a node a line, indented by depth, with the text of each
+    # node cut to width
+    def dump(self, width=40):
+        lines = []
+        for (node, depth) in self.walk():
+            text = self.text(node)
+            if len(text) > width:
+                text = text[:width - 3] + "..."
+            lines.append("%s%s %d-%d %s" % ("  " * depth, self.kind(node), self.starts[node], self.ends[node], text))
+        return "\n".join(lines)
+
+class TreeParser(baba.Parser):
+    def __init__(self):
+        baba.Parser.__init__(self)
+        self.tree = SyntaxTree()
+        self.tree_children = [[]]
+        # for each node being made, a list of its children so far
+
+    def parse_tokens(self, tokens, line_index=None):
+        self.tree.tokens = tokens
+        result = baba.Parser.parse_tokens(self, tokens, line_index)
+        if len(self.tree_children) == 1 and self.tree_children[0]:
+            self.tree.root = self.tree_children[0][-1]
+        return result
+
+    # literals are matched by operand without a grammar function of
+    # their own, so get their node here
+    def operand(self, i, tokens):
+        start = i
+        i, tokens = baba.Parser.operand(self, i, tokens)
+        if self.predict(start, tokens, baba.predictions["exp"]) in baba.OPERAND_TERMINALS:
+            self.tree_children[-1].append(self.tree.add(NODE_KIND_CODES[LITERAL], start, i, []))
+        return i, tokens
+
+    # the nodes made in the repetition given back are the last children
+    # of the node being made that start from i on, they and everything
+    # under them are the last nodes in the tree, so are dropped from it
+    def backtrack(self, i):
+        baba.Parser.backtrack(self, i)
+        children = self.tree_children[-1]
+        tree = self.tree
+        n = len(children)
+        while n > 0 and tree.starts[children[n - 1]] >= i:
+            n -= 1
+        if n < len(children):
+            tree.truncate(children[n])
+            del children[n:]
+
+    # the operands are the last nodes made in the exp, the operator node
+    # takes their place, after an error there may be fewer of them
+    def reduce_operator(self, op, unary, op_i):
+        children = self.tree_children[-1]
+        n = 1 if unary else 2
+        operands = children[max(0, len(children) - n):]
+        del children[len(children) - len(operands):]
+        tree = self.tree
+        if unary:
+            kind = NODE_KIND_CODES[UNOP]
+            start = op_i
+        else:
+            kind = NODE_KIND_CODES[BINOP]
+            start = tree.starts[operands[0]] if operands else op_i
+        end = tree.ends[operands[-1]] if operands else op_i + 1
+        children.append(tree.add(kind, start, end, operands))
+
+# wraps a grammar function so it adds a node of the kind for what it matched
+def tree_rule(kind_code, rule):
+    def f(self, i, tokens):
+        children = []
+        self.tree_children.append(children)
+        start = i
+        i, tokens = rule(self, i, tokens)
+        self.tree_children.pop()
+        self.tree_children[-1].append(self.tree.add(kind_code, start, i, children))
+        return i, tokens
+    f.__name__ = rule.__name__
+    return f
+
+for _name in TREE_RULES:
+    setattr(TreeParser, _name, tree_rule(NODE_KIND_CODES[_name], getattr(baba.Parser, _name)))
+
+# parses program with a TreeParser, returns the ParseResult and SyntaxTree
+def parse_tree(program):
+    parser = TreeParser()
+    result = parser.parse_tokens(list(baba.token_stream(program)), baba.LineIndex(program))
+    return result, parser.tree
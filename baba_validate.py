@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import collections
+import multiprocessing
+import os
+import sys
+
+import baba
+
+# syntax validation for baba.py
+# a pass/fail check of the syntax only, ValidatingParser logs no
+# functions, traces nothing, makes no messages and stops at the first
+# error, so is quicker than baba.parse which finds everything
+
+# what validate found, error is the first ParseError and line/column
+# where it is, all None if the program is valid (line/column also if
+# the error has no token)
+Validation = collections.namedtuple('Validation', ['valid', 'line', 'column', 'error'])
+
+class ValidatingParser(baba.Parser):
+    def log_function_name(self, start_i, end_i, tokens):
+        pass
+
+    def log_params(self, start_i, end_i, tokens):
+        pass
+
+    # logs the error then stops the parse, see parse_tokens
+    def error(self, kind, i_tup, tokens, expected=None, rule=None):
+        if self.errors_switch == 0:
+            baba.Parser.error(self, kind, i_tup, tokens, expected, rule)
+            raise baba.TooManyErrors()
+
+    # the same tokens as Parser.exp but with no operators reduced there
+    # are no priorities to keep, any error ends the parse so there is no
+    # need to tell the first operand from the others, and the operand
+    # predicted is gone straight into rather than through operand
+    def exp(self, i, tokens):
+        while True:
+            while self.contains(i, tokens, baba.UNOP_SET):
+                i += 1
+            alternative = self.predict(i, tokens, baba.predictions["exp"])
+            if alternative in baba.OPERAND_TERMINALS:
+                i += 1
+            elif alternative is None:
+                # logs the error
+                i, tokens = self.operand(i, tokens)
+            else:
+                # functiondef, prefixexp or tableconstructor
+                i, tokens = getattr(self, alternative)(i, tokens)
+            if not self.contains(i, tokens, baba.BINOP_SET):
+                return i, tokens
+            i += 1
+
+# checks the syntax of program, a Validation
+# a program the tokenizer cannot read raises as it does for baba.parse
+# one nested deeper than Python's stack lets ValidatingParser go is
+# checked again on the stack engine, which stops at its first error
+# with max_errors of 1
+def validate(program):
+    tokens = list(baba.token_stream(program))
+    line_index = baba.LineIndex(program)
+    try:
+        result = ValidatingParser().parse_tokens(tokens, line_index)
+    except RecursionError:
+        result = baba.make_parser(engine=baba.STACK, max_errors=1).parse_tokens(tokens, line_index)
+    if not result.error_list:
+        return Validation(True, None, None, None)
+    err = result.error_list[0]
+    if err.token is None:
+        return Validation(False, None, None, err)
+    return Validation(False, err.line, err.column, err)
+
+# validates the file, a baba.BatchResult with the Validation as its
+# result, an exception (ie. from the tokenizer) is caught and is its
+# failure
+def validate_file(fname):
+    try:
+        validation = validate(baba.read_program(fname))
+    except Exception as e:
+        return baba.BatchResult(fname, None, "%s: %s" % (type(e).__name__, e))
+    return baba.BatchResult(fname, validation, None)
+
+# yields a baba.BatchResult from validate_file for each of fnames, in
+# order, over jobs processes as for baba.parse_files
+def validate_files(fnames, jobs=None):
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(fnames))
+    if jobs <= 1:
+        for fname in fnames:
+            yield validate_file(fname)
+        return
+    chunksize = max(1, len(fnames) // (jobs * 16))
+    with multiprocessing.Pool(jobs) as pool:
+        for batch_result in pool.imap(validate_file, fnames, chunksize):
+            yield batch_result
+
+# validates every file in paths (see baba.expand_paths), writing a line
+# to out for each that is not valid, file:line:column: message, nothing
+# for the ones that are, returns the number not valid
+def validate_paths(paths, jobs=None, out=None):
+    out = out or sys.stdout
+    bad = 0
+    for batch_result in validate_files(baba.expand_paths(paths), jobs):
+        validation = batch_result.result
+        if batch_result.failure is not None:
+            out.write("%s: %s\n" % (batch_result.fname, batch_result.failure))
+        elif not validation.valid:
+            (line, column) = validation.error.position()
+            out.write("%s:%s:%s: %s\n" % (batch_result.fname, line, column, validation.error.message()))
+        else:
+            continue
+        bad += 1
+    return bad
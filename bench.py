@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+import baba
+import baba_grammar
+
+# benchmarks for baba.py
+# - lexer, the Lexer against the original tokenize_regex
+# - corpus, Lua programs made from baba's own grammar to run the suite on
+# - suite, tokenize, doIt and the report functions timed apart, with
+#   their peak memory, how they scale with the size of a program and a
+#   check of their throughput against a baseline saved before
+
+# used when no files are given, a bit of everything the lexer knows about
+SAMPLE_PROGRAM = '''-- a comment
+local x, y = 1, 2
+function foo.bar:baz(a, b, ...)
+    local t = { 1, 2; x = 3, [4] = "s", 'q', {}, }
+    if a then return a elseif b then return b else return nil end
+end
+local function helper(n)
+    while n > 0 do n = n - 1 end
+    for k, v in pairs(t) do print(k, v) end
+    return n .. "x" .. 'y' .. [[long
+string]] .. [==[another ]] one]==]
+end
+y = -3 + 0x1F * 1.5e3 / .5 - 3.
+z = 1 == 2 ~= 3 < 4 <= 5 > 6 >= 7
+'''
+
+# best time of repeat runs of f(program), with what the last run returned
+def best_time(f, program, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f(program)
+        took = time.perf_counter() - start
+        if best is None or took < best:
+            best = took
+    return best, result
+
+# times both tokenizers over the program, checks they agree and prints
+# tokens/sec for each, returns the speedup of the Lexer
+def bench_lexer(name, program, repeat):
+    old_time, old_tokens = best_time(lambda p: list(baba.tokenize_regex(p)), program, repeat)
+    new_time, new_tokens = best_time(lambda p: list(baba.tokenize(p)), program, repeat)
+    if old_tokens != new_tokens:
+        raise AssertionError("%s: Lexer tokens differ from tokenize_regex" % name)
+    n = len(new_tokens)
+    print("%s: %d tokens" % (name, n))
+    print("  tokenize_regex %10.0f tokens/sec" % (n / old_time))
+    print("  Lexer          %10.0f tokens/sec (%.2fx)" % (n / new_time, old_time / new_time))
+    return old_time / new_time
+
+
+
+# corpus
+# programs made by a seeded random walk over the productions of
+# baba.grammar, with stat replaced by GENERATOR_OVERRIDES, so the same
+# knobs always give the same programs
+# - tokens, how many tokens a program has, give or take a statement
+# - depth, how deep blocks and bracketed expressions (in ( ), [ ], a
+#   table or the arguments of a call) nest
+# - chain, binary operators in an expression, a + b * c is 2
+# - table_size, fields in a table constructor
+# - long_strings, the fraction of strings that are [[ ]] strings, each
+#   of long_string_lines lines
+# - seed, for the random walk
+
+CorpusKnobs = collections.namedtuple('CorpusKnobs',
+        ['tokens', 'depth', 'chain', 'table_size', 'long_strings', 'long_string_lines', 'seed'])
+
+# a statement can hold about (chain * table_size) ** depth tokens, so
+# the last three want keeping small together
+DEFAULT_KNOBS = CorpusKnobs(20000, 4, 2, 4, 0.05, 8, 1)
+
+# the chance of going round a { } once more, or of taking a [ ], for
+# the ones there is no knob for
+REPEAT_CHANCE = 0.35
+
+# the chance of an exp being something other than a name or a literal,
+# as most operands are
+NESTED_CHANCE = 0.25
+
+NAMES = ("x", "y", "i", "n", "self", "count", "value", "node", "result", "buffer", "key", "callback")
+NUMBERS = ("0", "1", "2", "42", "3.14", "0x1F", "1e3", ".5")
+WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit")
+
+# stat as in baba.grammar takes any { exp_args_back } before its
+# stat_name, which the parser gives back one of and so matches, but a
+# walk over it can make an assignment to a call (x "s" = 1), this is the
+# same statements with the last of a Name's suffixes picking what it is,
+# as LL_OVERRIDES in baba_grammar.py does, so they all parse
+# a statement starting with ( is left out, after one that ends in an exp
+# it is parsed as a call of that exp (x = y (z).w = 1)
+GENERATOR_OVERRIDES = '''
+stat ::=
+     Name end_explist |
+     Name { exp_args_back } exp_back end_explist |
+     Name { exp_args_back } args_back |
+     do block end |
+     while exp do block end |
+     repeat block until exp |
+     if exp then block { elseif exp then block } [ else block ] end |
+     for stat_for |
+     function funcname funcbody |
+     local stat_local
+'''
+
+# an exp whose parent is one of these is an operand in the expression
+# it is in, any other exp starts an expression of its own
+OPERAND_PARENTS = ("exp", "exp_p.1")
+
+# the fewest tokens each rule of productions can make, by name
+def min_sizes(productions):
+    sizes = dict((name, math.inf) for name in productions)
+    def size(symbol):
+        if symbol.__class__ is tuple:
+            return 0 if baba_grammar.is_action(symbol) else 1
+        return sizes[symbol]
+    changed = True
+    while changed:
+        changed = False
+        for name, alternatives in productions.items():
+            smallest = min(sum(size(symbol) for symbol in alternative) for alternative in alternatives)
+            if smallest < sizes[name]:
+                sizes[name] = smallest
+                changed = True
+    return sizes
+
+class CorpusGenerator:
+    def __init__(self, knobs=DEFAULT_KNOBS):
+        self.knobs = knobs
+        self.random = random.Random(knobs.seed)
+        rules = baba_grammar.read_grammar(baba.grammar)
+        rules.update(baba_grammar.read_grammar(GENERATOR_OVERRIDES, rules))
+        self.productions = baba_grammar.Grammar(rules).productions
+        self.sizes = min_sizes(self.productions)
+        self.out = []
+        self.count = 0
+        # tokens made so far
+        self.nesting = 0
+        # blocks and expressions the walk is in
+        self.chain_left = 0
+        # binary operators still to go in the expression the walk is in
+        self.fields_left = 0
+        # fields still to go in the table the walk is in
+
+    # the next program of the corpus
+    def program(self):
+        self.out = []
+        self.count = 0
+        while self.count < self.knobs.tokens:
+            self.expand("stat", None)
+        self.out.append("\n")
+        return "".join(self.out)
+
+    # writes out what symbol makes, parent is the rule it is in
+    def expand(self, symbol, parent):
+        if symbol.__class__ is tuple:
+            if not baba_grammar.is_action(symbol):
+                self.emit(symbol)
+            return
+        saved = (self.nesting, self.chain_left, self.fields_left)
+        if symbol == "stat":
+            self.out.append("\n" + "    " * self.nesting)
+        if symbol == "block":
+            self.nesting += 1
+        elif symbol == "exp" and parent not in OPERAND_PARENTS:
+            self.nesting += 1
+            self.chain_left = self.knobs.chain
+        elif symbol == "tableconstructor":
+            self.fields_left = self.knobs.table_size
+        for item in self.choose(symbol):
+            self.expand(item, symbol)
+        # an operand leaves the operators it used taken from its expression
+        if symbol == "exp" and parent in OPERAND_PARENTS:
+            saved = (saved[0], self.chain_left, saved[2])
+        (self.nesting, self.chain_left, self.fields_left) = saved
+
+    # the alternative of symbol to take
+    def choose(self, symbol):
+        alternatives = self.productions[symbol]
+        if symbol == "block" and self.nesting > self.knobs.depth:
+            return ()
+        if symbol == "exp_p.1":
+            if self.chain_left > 0:
+                self.chain_left -= 1
+                return alternatives[0]
+            return ()
+        if symbol in ("tableconstructor.1", "fieldlist.1"):
+            if self.fields_left > 0:
+                self.fields_left -= 1
+                return alternatives[0]
+            return ()
+        if self.nesting > self.knobs.depth or (symbol == "exp" and self.random.random() >= NESTED_CHANCE):
+            # only the smallest alternatives, so the walk comes back out
+            smallest = min(self.alternative_size(alternative) for alternative in alternatives)
+            alternatives = [alternative for alternative in alternatives
+                    if self.alternative_size(alternative) == smallest]
+        elif () in alternatives:
+            # a { } or [ ]
+            return alternatives[0] if self.random.random() < REPEAT_CHANCE else ()
+        return self.random.choice(alternatives)
+
+    def alternative_size(self, alternative):
+        return sum(self.sizes[symbol] if symbol.__class__ is str else int(not baba_grammar.is_action(symbol))
+                for symbol in alternative)
+
+    # writes out a terminal, (match type, text)
+    def emit(self, terminal):
+        (match_type, text) = terminal
+        if match_type == baba.MATCH_TYPE:
+            if text == "Name":
+                text = self.random.choice(NAMES)
+            elif text == "Number":
+                text = self.random.choice(NUMBERS)
+            elif self.random.random() < self.knobs.long_strings:
+                lines = [" ".join(self.random.sample(WORDS, 4)) for _ in range(self.knobs.long_string_lines)]
+                text = "[[" + "\n".join(lines) + "]]"
+            else:
+                text = '"' + self.random.choice(WORDS) + '"'
+        self.out.append(text)
+        self.out.append(" ")
+        self.count += 1
+
+# files programs made with knobs
+def synthetic_corpus(knobs, files):
+    generator = CorpusGenerator(knobs)
+    return [("synthetic %d" % k, generator.program()) for k in range(files)]
+
+
+
+# suite
+# each stage is timed by itself over the same programs, with what the
+# stages before it made already there, so the times add up to a whole
+# run, throughput is tokens of the program per second for all of them
+
+# the inputs the stages need, made once per program
+Prepared = collections.namedtuple('Prepared', ['program', 'tokens', 'result'])
+
+def prepare(program):
+    tokens = baba.tokens_of(program)
+    return Prepared(program, tokens, baba.Parser().parse_tokens(tokens, baba.LineIndex(program)))
+
+def stage_tokenize(prepared):
+    return list(baba.tokenize(prepared.program))
+
+# the parse looks up the lines of the functions and errors it logs, so
+# the LineIndex is made and looked up in here
+def stage_doit(prepared):
+    return baba.Parser().parse_tokens(prepared.tokens, baba.LineIndex(prepared.program))
+
+def stage_report(prepared):
+    return prepared.result.functions_string() + prepared.result.error_list_string()
+
+STAGES = (("tokenize", stage_tokenize), ("doIt", stage_doit), ("report", stage_report))
+
+# prints the first error of each of the prepared programs that has one,
+# by name, returns how many had one, the parse goes on past an error,
+# skipping tokens and logging every error after it, so the throughput
+# of such a program is not that of the grammar it is meant to measure
+def print_errors(names, prepared_list):
+    bad = 0
+    for (name, prepared) in zip(names, prepared_list):
+        if prepared.result.error_list:
+            err = prepared.result.error_list[0]
+            (line, column) = err.position()
+            print("ERROR %s:%s:%s: %s" % (name, line, column, err.message()))
+            bad += 1
+    return bad
+
+# what the suite measured for one stage, over all of the programs
+StageResult = collections.namedtuple('StageResult', ['name', 'tokens_per_sec', 'peak_bytes'])
+
+# runs each stage over the prepared programs, the time of a program is
+# the best of repeat runs, peak_bytes is the most any one run allocated
+# on top of its inputs, from a run of its own as tracing slows it down
+def run_stages(prepared_list, repeat):
+    n = sum(len(prepared.tokens) for prepared in prepared_list)
+    results = []
+    for (name, stage) in STAGES:
+        total = 0.0
+        for prepared in prepared_list:
+            total += best_time(stage, prepared, repeat)[0]
+        peak = 0
+        for prepared in prepared_list:
+            tracemalloc.start()
+            try:
+                stage(prepared)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        results.append(StageResult(name, n / total, peak))
+    return results
+
+def print_stages(results, n):
+    for result in results:
+        print("  %-8s %12.0f tokens/sec %10.1f KiB peak %6.1f bytes/token" % (
+                result.name, result.tokens_per_sec, result.peak_bytes / 1024.0, result.peak_bytes / float(n)))
+
+# times the stages on one program of each size made with knobs, and
+# prints their throughput at each and how their time grows with size,
+# as the exponent k of time ~ tokens^k between one size and the next,
+# returns the number of programs with errors, which are not timed
+def bench_scaling(knobs, sizes, repeat):
+    print("scaling")
+    previous = None
+    bad = 0
+    for size in sizes:
+        prepared = prepare(CorpusGenerator(knobs._replace(tokens=size)).program())
+        if print_errors(["scaling %d" % size], [prepared]):
+            bad += 1
+            continue
+        n = len(prepared.tokens)
+        times = []
+        for (name, stage) in STAGES:
+            times.append(best_time(stage, prepared, repeat)[0])
+        line = "  %8d tokens" % n
+        for (k, (name, stage)) in enumerate(STAGES):
+            line += "  %s %10.0f/sec" % (name, n / times[k])
+            if previous is not None and n != previous[0]:
+                (previous_n, previous_times) = previous
+                line += " (^%.2f)" % (math.log(times[k] / previous_times[k]) / math.log(n / float(previous_n)))
+        print(line)
+        previous = (n, times)
+    return bad
+
+
+
+# baseline
+# the tokens/sec of each stage saved as JSON, along with what they were
+# measured on, a later run on the same corpus fails if a stage is more
+# than threshold (a fraction) slower than it was, the numbers only mean
+# anything on the machine that saved them
+
+def baseline_json(corpus, results):
+    return json.dumps({"corpus": corpus,
+            "tokens_per_sec": dict((result.name, result.tokens_per_sec) for result in results)},
+            indent=1, sort_keys=True)
+
+# the regressions of results against the baseline in text, as strings
+def regressions(text, corpus, results, threshold):
+    baseline = json.loads(text)
+    if baseline["corpus"] != corpus:
+        raise ValueError("baseline was measured on another corpus: %r" % (baseline["corpus"],))
+    found = []
+    for result in results:
+        before = baseline["tokens_per_sec"].get(result.name)
+        if before is not None and result.tokens_per_sec < before * (1.0 - threshold):
+            found.append("%s: %.0f tokens/sec, baseline %.0f (%.1f%% slower)" % (
+                    result.name, result.tokens_per_sec, before, 100.0 * (1.0 - result.tokens_per_sec / before)))
+    return found
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Benchmark the Lua lexer and parser")
+    argparser.add_argument("fnames", nargs="*", help="Lua files to run on, a synthetic corpus if none")
+    argparser.add_argument("--repeat", type=int, default=5, help="runs to take the best of")
+    argparser.add_argument("--lexer", action="store_true",
+            help="compare the Lexer with tokenize_regex, on the files or a built in sample")
+    argparser.add_argument("--copies", type=int, default=2000, help="copies of the built in sample to lex")
+    corpus_args = argparser.add_argument_group("synthetic corpus")
+    corpus_args.add_argument("--files", type=int, default=4, help="programs in the corpus")
+    corpus_args.add_argument("--tokens", type=int, default=DEFAULT_KNOBS.tokens, help="tokens in each program")
+    corpus_args.add_argument("--depth", type=int, default=DEFAULT_KNOBS.depth,
+            help="how deep blocks and bracketed expressions nest")
+    corpus_args.add_argument("--chain", type=int, default=DEFAULT_KNOBS.chain,
+            help="binary operators in each expression")
+    corpus_args.add_argument("--table-size", type=int, default=DEFAULT_KNOBS.table_size,
+            help="fields in each table constructor")
+    corpus_args.add_argument("--long-strings", type=float, default=DEFAULT_KNOBS.long_strings,
+            help="fraction of strings that are long strings")
+    corpus_args.add_argument("--long-string-lines", type=int, default=DEFAULT_KNOBS.long_string_lines,
+            help="lines in each long string")
+    corpus_args.add_argument("--seed", type=int, default=DEFAULT_KNOBS.seed)
+    corpus_args.add_argument("--scaling", default="5000,10000,20000,40000",
+            help="comma separated program sizes in tokens to time, none if empty")
+    corpus_args.add_argument("--save-corpus", metavar="DIR", default=None,
+            help="write the programs of the corpus to DIR, to look at or run other tools on")
+    baseline_args = argparser.add_argument_group("baseline")
+    baseline_args.add_argument("--baseline", metavar="JSON", default=None,
+            help="fail if a stage is slower than it was in this file")
+    baseline_args.add_argument("--save-baseline", metavar="JSON", default=None,
+            help="save the throughput of each stage to this file")
+    baseline_args.add_argument("--threshold", type=float, default=0.15,
+            help="fraction slower than the baseline that fails, 0.15 by default")
+    args = argparser.parse_args()
+
+    if args.lexer:
+        if args.fnames:
+            for fname in args.fnames:
+                bench_lexer(fname, baba.read_program(fname), args.repeat)
+        else:
+            bench_lexer("sample x %d" % args.copies, SAMPLE_PROGRAM * args.copies, args.repeat)
+        sys.exit(0)
+
+    knobs = CorpusKnobs(args.tokens, args.depth, args.chain, args.table_size,
+            args.long_strings, args.long_string_lines, args.seed)
+    if args.fnames:
+        programs = [(fname, baba.read_program(fname)) for fname in baba.expand_paths(args.fnames)]
+        corpus = {"files": [fname for (fname, program) in programs]}
+    else:
+        programs = synthetic_corpus(knobs, args.files)
+        corpus = dict(knobs._asdict(), files=args.files)
+    if args.save_corpus is not None:
+        for k, (name, program) in enumerate(programs):
+            with open("%s/%d.lua" % (args.save_corpus, k), "w") as out:
+                out.write(program)
+
+    prepared_list = [prepare(program) for (name, program) in programs]
+    n = sum(len(prepared.tokens) for prepared in prepared_list)
+    print("%d programs, %d tokens, %d lines" % (len(programs), n,
+            sum(program.count("\n") for (name, program) in programs)))
+    if print_errors([name for (name, program) in programs], prepared_list):
+        sys.exit(1)
+    results = run_stages(prepared_list, args.repeat)
+    print_stages(results, n)
+
+    if args.scaling and not args.fnames:
+        if bench_scaling(knobs, [int(size) for size in args.scaling.split(",")], args.repeat):
+            sys.exit(1)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as out:
+            out.write(baseline_json(corpus, results) + "\n")
+    if args.baseline is not None:
+        with open(args.baseline, "r") as ins:
+            found = regressions(ins.read(), corpus, results, args.threshold)
+        for regression in found:
+            print("REGRESSION " + regression)
+        if found:
+            sys.exit(1)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+
+import json
+import random
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import baba
+import baba_cache
+import baba_document
+import baba_profile
+import baba_grammar
+import baba_stack
+import baba_validate
+import bench
+
+# run with python3 -m unittest, or python3 -m pytest
+
+
+
+# parallel lexing
+
+# text put into a program to make its chunks split at bad places, in a
+# long string or comment, or in a string the lexer cannot end
+LEX_SNIPPETS = ["[[\n", "]]\n", "--", "--[[ x\n", "[==[\n\n]==]", "\n\n", "-- c\n\tx = 1\n", "'a'\n"]
+
+# the tokens of code, or the error the lexer raised
+def lexed(lex):
+    try:
+        return [tuple(t) for t in lex()]
+    except RuntimeError as e:
+        return str(e)
+
+class ParallelLexTest(unittest.TestCase):
+    # the chunks lexed here rather than in a pool, put together as
+    # tokenize_parallel does
+    def test_chunks_give_tokenize_tokens(self):
+        rng = random.Random(2)
+        for program in generated_programs(4):
+            variants = [program]
+            for _ in range(8):
+                text = program
+                for _ in range(4):
+                    at = rng.randint(0, len(text))
+                    text = text[:at] + rng.choice(LEX_SNIPPETS) + text[at:]
+                variants.append(text)
+            for text in variants:
+                expected = lexed(lambda: baba.tokenize(text))
+                for size in (7, 50, 300):
+                    bounds = baba.chunk_bounds(text, size)
+                    chunks = [baba.lex_chunk(text[start:end]) for (start, end) in bounds]
+                    self.assertEqual(lexed(lambda: baba.join_chunks(text, bounds, chunks)), expected)
+
+    # through a pool, which is only made for more than one cpu and a big
+    # enough program
+    def test_pool(self):
+        program = "".join(generated_programs(2))
+        with mock.patch.object(baba.os, "cpu_count", return_value=2), \
+                mock.patch.object(baba, "PARALLEL_LEX_MIN", 0):
+            tokens = lexed(lambda: baba.tokenize_parallel(program, 2, chunk_size=500))
+            result = baba.run_parser(program, lex_jobs=2)
+        self.assertEqual(tokens, lexed(lambda: baba.tokenize(program)))
+        self.assertEqual(result.function_name_list, baba.run_parser(program).function_name_list)
+
+# cache
+
+CACHED_PROGRAM = "function f(a, b) return a end\nx = = 1\n"
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = baba_cache.ParseCache(os.path.join(self.directory, "cache.sqlite"))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    # a result read from the cache has no tokens, one just parsed has
+    def test_hit_after_miss(self):
+        parsed = baba.run_parser(CACHED_PROGRAM, cache=self.cache)
+        self.assertIsNotNone(parsed.tokens)
+        cached = baba.run_parser(CACHED_PROGRAM, cache=self.cache)
+        self.assertIsNone(cached.tokens)
+        self.assertEqual(cached.function_name_list, parsed.function_name_list)
+        self.assertEqual(cached.function_params_list, parsed.function_params_list)
+        self.assertEqual(cached.error_list, parsed.error_list)
+        self.assertEqual(self.cache.stats()[0], 1)
+
+    # a changed program, or the same one parsed another way, is a miss
+    def test_miss(self):
+        baba.run_parser(CACHED_PROGRAM, cache=self.cache)
+        self.assertIsNotNone(baba.run_parser(CACHED_PROGRAM + "y = 2\n", cache=self.cache).tokens)
+        self.assertIsNotNone(baba.run_parser(CACHED_PROGRAM, cache=self.cache, recover=True).tokens)
+        self.assertIsNotNone(baba.run_parser(CACHED_PROGRAM, cache=self.cache, engine=baba.TABLE).tokens)
+        self.assertEqual(self.cache.stats()[0], 4)
+
+    # past max_bytes the least recently used results are dropped
+    def test_evicts_least_recently_used(self):
+        self.cache.max_bytes = 1000
+        self.cache.put("a", "x" * 400)
+        self.cache.put("b", "x" * 400)
+        self.assertIsNotNone(self.cache.get("a"))
+        self.cache.put("c", "x" * 400)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("c"))
+        self.assertEqual(self.cache.stats(), (2, 800))
+
+# streaming
+
+# a call whose argument is a function with more tokens in it than a
+# TokenWindow keeps, the Star over the call's suffixes gives the call
+# back once it has parsed it, so the window has to keep all of it
+LONG_ARGUMENT_PROGRAM = "f(function()\n" + "x = k\n" * 3000 + "end)\n"
+
+class TokenWindowTest(unittest.TestCase):
+    def test_long_argument_given_back(self):
+        for engine in baba.ENGINES:
+            expected = baba.run_parser(LONG_ARGUMENT_PROGRAM, engine=engine)
+            result = baba.run_parser(LONG_ARGUMENT_PROGRAM, stream=True, engine=engine)
+            self.assertEqual(result.error_list, [], engine)
+            self.assertEqual(result.function_name_list, expected.function_name_list, engine)
+
+    def test_parse_stream_long_argument(self):
+        expected = baba.parse_program(LONG_ARGUMENT_PROGRAM)
+        result = baba.parse_stream(LONG_ARGUMENT_PROGRAM)
+        self.assertEqual(result.error_list, [])
+        self.assertEqual(result.function_name_list, expected.function_name_list)
+
+    # with nothing to give back the window stays history tokens or so
+    def test_window_drops_old_tokens(self):
+        window = baba.TokenWindow(baba.token_stream(LONG_ARGUMENT_PROGRAM), history=64)
+        for i in range(1000):
+            window[i]
+        self.assertLessEqual(len(window.buffer), 2 * 64 + window.PREFETCH + 1)
+
+    def test_window_keeps_pinned_tokens(self):
+        window = baba.TokenWindow(baba.token_stream(LONG_ARGUMENT_PROGRAM), history=64)
+        window.pins.append(10)
+        for i in range(1000):
+            window[i]
+        self.assertEqual(window[10], baba.tokens_of(LONG_ARGUMENT_PROGRAM)[10])
+        window.pins.pop()
+        for i in range(1000, 2000):
+            window[i]
+        self.assertRaises(IndexError, lambda: window[10])
+
+
+
+# error recovery
+
+MANY_ERRORS_PROGRAM = "x = 1\n" + "y = = 2\n" * 5000
+
+class RecoveryTest(unittest.TestCase):
+    # each bad statement is an error of its own, the parse picks up again
+    # at the name that starts the next one
+    def test_error_per_statement(self):
+        for engine in baba.ENGINES:
+            result = baba.run_parser(MANY_ERRORS_PROGRAM, recover=True, engine=engine)
+            self.assertEqual(len(result.error_list), 5000, engine)
+            self.assertEqual([e.line for e in result.error_list[:3]], [2, 3, 4], engine)
+
+    def test_function_after_error(self):
+        result = baba.run_parser("y = = 2\nfunction f(a) end\n", recover=True)
+        self.assertEqual(len(result.error_list), 1)
+        self.assertEqual(result.function_params_list, ["a"])
+
+    def test_max_errors(self):
+        for engine in baba.ENGINES:
+            result = baba.run_parser(MANY_ERRORS_PROGRAM, recover=True, max_errors=10, engine=engine)
+            self.assertEqual(len(result.error_list), 11, engine)
+            self.assertEqual(result.error_list[-1].kind, baba.ERROR_LIMIT, engine)
+
+# incremental parsing
+
+DOCUMENT_PROGRAM = """local t = {1, 2}
+function f(a, b)
+  return a + b
+end
+-- a comment
+x = f(1, 2)
+"""
+
+# text put in by the random edits, bits that open and close long strings
+# and comments and ones that break the syntax
+EDIT_SNIPPETS = ["\n", " ", "end", "function g(c) ", "local y = 1\n", "[[", "]]", "--[[", "--", "\"",
+        "(", ")", "if x then\n", "a.b:c()", "return", ";", "x", "--[==[ c\n\n]==]"]
+
+class DocumentTest(unittest.TestCase):
+    # after an edit the document has what parsing all of its text finds
+    def assertParsed(self, document, result):
+        expected = baba.run_parser(document.text)
+        self.assertEqual([tuple(t) for t in result.tokens], [tuple(t) for t in expected.tokens])
+        self.assertEqual(result.function_name_list, expected.function_name_list)
+        self.assertEqual(result.function_params_list, expected.function_params_list)
+        self.assertEqual(result.error_list, expected.error_list)
+
+    def test_edits(self):
+        document = baba_document.Document(DOCUMENT_PROGRAM)
+        self.assertParsed(document, document.result())
+        at = DOCUMENT_PROGRAM.index("return")
+        for (start, end, text) in [(at, at + 6, "retur"), (at, at + 5, "return"),
+                (0, 0, "function h() end\n"), (0, 0, "--[["), (0, 4, ""),
+                (len(document.text), len(document.text), "y = = 1\n"), (0, len(document.text), "")]:
+            self.assertParsed(document, document.edit(start, end, text))
+
+    def test_random_edits(self):
+        rng = random.Random(1)
+        for program in generated_programs(3):
+            document = baba_document.Document(program)
+            for _ in range(40):
+                start = rng.randint(0, len(document.text))
+                end = min(len(document.text), start + rng.choice([0, 1, 5, 30]))
+                try:
+                    result = document.edit(start, end, rng.choice(EDIT_SNIPPETS))
+                except RuntimeError:
+                    # the text cannot be lexed, then nor can all of it
+                    self.assertRaises(RuntimeError, baba.run_parser, document.text)
+                    continue
+                self.assertParsed(document, result)
+
+# engines
+
+# small valid programs from the bench generator, each engine has to
+# find the same functions in them as Parser
+def generated_programs(count):
+    return [bench.CorpusGenerator(bench.CorpusKnobs(600, 3, 2, 3, 0.05, 2, seed)).program()
+            for seed in range(count)]
+
+def functions_of(result):
+    return (result.function_name_list, result.function_params_list)
+
+# statements a table cannot tell from valid ones by their first tokens,
+# and ones that are valid, with what Parser logs for them
+CHAIN_STATEMENTS = ["x\n", "f() = 1\n", "a.b\n", "(x) = 1\n", "(x)\n", "(f)()\n", "a, f() = 1\n",
+        "a:b().c = 1\n", "f(function() end).x = 2\n", "if x then a.b end\n"]
+
+# a statement nested deeper than Python's stack lets Parser go
+DEEP_PROGRAM = "x = " + "(" * 5000 + "{" * 5000 + "}" * 5000 + ")" * 5000 + "\nfunction f() end\n"
+
+class StackEngineTest(unittest.TestCase):
+    def test_valid_programs(self):
+        for program in generated_programs(30):
+            expected = baba.run_parser(program)
+            result = baba.run_parser(program, engine=baba.STACK)
+            self.assertEqual(result.error_list, [])
+            self.assertEqual(functions_of(result), functions_of(expected))
+
+    # the same errors as well, as it runs the same grammar functions
+    def test_invalid_programs(self):
+        for program in CHAIN_STATEMENTS + [MANY_ERRORS_PROGRAM]:
+            for recover in (False, True):
+                expected = baba.run_parser(program, recover=recover)
+                result = baba.run_parser(program, recover=recover, engine=baba.STACK)
+                self.assertEqual(result.error_list, expected.error_list, program[:20])
+                self.assertEqual(functions_of(result), functions_of(expected), program[:20])
+
+    def test_deep_nesting(self):
+        result = baba.run_parser(DEEP_PROGRAM, engine=baba.STACK)
+        self.assertEqual(result.error_list, [])
+        self.assertEqual(result.function_name_list, [(2, "f")])
+
+    # the generator functions are written ahead of time, so the ones
+    # checked in have to be the ones Parser's grammar functions make
+    def test_saved_rules_are_current(self):
+        with open(baba_stack.RULES_PATH) as ins:
+            self.assertEqual(ins.read(), baba_stack.rules_source())
+
+class TableEngineTest(unittest.TestCase):
+    def test_valid_programs(self):
+        for program in generated_programs(30):
+            expected = baba.run_parser(program)
+            result = baba.run_parser(program, engine=baba.TABLE)
+            self.assertEqual(expected.error_list, [])
+            self.assertEqual(result.error_list, [])
+            self.assertEqual(functions_of(result), functions_of(expected))
+
+    def test_chain_statements(self):
+        for program in CHAIN_STATEMENTS:
+            expected = baba.run_parser(program)
+            result = baba.run_parser(program, engine=baba.TABLE)
+            self.assertEqual(result.error_list, expected.error_list, program)
+            self.assertEqual(functions_of(result), functions_of(expected), program)
+
+    # the table is not made at run time, so the one checked in has to be
+    # the one the grammar makes
+    def test_saved_table_is_current(self):
+        with open(baba_grammar.TABLE_PATH) as ins:
+            saved = json.load(ins)
+        self.assertEqual(saved, json.loads(json.dumps(baba_grammar.generate(baba.grammar)[0])))
+
+
+
+# validate
+
+class ValidateTest(unittest.TestCase):
+    def test_valid(self):
+        for program in generated_programs(10):
+            self.assertEqual(baba_validate.validate(program), baba_validate.Validation(True, None, None, None))
+
+    # the first error parse finds, and where it is
+    def test_first_error(self):
+        for program in CHAIN_STATEMENTS + ["local x = = 1\ny = 2\n", "f(\n"]:
+            errors = baba.run_parser(program).error_list
+            validation = baba_validate.validate(program)
+            self.assertEqual(validation.valid, not errors, program)
+            if errors:
+                self.assertEqual(validation.error, errors[0], program)
+                self.assertEqual((validation.line, validation.column), (errors[0].line, errors[0].column))
+
+    def test_deep_nesting(self):
+        self.assertTrue(baba_validate.validate("x = " + "(" * 5000 + "1" + ")" * 5000).valid)
+        validation = baba_validate.validate("x = " + "(" * 5000 + "1" + ")" * 4999 + "\n")
+        self.assertFalse(validation.valid)
+        self.assertEqual(validation.error.expected, ")")
+        self.assertEqual(validation.line, 2)
+
+# profile
+
+class ProfileTest(unittest.TestCase):
+    # the parse is Parser's, with its checks counted through the hooks
+    def test_counts(self):
+        program = "local t = {1, 2}\nfor i = 1, 2 do f(t[i]) end\n"
+        parser = baba_profile.ProfilingParser()
+        parser.parse_tokens(baba.tokens_of(program), baba.LineIndex(program))
+        expected = baba.run_parser(program)
+        self.assertEqual(parser.error_list, [])
+        self.assertEqual(parser.function_name_list, expected.function_name_list)
+        profile = parser.profile.to_dict()
+        self.assertEqual(profile["programs"], 1)
+        self.assertEqual(profile["rules"]["stat"]["calls"], 3)
+        kinds = set(check["kind"] for check in profile["checks"])
+        self.assertEqual(kinds, set([baba_profile.CONTAINS, baba_profile.PREDICT, baba_profile.LOOKAHEAD]))
+
+if __name__ == "__main__":
+    unittest.main()